@@ -1,31 +1,64 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.schemas.requests import BatchCrawlRequest
-from app.schemas.responses import BatchResponse, BatchStatusResponse
+from app.schemas.responses import BatchResponse, BatchStatusResponse, CrawlResult
 from app.services.batch_service import BatchService
+from app.services.event_service import EventService
 
 router = APIRouter(prefix="/batches", tags=["batches"])
 
 
 @router.post("/", response_model=BatchResponse, status_code=202)
-def create_crawl_batch(request: BatchCrawlRequest):
-    return BatchService.create_batch(
-        urls=[str(url) for url in request.urls],
-        headers=request.headers,
-        timeout=request.timeout
+async def create_crawl_batch(request: BatchCrawlRequest, background_tasks: BackgroundTasks):
+    urls = [str(url) for url in request.urls]
+    batch = await BatchService.create_batch(urls=urls)
+    background_tasks.add_task(
+        BatchService.dispatch_batch,
+        batch.batch_id, urls, batch.job_ids, request.headers, request.timeout, request.body_codec,
+        request.priority
     )
+    return batch
 
 
 @router.get("/{batch_id}/status", response_model=BatchStatusResponse)
-def get_batch_status(batch_id: str):
-    status = BatchService.get_batch_status(batch_id)
+async def get_batch_status(batch_id: str, include_jobs: bool = False,
+                           offset: int = Query(default=0, ge=0),
+                           limit: int = Query(default=100, ge=1, le=1000)):
+    status = await BatchService.get_batch_status(batch_id, include_jobs, offset, limit)
     if not status:
         raise HTTPException(status_code=404, detail="Batch not found")
     return status
 
 
 @router.get("/{batch_id}/results")
-def get_batch_results(batch_id: str):
-    results = BatchService.get_batch_results(batch_id)
+async def get_batch_results(batch_id: str, format: str = Query(default="json", pattern="^(json|ndjson)$"),
+                            fields: Optional[str] = None):
+    if format == "ndjson":
+        selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        unknown = set(selected or []) - set(CrawlResult.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        if not await BatchService.batch_exists(batch_id):
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return StreamingResponse(
+            BatchService.stream_batch_results(batch_id, selected),
+            media_type="application/x-ndjson"
+        )
+
+    results = await BatchService.get_batch_results(batch_id)
     if not results:
         raise HTTPException(status_code=404, detail="Batch not found")
     return results
+
+
+@router.get("/{batch_id}/events")
+async def stream_batch_events(batch_id: str, cursor: Optional[str] = None,
+                              last_event_id: Optional[str] = Header(default=None)):
+    if not await BatchService.batch_exists(batch_id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return StreamingResponse(
+        EventService.batch_events(batch_id, last_event_id or cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
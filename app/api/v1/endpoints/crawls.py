@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from app.schemas.requests import CrawlSessionRequest
+from app.schemas.responses import BatchResponse
+from app.services.crawl_service import CrawlService
+
+router = APIRouter(prefix="/crawls", tags=["crawls"])
+
+
+@router.post("/", response_model=BatchResponse, status_code=202)
+async def create_crawl_session(request: CrawlSessionRequest):
+    return await CrawlService.create_crawl(
+        seeds=[str(url) for url in request.seeds],
+        max_depth=request.max_depth,
+        max_pages=request.max_pages,
+        scope=request.scope,
+        include=request.include,
+        exclude=request.exclude,
+        headers=request.headers,
+        timeout=request.timeout,
+        body_codec=request.body_codec,
+        priority=request.priority
+    )
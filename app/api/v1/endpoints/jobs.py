@@ -1,29 +1,71 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from app.schemas.requests import CrawlRequest
 from app.schemas.responses import JobResponse, JobStatusResponse, CrawlResult
 from app.services.job_service import JobService
+from app.services.event_service import EventService
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
 
 @router.post("/", response_model=JobResponse, status_code=202)
-def create_crawl_job(request: CrawlRequest):
-    job_id = JobService.create_job(
+async def create_crawl_job(request: CrawlRequest):
+    job_id = await JobService.create_job(
         url=str(request.url),
         headers=request.headers,
-        timeout=request.timeout
+        timeout=request.timeout,
+        body_codec=request.body_codec,
+        max_age=request.max_age,
+        priority=request.priority
     )
     return JobResponse(job_id=job_id)
 
 
 @router.get("/{job_id}/status", response_model=JobStatusResponse)
-def get_job_status(job_id: str):
-    return JobService.get_job_status(job_id)
+async def get_job_status(job_id: str):
+    return await JobService.get_job_status(job_id)
 
 
 @router.get("/{job_id}/result", response_model=CrawlResult)
-def get_job_result(job_id: str):
-    result = JobService.get_job_result(job_id)
+async def get_job_result(job_id: str):
+    result = await JobService.get_job_result(job_id)
     if not result:
         raise HTTPException(status_code=404, detail="Result not found")
     return result
+
+
+@router.get("/{job_id}/body")
+async def get_job_body(job_id: str, accept_encoding: str = Header(default=""),
+                       if_none_match: Optional[str] = Header(default=None)):
+    try:
+        body, encoding, content_type, digest = await JobService.get_job_body(job_id, accept_encoding)
+    except ValueError as e:
+        # Stored with a dictionary or codec this server cannot load.
+        raise HTTPException(status_code=409, detail=f"Body cannot be decoded: {e}")
+    if body is None:
+        raise HTTPException(status_code=404, detail="Body not found")
+    etag = f'W/"{digest}"'
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": etag}
+    if encoding:
+        # Bodies decoded here go out without the header; "identity" is not a content coding.
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=body,
+        media_type=content_type or "text/html",
+        headers=headers
+    )
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str, cursor: Optional[str] = None,
+                            last_event_id: Optional[str] = Header(default=None)):
+    if not await JobService.job_exists(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        EventService.job_events(job_id, last_event_id or cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import jobs, batches
+from app.api.v1.endpoints import jobs, batches, crawls
 
 api_router = APIRouter(prefix="/v1")
 
 api_router.include_router(jobs.router)
 api_router.include_router(batches.router)
+api_router.include_router(crawls.router)
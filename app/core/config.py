@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List
 import os
 
 
@@ -8,18 +9,81 @@ class Settings(BaseModel):
 
     celery_broker_url: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
     celery_result_backend: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
+    task_ignore_result: bool = os.getenv("TASK_IGNORE_RESULT", "false").lower() == "true"
 
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/2")
     result_ttl_secs: int = int(os.getenv("RESULT_TTL_SECS", "86400"))
+    redis_max_connections: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+    body_codec: str = os.getenv("BODY_CODEC", "gzip")
+    body_gzip_level: int = int(os.getenv("BODY_GZIP_LEVEL", "9"))
+    body_zstd_level: int = int(os.getenv("BODY_ZSTD_LEVEL", "3"))
+    cache_vary_headers: List[str] = [
+        name.strip().lower()
+        for name in os.getenv("CACHE_VARY_HEADERS", "accept,accept-language,cookie,authorization").split(",")
+        if name.strip()
+    ]
 
     proxy_file: str = os.getenv("PROXY_FILE")
+    proxy_pool_backend: str = os.getenv("PROXY_POOL_BACKEND", "memory")
+    proxy_pool_key: str = os.getenv("PROXY_POOL_KEY", "proxypool")
+    proxy_max_requests: int = int(os.getenv("PROXY_MAX_REQUESTS", "15"))
+    proxy_cooldown_secs: int = int(os.getenv("PROXY_COOLDOWN_SECS", "300"))
+    proxy_min_success_rate: float = float(os.getenv("PROXY_MIN_SUCCESS_RATE", "0.3"))
+    proxy_score_half_life_secs: float = float(os.getenv("PROXY_SCORE_HALF_LIFE_SECS", "300"))
+    proxy_breaker_failures: int = int(os.getenv("PROXY_BREAKER_FAILURES", "5"))
+    proxy_breaker_open_secs: float = float(os.getenv("PROXY_BREAKER_OPEN_SECS", "30"))
+    proxy_breaker_max_open_secs: float = float(os.getenv("PROXY_BREAKER_MAX_OPEN_SECS", "1800"))
+    proxy_ban_open_secs: float = float(os.getenv("PROXY_BAN_OPEN_SECS", "600"))
     max_retries: int = int(os.getenv("MAX_RETRIES", "3"))
     request_timeout_secs: int = int(os.getenv("REQUEST_TIMEOUT_SECS", "15"))
     request_delay_secs: float = float(os.getenv("REQUEST_DELAY_SECS", "1.0"))
+    retry_backoff_base_secs: float = float(os.getenv("RETRY_BACKOFF_BASE_SECS", os.getenv("REQUEST_DELAY_SECS", "1.0")))
+    retry_backoff_factor: float = float(os.getenv("RETRY_BACKOFF_FACTOR", "2.0"))
+    retry_backoff_max_secs: float = float(os.getenv("RETRY_BACKOFF_MAX_SECS", "60"))
+    retry_backoff_jitter: float = float(os.getenv("RETRY_BACKOFF_JITTER", "0.5"))
+    retry_backoff_blocked_multiplier: float = float(os.getenv("RETRY_BACKOFF_BLOCKED_MULTIPLIER", "3.0"))
     use_http2: bool = os.getenv("USE_HTTP2", "true").lower() == "true"
+    max_body_bytes: int = int(os.getenv("MAX_BODY_BYTES", str(10 * 2 ** 20)))
+    detector_rules_file: str = os.getenv("DETECTOR_RULES_FILE", "")
+    detector_window_bytes: int = int(os.getenv("DETECTOR_WINDOW_BYTES", "65536"))
+    host_rate_limits: str = os.getenv("HOST_RATE_LIMITS", "")
+    host_rate_default: str = os.getenv("HOST_RATE_DEFAULT", "0")
+    proxy_host_rate: str = os.getenv("PROXY_HOST_RATE", "0")
+    client_pool_size: int = int(os.getenv("CLIENT_POOL_SIZE", "64"))
+    crawl_max_in_flight: int = int(os.getenv("CRAWL_MAX_IN_FLIGHT", "200"))
+    client_keepalive_secs: float = float(os.getenv("CLIENT_KEEPALIVE_SECS", "5.0"))
 
-    max_batch_size: int = int(os.getenv("MAX_BATCH_SIZE", "100"))
+    probe_url: str = os.getenv("PROBE_URL", "")
+    probe_interval_secs: float = float(os.getenv("PROBE_INTERVAL_SECS", "60"))
+    probe_timeout_secs: float = float(os.getenv("PROBE_TIMEOUT_SECS", "10"))
+    probe_concurrency: int = int(os.getenv("PROBE_CONCURRENCY", "50"))
+    probe_failures: int = int(os.getenv("PROBE_FAILURES", "2"))
+    probe_successes: int = int(os.getenv("PROBE_SUCCESSES", "2"))
+    probe_prewarm: int = int(os.getenv("PROBE_PREWARM", "5"))
+    probe_prewarm_urls: str = os.getenv("PROBE_PREWARM_URLS", "https://djinni.co/")
+
+    max_batch_size: int = int(os.getenv("MAX_BATCH_SIZE", "100000"))
+    batch_publish_chunk_size: int = int(os.getenv("BATCH_PUBLISH_CHUNK_SIZE", "1000"))
+    batch_chunk_size: int = int(os.getenv("BATCH_CHUNK_SIZE", "0"))
+    coalesce_lease_secs: int = int(os.getenv("COALESCE_LEASE_SECS", "120"))
+    results_chunk_size: int = int(os.getenv("RESULTS_CHUNK_SIZE", "200"))
     batch_timeout_secs: int = int(os.getenv("BATCH_TIMEOUT_SECS", "300"))
+    sched_max_outstanding: int = int(os.getenv("SCHED_MAX_OUTSTANDING", "0"))
+    sched_quantum: int = int(os.getenv("SCHED_QUANTUM", "10"))
+    sched_lease_secs: int = int(os.getenv("SCHED_LEASE_SECS", "900"))
+
+    crawl_max_pages: int = int(os.getenv("CRAWL_MAX_PAGES", "1000000"))
+    crawl_max_depth: int = int(os.getenv("CRAWL_MAX_DEPTH", "10"))
+    crawl_max_seeds: int = int(os.getenv("CRAWL_MAX_SEEDS", "1000"))
+    crawl_max_links_per_page: int = int(os.getenv("CRAWL_MAX_LINKS_PER_PAGE", "1000"))
+    crawl_bloom_error_rate: float = float(os.getenv("CRAWL_BLOOM_ERROR_RATE", "0.001"))
+
+    events_maxlen: int = int(os.getenv("EVENTS_MAXLEN", "10000"))
+    events_max_listeners: int = int(os.getenv("EVENTS_MAX_LISTENERS", "500"))
+    events_keepalive_secs: int = int(os.getenv("EVENTS_KEEPALIVE_SECS", "15"))
+
+    worker_metrics_port: int = int(os.getenv("WORKER_METRICS_PORT", "0"))
+    metrics_proxy_labels: bool = os.getenv("METRICS_PROXY_LABELS", "true").lower() == "true"
 
 
 settings = Settings()
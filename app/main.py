@@ -1,14 +1,36 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from app.api.v1.router import api_router
+from app.core.config import settings
+from app.services import metrics
+from app.services.job_service import JobService
+from app.services.storage import storage
+from app.worker.celery_app import PRIORITY_QUEUES
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await storage.aclose()
+    await JobService.aclose()
+
 
 app = FastAPI(
     title="Crawler API",
     version="1.0.0",
-    description="High-performance web crawling microservice"
+    description="High-performance web crawling microservice",
+    lifespan=lifespan
 )
 
 app.include_router(api_router)
 
+metrics_registry = metrics.build_registry([
+    metrics.QueueDepthCollector(
+        settings.celery_broker_url,
+        PRIORITY_QUEUES.values(),
+    ),
+])
+
 
 @app.get("/")
 async def root():
@@ -18,3 +40,14 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/stats")
+async def stats():
+    return {"coalesced_fetches": await storage.aget_coalesced_fetches()}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    data, content_type = metrics.render(metrics_registry)
+    return Response(content=data, media_type=content_type)
@@ -1,12 +1,41 @@
-from pydantic import BaseModel, AnyHttpUrl, Field
+import re
+from pydantic import BaseModel, AnyHttpUrl, Field, field_validator
 from typing import Optional, Dict, List
+from app.core.config import settings
 
 class CrawlRequest(BaseModel):
     url: AnyHttpUrl
     headers: Optional[Dict[str, str]] = None
     timeout: int = Field(default=15, ge=1, le=300, description="Timeout in seconds")
+    body_codec: Optional[str] = Field(default=None, pattern="^(gzip|zstd|zstd-dict)$")
+    max_age: Optional[int] = Field(default=None, ge=0, description="Reuse a cached response up to this many seconds old")
+    priority: str = Field(default="high", pattern="^(high|normal|low)$")
 
 class BatchCrawlRequest(BaseModel):
-    urls: List[AnyHttpUrl] = Field(..., min_items=1, max_items=100)
+    urls: List[AnyHttpUrl] = Field(..., min_length=1, max_length=settings.max_batch_size)
     headers: Optional[Dict[str, str]] = None
     timeout: int = Field(default=15, ge=1, le=300, description="Timeout in seconds")
+    body_codec: Optional[str] = Field(default=None, pattern="^(gzip|zstd|zstd-dict)$")
+    priority: str = Field(default="normal", pattern="^(high|normal|low)$")
+
+class CrawlSessionRequest(BaseModel):
+    seeds: List[AnyHttpUrl] = Field(..., min_length=1, max_length=settings.crawl_max_seeds)
+    max_depth: int = Field(default=2, ge=0, le=settings.crawl_max_depth, description="Link hops from the seeds")
+    max_pages: int = Field(default=1000, ge=1, le=settings.crawl_max_pages)
+    scope: str = Field(default="host", pattern="^(host|subdomains)$")
+    include: Optional[List[str]] = Field(default=None, description="Regexes, a discovered URL must match one")
+    exclude: Optional[List[str]] = Field(default=None, description="Regexes, a discovered URL must match none")
+    headers: Optional[Dict[str, str]] = None
+    timeout: int = Field(default=15, ge=1, le=300, description="Timeout in seconds")
+    body_codec: Optional[str] = Field(default=None, pattern="^(gzip|zstd|zstd-dict)$")
+    priority: str = Field(default="low", pattern="^(high|normal|low)$")
+
+    @field_validator("include", "exclude")
+    @classmethod
+    def check_patterns(cls, patterns: Optional[List[str]]) -> Optional[List[str]]:
+        for pattern in patterns or []:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid pattern {pattern!r}: {e}")
+        return patterns
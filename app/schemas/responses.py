@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Any
+from typing import List, Optional
 from enum import Enum
 
 class TaskState(str, Enum):
@@ -22,13 +22,21 @@ class JobStatusResponse(BaseModel):
     job_id: str
     state: TaskState
     created_at: Optional[str] = None
+    queued_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 class BatchStatusResponse(BaseModel):
     batch_id: str
     total: int
     completed: int
     progress: float
-    jobs: List[JobStatusResponse]
+    pending: int = 0
+    started: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    dispatch_error: Optional[str] = None
+    jobs: Optional[List[JobStatusResponse]] = None
 
 class CrawlResult(BaseModel):
     job_id: str
@@ -36,4 +44,8 @@ class CrawlResult(BaseModel):
     status_code: Optional[int]
     response_time_ms: int
     body: Optional[str]
+    body_encoding: Optional[str] = None
+    body_digest: Optional[str] = None
+    cache_status: Optional[str] = None
+    state: Optional[TaskState] = None
     error: Optional[str] = None
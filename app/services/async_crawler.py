@@ -0,0 +1,258 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from time import perf_counter
+from typing import Optional, Dict, List
+import httpx
+
+from app.services import metrics
+from app.services.crawler import (
+    BaseCrawler,
+    BodyReader,
+    CrawlAttempt,
+    OUTCOME_DEFERRED,
+    OUTCOME_EXCEPTION,
+    OUTCOME_NO_PROXY,
+    to_httpx_proxy,
+)
+from app.services.detector import PageDetector
+
+
+class AsyncClientPool:
+    def __init__(self, max_clients: int = 64, use_http2: bool = True,
+                 max_connections_per_proxy: int = 100, keepalive_expiry: float = 5.0):
+        self.max_clients = max(1, max_clients)
+        self.use_http2 = use_http2
+        self.limits = httpx.Limits(
+            max_keepalive_connections=max_connections_per_proxy,
+            max_connections=max_connections_per_proxy,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+        self._clients: "OrderedDict[Optional[str], httpx.AsyncClient]" = OrderedDict()
+        self._closing: set = set()
+        # Requests still running on each client; an evicted client is only
+        # closed once its last one finishes.
+        self._in_use: Dict[httpx.AsyncClient, int] = {}
+        self._evicted: set = set()
+
+    def get(self, proxy_url: Optional[str]) -> httpx.AsyncClient:
+        client = self._clients.get(proxy_url)
+        if client is not None:
+            self._clients.move_to_end(proxy_url)
+            return client
+
+        client = httpx.AsyncClient(
+            http2=self.use_http2,
+            proxy=proxy_url,
+            limits=self.limits,
+            follow_redirects=True,
+        )
+        self._clients[proxy_url] = client
+
+        if len(self._clients) > self.max_clients:
+            _, evicted = self._clients.popitem(last=False)
+            if evicted in self._in_use:
+                self._evicted.add(evicted)
+            else:
+                self._close_later(evicted)
+
+        return client
+
+    def acquire(self, proxy_url: Optional[str]) -> httpx.AsyncClient:
+        client = self.get(proxy_url)
+        self._in_use[client] = self._in_use.get(client, 0) + 1
+        return client
+
+    def release(self, client: httpx.AsyncClient):
+        count = self._in_use.pop(client, 0) - 1
+        if count > 0:
+            self._in_use[client] = count
+        elif client in self._evicted:
+            self._evicted.discard(client)
+            self._close_later(client)
+
+    def _close_later(self, client: httpx.AsyncClient):
+        task = asyncio.ensure_future(client.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def aclose(self):
+        clients = list(self._clients.values()) + list(self._evicted)
+        self._clients.clear()
+        self._evicted.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), *self._closing,
+                             return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+class AsyncCrawler(BaseCrawler):
+    def __init__(
+            self,
+            proxy_file: Optional[str],
+            max_retries: int = 3,
+            timeout: float = 10.0,
+            delay: float = 1.0,
+            headers: Optional[Dict[str, str]] = None,
+            use_http2: bool = True,
+            max_clients: int = 64,
+            max_in_flight: int = 200,
+            proxy_pool=None,
+            backoff=None,
+            rate_limiter=None,
+            detector: Optional[PageDetector] = None,
+            max_body_bytes: int = 10 * 2 ** 20,
+            keepalive_expiry: float = 5.0,
+    ):
+        super().__init__(proxy_file, max_retries, timeout, delay, headers, use_http2, proxy_pool, backoff,
+                         rate_limiter, detector, max_body_bytes)
+        self.max_in_flight = max_in_flight
+        self.client_pool = AsyncClientPool(
+            max_clients=max_clients,
+            use_http2=use_http2,
+            max_connections_per_proxy=max_in_flight,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+    async def _areport_outcome(self, proxy_line: str, outcome: str, status_code: Optional[int] = None,
+                               latency: Optional[float] = None):
+        success, blocked = self._outcome_result(outcome, status_code)
+        await self.proxy_pool.areport_request_result(proxy_line, success, blocked=blocked, latency=latency)
+
+        if success and self._request_count % 10 == 0:
+            self._log_stats()
+
+    async def prewarm(self, proxy_line: str, url: str, timeout: Optional[float] = None) -> bool:
+        client = self.client_pool.acquire(to_httpx_proxy(proxy_line))
+        try:
+            await client.head(url, headers=self._request_headers(None), timeout=self._request_timeout(timeout))
+            return True
+        except httpx.HTTPError as e:
+            logging.debug(f"Prewarming {proxy_line} failed: {e}")
+            return False
+        finally:
+            self.client_pool.release(client)
+
+    async def _aacquire_token(self, url: str, proxy_line: Optional[str],
+                              timer: metrics.PhaseTimer) -> Optional[CrawlAttempt]:
+        started = perf_counter()
+        wait = await self.rate_limiter.aacquire(url, proxy_line)
+        timer.add("rate_limit", perf_counter() - started)
+        if wait <= 0:
+            return None
+        self._observe(url, proxy_line, OUTCOME_DEFERRED, timer)
+        return self._deferred(proxy_line, wait)
+
+    async def crawl_once(self, url: str, headers: Optional[Dict[str, str]] = None,
+                         timeout: Optional[float] = None, codec=None, max_links: int = 0) -> CrawlAttempt:
+        if not self.proxy_pool:
+            logging.error("No proxy pool available")
+            return CrawlAttempt(OUTCOME_NO_PROXY)
+
+        timer = metrics.PhaseTimer()
+        if self.rate_limiter and not self.rate_limiter.per_proxy:
+            # Only the host's bucket applies, so a deferred attempt picks no proxy.
+            deferred = await self._aacquire_token(url, None, timer)
+            if deferred:
+                return deferred
+
+        started = perf_counter()
+        proxy_line = await self.proxy_pool.apick_proxy_line()
+        timer.add("pick", perf_counter() - started)
+        if not proxy_line:
+            logging.error("No available proxies")
+            self._observe(url, None, OUTCOME_NO_PROXY, timer)
+            return CrawlAttempt(OUTCOME_NO_PROXY)
+
+        if self.rate_limiter and self.rate_limiter.per_proxy:
+            deferred = await self._aacquire_token(url, proxy_line, timer)
+            if deferred:
+                await self.proxy_pool.arelease_proxy_line(proxy_line)
+                return deferred
+
+        proxy_url = to_httpx_proxy(proxy_line)
+        reader: Optional[BodyReader] = None
+        client: Optional[httpx.AsyncClient] = None
+
+        try:
+            logging.info(f"Crawling {url} via {proxy_line}")
+
+            client = self.client_pool.acquire(proxy_url)
+            reader = self._body_reader(url, codec)
+            with metrics.IN_FLIGHT.track_inprogress():
+                started = perf_counter()
+                async with client.stream("GET", url, headers=self._request_headers(headers),
+                                         timeout=self._request_timeout(timeout),
+                                         extensions={"trace": timer.atrace}) as res:
+                    latency = perf_counter() - started
+                    timer.headers_received(started)
+                    self._request_count += 1
+                    outcome = self._evaluate_status(proxy_line, res.status_code)
+                    if outcome is None:
+                        if max_links:
+                            reader.extract_links(res, max_links)
+                        aborted = reader.check_length(res)
+                        if aborted is None:
+                            started = perf_counter()
+                            async for chunk in res.aiter_bytes():
+                                aborted = reader.feed(chunk)
+                                if aborted:
+                                    break
+                            timer.add("download", perf_counter() - started - reader.detect_secs
+                                      - reader.encode_secs - reader.links_secs)
+                        outcome = self._evaluate_body(proxy_line, reader, aborted)
+
+            await self._areport_outcome(proxy_line, outcome, res.status_code, latency)
+            attempt = reader.attempt(outcome, proxy_line, res)
+            self._observe(url, proxy_line, outcome, timer, reader)
+            return attempt
+
+        except Exception as e:
+            logging.error(f"Error with {proxy_line}: {str(e)[:100]}")
+            await self._areport_outcome(proxy_line, OUTCOME_EXCEPTION)
+            self._observe(url, proxy_line, OUTCOME_EXCEPTION, timer, reader)
+            return CrawlAttempt(OUTCOME_EXCEPTION, proxy_line, error=e)
+        finally:
+            if client is not None:
+                self.client_pool.release(client)
+
+    async def crawl_bytes(self, url: str, headers: Optional[Dict[str, str]] = None,
+                          timeout: Optional[float] = None) -> Optional[bytes]:
+        tries = 0
+        last_exc: Optional[Exception] = None
+
+        while tries < self.max_retries:
+            attempt = await self.crawl_once(url, headers=headers, timeout=timeout)
+            if attempt.deferred:
+                await asyncio.sleep(attempt.retry_after)
+                continue
+            if attempt.ok:
+                return attempt.content
+            if not attempt.retryable:
+                break
+            if attempt.error:
+                last_exc = attempt.error
+
+            tries += 1
+            await asyncio.sleep(self._retry_delay(attempt.outcome, tries))
+
+        if last_exc:
+            logging.error(f"All retries failed: {last_exc}")
+
+        return None
+
+    async def crawl_many(self, urls: List[str], headers: Optional[Dict[str, str]] = None,
+                         timeout: Optional[float] = None,
+                         max_in_flight: Optional[int] = None) -> List[Optional[bytes]]:
+        semaphore = asyncio.Semaphore(max_in_flight or self.max_in_flight)
+
+        async def fetch(url: str) -> Optional[bytes]:
+            async with semaphore:
+                return await self.crawl_bytes(url, headers=headers, timeout=timeout)
+
+        return await asyncio.gather(*(fetch(url) for url in urls))
+
+    async def aclose(self):
+        await self.client_pool.aclose()
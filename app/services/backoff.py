@@ -0,0 +1,34 @@
+import random
+from typing import Optional
+
+from app.core.config import settings
+
+
+class BackoffPolicy:
+    def __init__(self, base: float = 1.0, factor: float = 2.0, max_delay: float = 60.0,
+                 jitter: float = 0.5, blocked_multiplier: float = 3.0):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.blocked_multiplier = blocked_multiplier
+
+    def compute(self, attempt: int, blocked: bool = False) -> float:
+        delay = self.base * self.factor ** max(attempt - 1, 0)
+        if blocked:
+            delay *= self.blocked_multiplier
+        delay = min(delay, self.max_delay)
+
+        if self.jitter:
+            delay -= delay * self.jitter * random.random()
+        return delay
+
+
+def default_backoff_policy(base: Optional[float] = None) -> BackoffPolicy:
+    return BackoffPolicy(
+        base=settings.retry_backoff_base_secs if base is None else base,
+        factor=settings.retry_backoff_factor,
+        max_delay=settings.retry_backoff_max_secs,
+        jitter=settings.retry_backoff_jitter,
+        blocked_multiplier=settings.retry_backoff_blocked_multiplier,
+    )
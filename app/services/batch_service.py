@@ -1,29 +1,28 @@
+import json
+import logging
 import uuid
 import time
-from typing import List, Optional
+from typing import List, Optional, AsyncIterator
+from app.core.config import settings
 from app.services.job_service import JobService
 from app.services.storage import storage
-from app.schemas.responses import BatchResponse, BatchStatusResponse, JobStatusResponse
+from app.schemas.responses import BatchResponse, BatchStatusResponse, CrawlResult, JobStatusResponse, TaskState
+
+logger = logging.getLogger(__name__)
 
 
 class BatchService:
     @staticmethod
-    def create_batch(urls: List[str], headers: Optional[dict] = None,
-                     timeout: int = 15) -> BatchResponse:
+    async def create_batch(urls: List[str]) -> BatchResponse:
         batch_id = str(uuid.uuid4())
-        job_ids = []
-
-        for url in urls:
-            job_id = JobService.create_job(url, headers, timeout)
-            job_ids.append(job_id)
+        job_ids = JobService.new_job_ids(len(urls))
 
         batch_info = {
             "batch_id": batch_id,
-            "job_ids": job_ids,
             "created_at": time.time(),
             "total_count": len(urls)
         }
-        storage.save_batch_info(batch_id, batch_info)
+        await storage.asave_batch_info(batch_id, batch_info, job_ids)
 
         return BatchResponse(
             batch_id=batch_id,
@@ -32,57 +31,96 @@ class BatchService:
         )
 
     @staticmethod
-    def get_batch_status(batch_id: str) -> Optional[BatchStatusResponse]:
-        batch_info = storage.get_batch_info(batch_id)
+    def dispatch_batch(batch_id: str, urls: List[str], job_ids: List[str],
+                       headers: Optional[dict] = None, timeout: int = 15,
+                       body_codec: Optional[str] = None, priority: Optional[str] = None) -> None:
+        try:
+            JobService.create_jobs(urls, job_ids, headers, timeout, batch_id, body_codec, priority)
+        except Exception as e:
+            # The 202 has already gone out, so the batch status is where this shows.
+            logger.error(f"Dispatching batch {batch_id} failed: {e}")
+            storage.update_batch_info(batch_id, {"dispatch_error": f"{e.__class__.__name__}: {e}"})
+
+    @staticmethod
+    async def get_batch_status(batch_id: str, include_jobs: bool = False, offset: int = 0,
+                               limit: int = 100) -> Optional[BatchStatusResponse]:
+        batch_info, counters = await storage.aget_batch_progress(batch_id)
         if not batch_info:
             return None
 
-        job_ids = batch_info.get("job_ids", [])
-        jobs = []
-        completed = 0
-
-        for job_id in job_ids:
-            job_status = JobService.get_job_status(job_id)
-            jobs.append(job_status)
-
-            if job_status.state in ["SUCCESS", "FAILURE"]:
-                completed += 1
-
-        total = len(job_ids)
+        total = batch_info.get("total_count", 0)
+        started = counters.get(TaskState.STARTED.value, 0)
+        succeeded = counters.get(TaskState.SUCCESS.value, 0)
+        failed = counters.get(TaskState.FAILURE.value, 0)
+        completed = succeeded + failed
         progress = completed / total if total > 0 else 0
 
+        jobs = None
+        if include_jobs:
+            job_ids = await storage.aget_batch_job_ids(batch_id, offset, limit)
+            states = await storage.aget_batch_job_states(batch_id, job_ids)
+            jobs = [
+                JobStatusResponse(job_id=job_id, state=TaskState(state))
+                for job_id, state in zip(job_ids, states)
+            ]
+
         return BatchStatusResponse(
             batch_id=batch_id,
             total=total,
             completed=completed,
             progress=progress,
+            pending=max(total - started - completed, 0),
+            started=started,
+            succeeded=succeeded,
+            failed=failed,
+            dispatch_error=batch_info.get("dispatch_error"),
             jobs=jobs
         )
 
     @staticmethod
-    def get_batch_results(batch_id: str) -> Optional[dict]:
-        batch_info = storage.get_batch_info(batch_id)
+    async def batch_exists(batch_id: str) -> bool:
+        return await storage.aget_batch_info(batch_id) is not None
+
+    @staticmethod
+    async def _iter_results(batch_id: str, chunk_size: int, with_body: bool = True) -> AsyncIterator[CrawlResult]:
+        offset = 0
+        while True:
+            job_ids = await storage.aget_batch_job_ids(batch_id, offset, chunk_size)
+            if not job_ids:
+                return
+            for job_id, payload in zip(job_ids, await storage.aget_job_results(job_ids, with_body)):
+                if payload:
+                    yield JobService.to_crawl_result(job_id, payload)
+            offset += len(job_ids)
+
+    @staticmethod
+    async def get_batch_results(batch_id: str) -> Optional[dict]:
+        batch_info, _ = await storage.aget_batch_progress(batch_id)
         if not batch_info:
             return None
 
-        job_ids = batch_info.get("job_ids", [])
         results = []
         successful = 0
         failed = 0
 
-        for job_id in job_ids:
-            result = JobService.get_job_result(job_id)
-            if result:
-                results.append(result)
-                if result.error is None:
-                    successful += 1
-                else:
-                    failed += 1
+        async for result in BatchService._iter_results(batch_id, settings.results_chunk_size):
+            results.append(result)
+            if result.error is None:
+                successful += 1
+            else:
+                failed += 1
 
         return {
             "batch_id": batch_id,
-            "total": len(job_ids),
+            "total": batch_info.get("total_count", 0),
             "successful": successful,
             "failed": failed,
             "results": results
         }
+
+    @staticmethod
+    async def stream_batch_results(batch_id: str, fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+        with_body = not fields or "body" in fields
+        async for result in BatchService._iter_results(batch_id, settings.results_chunk_size, with_body):
+            line = result.model_dump(include=set(fields) if fields else None)
+            yield json.dumps(line).encode("utf-8") + b"\n"
@@ -0,0 +1,185 @@
+import gzip
+import logging
+import zlib
+import threading
+import time
+from typing import Optional, Dict, Tuple, List
+
+from app.core.config import settings
+from app.services.storage import storage
+from app.services.urls import host_for_url
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_GZIP = "gzip"
+CODEC_ZSTD = "zstd"
+CODEC_ZSTD_DICT = "zstd-dict"
+
+
+class BodyCodec:
+    name: str = ""
+    content_encoding: Optional[str] = None
+
+    def encode(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def encoder(self):
+        # Incremental encoder with the zlib compressobj interface: compress() then flush().
+        raise NotImplementedError
+
+
+class GzipCodec(BodyCodec):
+    name = CODEC_GZIP
+    content_encoding = "gzip"
+
+    def __init__(self, level: int = 9):
+        self.level = level
+
+    def encode(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level)
+
+    def decode(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+    def encoder(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+
+class ZstdCodec(BodyCodec):
+    name = CODEC_ZSTD
+    content_encoding = "zstd"
+
+    def __init__(self, level: int = 3, dictionary: Optional["zstandard.ZstdCompressionDict"] = None):
+        if zstandard is None:
+            raise RuntimeError("zstd codec requires the zstandard package")
+        self.level = level
+        self.dictionary = dictionary
+        self._local = threading.local()
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self.dictionary)
+        return compressor
+
+    def _decompressor(self):
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstandard.ZstdDecompressor(
+                dict_data=self.dictionary)
+        return decompressor
+
+    def encode(self, data: bytes) -> bytes:
+        return self._compressor().compress(data)
+
+    def decode(self, data: bytes) -> bytes:
+        # Streamed frames carry no content size, which decompress() requires.
+        return self._decompressor().decompressobj().decompress(data)
+
+    def encoder(self):
+        # A compressor serves one stream at a time, and streams interleave on the event loop.
+        return zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary).compressobj()
+
+
+class ZstdDictCodec(ZstdCodec):
+    # Browsers cannot decode custom dictionaries, so there is no passthrough encoding.
+    content_encoding = None
+
+    def __init__(self, dict_name: str, version: int, dictionary_bytes: bytes, level: int = 3):
+        super().__init__(level, zstandard.ZstdCompressionDict(dictionary_bytes))
+        self.dict_name = dict_name
+        self.version = version
+        self.name = f"{CODEC_ZSTD_DICT}:{dict_name}:{version}"
+
+
+def dictionary_name_for_url(url: str) -> str:
+    return host_for_url(url)
+
+
+def train_dictionary(samples: List[bytes], dict_size: int = 112_640) -> bytes:
+    if zstandard is None:
+        raise RuntimeError("Dictionary training requires the zstandard package")
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+class CodecRegistry:
+    def __init__(self, storage, default_codec: str = CODEC_GZIP, gzip_level: int = 9,
+                 zstd_level: int = 3, version_cache_secs: float = 60.0):
+        self.storage = storage
+        self.default_codec = default_codec
+        self.gzip = GzipCodec(gzip_level)
+        self.zstd_level = zstd_level
+        self.zstd = ZstdCodec(zstd_level) if zstandard is not None else None
+        self.version_cache_secs = version_cache_secs
+
+        self._dict_codecs: Dict[Tuple[str, int], ZstdDictCodec] = {}
+        self._current_versions: Dict[str, Tuple[Optional[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def _dict_codec(self, dict_name: str, version: int) -> Optional[ZstdDictCodec]:
+        key = (dict_name, version)
+        codec = self._dict_codecs.get(key)
+        if codec is None:
+            dictionary_bytes = self.storage.get_codec_dictionary(dict_name, version)
+            if dictionary_bytes is None:
+                return None
+            codec = ZstdDictCodec(dict_name, version, dictionary_bytes, self.zstd_level)
+            with self._lock:
+                self._dict_codecs[key] = codec
+        return codec
+
+    def _current_version(self, dict_name: str) -> Optional[int]:
+        cached = self._current_versions.get(dict_name)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < self.version_cache_secs:
+            return cached[0]
+        version = self.storage.get_codec_dictionary_version(dict_name)
+        self._current_versions[dict_name] = (version, now)
+        return version
+
+    def for_job(self, url: str, codec_name: Optional[str] = None) -> BodyCodec:
+        codec_name = codec_name or self.default_codec
+
+        if codec_name == CODEC_ZSTD_DICT and zstandard is not None:
+            dict_name = dictionary_name_for_url(url)
+            version = self._current_version(dict_name)
+            if version is not None:
+                codec = self._dict_codec(dict_name, version)
+                if codec is not None:
+                    return codec
+            codec_name = CODEC_ZSTD
+
+        if codec_name == CODEC_ZSTD and self.zstd is not None:
+            return self.zstd
+
+        if codec_name != CODEC_GZIP:
+            logging.warning(f"Body codec {codec_name} unavailable for {url}, using gzip")
+        return self.gzip
+
+    def get(self, encoding: str) -> BodyCodec:
+        if encoding == CODEC_GZIP:
+            return self.gzip
+        if encoding == CODEC_ZSTD and self.zstd is not None:
+            return self.zstd
+        if encoding.startswith(CODEC_ZSTD_DICT + ":") and zstandard is not None:
+            dict_name, _, version = encoding[len(CODEC_ZSTD_DICT) + 1:].rpartition(":")
+            codec = self._dict_codec(dict_name, int(version))
+            if codec is None:
+                raise ValueError(f"Compression dictionary {dict_name} version {version} not found")
+            return codec
+        raise ValueError(f"Unsupported body encoding: {encoding}")
+
+
+codec_registry = CodecRegistry(
+    storage,
+    default_codec=settings.body_codec,
+    gzip_level=settings.body_gzip_level,
+    zstd_level=settings.body_zstd_level,
+)
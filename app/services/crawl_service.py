@@ -0,0 +1,63 @@
+import time
+import uuid
+from typing import List, Optional, Dict, Any
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.frontier import bloom_size, frontier
+from app.services.job_service import JobService
+from app.services.response_cache import normalize_url
+from app.services.storage import storage
+from app.services.urls import host_for_url
+from app.schemas.responses import BatchResponse
+
+
+class CrawlService:
+    @staticmethod
+    def build_config(seeds: List[str], max_depth: int, max_pages: int, scope: str,
+                     include: Optional[List[str]], exclude: Optional[List[str]],
+                     priority: Optional[str]) -> Dict[str, Any]:
+        # Travels with every job of the session, so workers need no lookup.
+        bloom_bits, bloom_hashes = bloom_size(max_pages, settings.crawl_bloom_error_rate)
+        return {
+            "max_depth": max_depth,
+            "max_pages": max_pages,
+            "hosts": sorted({host_for_url(url) for url in seeds}),
+            "scope": scope,
+            "include": include or [],
+            "exclude": exclude or [],
+            "priority": priority,
+            "bloom_bits": bloom_bits,
+            "bloom_hashes": bloom_hashes,
+        }
+
+    @staticmethod
+    def start_crawl(batch_id: str, seeds: List[str], crawl: Dict[str, Any], headers: Optional[dict],
+                    timeout: int, body_codec: Optional[str]) -> List[str]:
+        jobs = frontier.admit(batch_id, seeds, 0, crawl)
+        JobService.create_jobs([job["url"] for job in jobs], [job["job_id"] for job in jobs], headers,
+                               timeout, batch_id, body_codec, crawl["priority"], crawl)
+        return [job["job_id"] for job in jobs]
+
+    @staticmethod
+    async def create_crawl(seeds: List[str], max_depth: int, max_pages: int, scope: str = "host",
+                           include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                           headers: Optional[dict] = None, timeout: int = 15,
+                           body_codec: Optional[str] = None, priority: Optional[str] = "low") -> BatchResponse:
+        # A crawl session is a batch whose jobs are added as pages are found;
+        # the batch endpoints report on it as it grows.
+        batch_id = str(uuid.uuid4())
+        unique: Dict[str, str] = {}
+        for url in seeds:
+            unique.setdefault(normalize_url(url), url)
+        seeds = list(unique.values())
+        crawl = CrawlService.build_config(seeds, max_depth, max_pages, scope, include, exclude, priority)
+
+        await storage.asave_batch_info(batch_id, {
+            "batch_id": batch_id,
+            "created_at": time.time(),
+            "total_count": 0,
+            "crawl": crawl,
+        })
+        job_ids = await run_in_threadpool(CrawlService.start_crawl, batch_id, seeds, crawl, headers, timeout,
+                                          body_codec)
+        return BatchResponse(batch_id=batch_id, job_ids=job_ids, total_count=len(job_ids))
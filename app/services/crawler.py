@@ -1,11 +1,28 @@
 import hashlib
+import heapq
 import itertools
 import logging
 import random
+import statistics
+import threading
 import time
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict, deque
+from time import perf_counter
+from typing import Optional, Dict, Any, List, Tuple
 import httpx
 
+from app.services import metrics
+from app.services.detector import DetectionRules, PageDetector
+from app.services.links import LinkExtractor, content_charset
+from app.services.proxy_health import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    LATENCY_PRIOR_REFRESH,
+    LATENCY_WINDOW,
+    ProxyHealth,
+)
+
 HEADERS_POOL = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
@@ -22,15 +39,150 @@ DEFAULT_HEADERS = {
     "User-Agent": random.choice(HEADERS_POOL),
 }
 
-BAN_INDICATORS = [
-    "has been blocked",
-    "blocked",
-    "magic@djinni.co",
-    "your ip address",
-    "contact us at",
-    "access denied",
-    "forbidden"
-]
+OUTCOME_SUCCESS = "success"
+OUTCOME_BLOCKED = "blocked"
+OUTCOME_INVALID = "invalid"
+OUTCOME_HTTP_ERROR = "http_error"
+OUTCOME_EXCEPTION = "exception"
+OUTCOME_NO_PROXY = "no_proxy"
+OUTCOME_NOT_MODIFIED = "not_modified"
+OUTCOME_DEFERRED = "deferred"
+OUTCOME_TOO_LARGE = "too_large"
+
+
+class CrawlAttempt:
+    def __init__(self, outcome: str, proxy: Optional[str] = None, status_code: Optional[int] = None,
+                 content: Optional[bytes] = None, error: Optional[Exception] = None,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 retry_after: float = 0.0, body: Optional[bytes] = None,
+                 body_encoding: Optional[str] = None, digest: Optional[str] = None,
+                 size: int = 0, links: Optional[List[str]] = None):
+        self.outcome = outcome
+        self.proxy = proxy
+        self.status_code = status_code
+        self.content = content
+        self.error = error
+        self.etag = etag
+        self.last_modified = last_modified
+        self.retry_after = retry_after
+        # With a codec the page is only kept encoded, as body/body_encoding.
+        self.body = body
+        self.body_encoding = body_encoding
+        self.digest = digest
+        self.size = size
+        self.links = links
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == OUTCOME_SUCCESS
+
+    @property
+    def deferred(self) -> bool:
+        return self.outcome == OUTCOME_DEFERRED
+
+    @property
+    def not_modified(self) -> bool:
+        return self.outcome == OUTCOME_NOT_MODIFIED
+
+    @property
+    def retryable(self) -> bool:
+        return self.outcome not in (OUTCOME_SUCCESS, OUTCOME_NOT_MODIFIED, OUTCOME_NO_PROXY,
+                                    OUTCOME_TOO_LARGE)
+
+
+# Consumes a response body chunk by chunk: enforces the size limit, spots ban
+# pages in the first window, and hashes and encodes as data arrives. Only the
+# detection windows and the encoded output are held in memory.
+class BodyReader:
+    def __init__(self, rules: DetectionRules, max_bytes: int, codec=None):
+        self.rules = rules
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self.size = 0
+        self.detect_secs = 0.0
+        self.encode_secs = 0.0
+        self.links_secs = 0.0
+        self.links: Optional[LinkExtractor] = None
+
+        self._encoder = codec.encoder() if codec else None
+        self._parts: List[bytes] = []
+        self._sha = hashlib.sha256()
+        self._head = bytearray()
+        self._head_limit = 2 * rules.window if rules.window else max_bytes
+        self._tail = b""
+        self._head_checked = False
+
+    def check_length(self, res: httpx.Response) -> Optional[str]:
+        length = res.headers.get("content-length")
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            return OUTCOME_TOO_LARGE
+        return None
+
+    def extract_links(self, res: httpx.Response, max_links: int):
+        content_type = res.headers.get("content-type", "")
+        if not content_type or "html" in content_type.lower():
+            self.links = LinkExtractor(str(res.url), content_charset(content_type), max_links)
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            return OUTCOME_TOO_LARGE
+
+        if self.links is not None:
+            started = perf_counter()
+            self.links.feed_bytes(chunk)
+            self.links_secs += perf_counter() - started
+
+        self._sha.update(chunk)
+        if self._encoder:
+            started = perf_counter()
+            self._parts.append(self._encoder.compress(chunk))
+            self.encode_secs += perf_counter() - started
+        else:
+            self._parts.append(chunk)
+
+        if len(self._head) < self._head_limit:
+            self._head += chunk[:self._head_limit - len(self._head)]
+        if self.rules.window:
+            self._tail = (self._tail + chunk)[-self.rules.window:]
+
+        if not self._head_checked and (not self.rules.window or len(self._head) >= self.rules.window):
+            self._head_checked = True
+            started = perf_counter()
+            banned = self.rules.has_ban(self._head)
+            self.detect_secs += perf_counter() - started
+            if banned:
+                return OUTCOME_BLOCKED
+        return None
+
+    def classify(self) -> Tuple[bool, bool]:
+        started = perf_counter()
+        verdict = self.rules.classify_parts(bytes(self._head), self._tail, self.size)
+        self.detect_secs += perf_counter() - started
+        return verdict
+
+    def attempt(self, outcome: str, proxy_line: str, res: httpx.Response) -> CrawlAttempt:
+        attempt = CrawlAttempt(outcome, proxy_line, res.status_code,
+                               etag=res.headers.get("etag"),
+                               last_modified=res.headers.get("last-modified"),
+                               size=self.size)
+        if outcome == OUTCOME_TOO_LARGE:
+            attempt.error = ValueError(f"Response body exceeds {self.max_bytes} bytes")
+        if outcome != OUTCOME_SUCCESS:
+            return attempt
+
+        attempt.digest = self._sha.hexdigest()
+        if self.links is not None:
+            attempt.links = self.links.result()
+        if self._encoder:
+            started = perf_counter()
+            self._parts.append(self._encoder.flush())
+            self.encode_secs += perf_counter() - started
+            attempt.body = b"".join(self._parts)
+            attempt.body_encoding = self.codec.name
+        else:
+            attempt.content = b"".join(self._parts)
+        return attempt
 
 
 def auth_line_to_proxy_url(line: str) -> Optional[str]:
@@ -63,13 +215,25 @@ def to_httpx_proxy(proxy_auth_line: Optional[str]) -> Optional[str]:
     return proxy_uri
 
 
+def load_proxy_lines(proxy_file: Optional[str]) -> List[str]:
+    if not proxy_file:
+        return []
+    try:
+        with open(proxy_file, "r") as f:
+            proxies = [ln.strip() for ln in f.read().splitlines() if ln.strip()]
+        logging.info(f"Loaded {len(proxies)} proxies from {proxy_file}")
+        return proxies
+    except FileNotFoundError:
+        logging.error(f"Proxy file not found: {proxy_file}")
+        return []
+
+
 class SmartProxyPool:
     def __init__(self, proxy_list: List[str]):
         self.proxies = proxy_list
         self.proxy_cycle = itertools.cycle(proxy_list) if proxy_list else None
 
-        self.bad_proxies: set[str] = set()
-        self.blocked_proxies: set[str] = set()
+        self.quarantined_proxies: set[str] = set()
         self.proxy_usage_count: Dict[str, int] = {}
         self.proxy_last_used: Dict[str, float] = {}
         self.proxy_success_rate: Dict[str, float] = {}
@@ -79,124 +243,399 @@ class SmartProxyPool:
         self.max_requests_per_proxy = 15
         self.cooldown_time = 300
         self.min_success_rate = 0.3
+        self.min_requests_for_rate = 5
         self.rotation_interval = 10
+        self.score_half_life = 300.0
+        self.latency_alpha = 0.125
+        self.latency_prior = 1.0
+        self.breaker_failures = 5
+        self.breaker_open_secs = 30.0
+        self.breaker_max_open_secs = 1800.0
+        self.ban_open_secs = 600.0
+        self.probe_failures_to_quarantine = 2
+        self.probe_successes_to_restore = 2
 
         self.current_proxy: Optional[str] = None
         self.requests_with_current = 0
         self.total_requests = 0
 
-        logging.info(f"Loaded {len(proxy_list)} proxies")
-
-    def _update_proxy_stats(self, proxy: str, success: bool):
-        if proxy not in self.proxy_total_requests:
-            self.proxy_total_requests[proxy] = 0
-            self.proxy_successful_requests[proxy] = 0
-
-        self.proxy_total_requests[proxy] += 1
-        if success:
-            self.proxy_successful_requests[proxy] += 1
-
-        total = self.proxy_total_requests[proxy]
-        successful = self.proxy_successful_requests[proxy]
-        self.proxy_success_rate[proxy] = successful / total if total > 0 else 0.0
+        # Proxies move between available / cooling down / bad / blocked as
+        # events happen; the heaps are lazily invalidated via _score_version
+        # and _cooldown_until instead of rescanning the whole list per pick.
+        self._order: Dict[str, int] = {}
+        for i, proxy in enumerate(proxy_list):
+            self._order.setdefault(proxy, i)
+        self._available: set[str] = set(self._order)
+        self._score_version: Dict[str, int] = {}
+        self._score_heap: List[tuple] = [(-1.0, i, 0, p) for p, i in self._order.items()]
+        heapq.heapify(self._score_heap)
+        self._cooldown_until: Dict[str, float] = {}
+        self._cooldown_heap: List[tuple] = []
+
+        # Proxies whose circuit breaker is open or half-open; the heap holds
+        # when each is next let back in, checked against ProxyHealth.open_until.
+        self._health: Dict[str, ProxyHealth] = {}
+        # Proxies without a latency estimate, scored with the pool's median.
+        self._unmeasured: set[str] = set(self._order)
+        self._latency_window: deque = deque(maxlen=LATENCY_WINDOW)
+        self._latency_samples = 0
+        self._observed_prior: Optional[float] = None
+        self._tripped: set[str] = set()
+        self._breaker_heap: List[tuple] = []
+
+        # Consecutive health probe results; the prober runs on its own thread.
+        self._probe_streaks: Dict[str, int] = {}
+        self._lock = threading.RLock()
 
-    def _is_proxy_available(self, proxy: str) -> bool:
-        current_time = time.time()
-
-        if proxy in self.bad_proxies or proxy in self.blocked_proxies:
-            return False
+        logging.info(f"Loaded {len(proxy_list)} proxies")
 
-        usage_count = self.proxy_usage_count.get(proxy, 0)
-        if usage_count >= self.max_requests_per_proxy:
-            last_used = self.proxy_last_used.get(proxy, 0)
-            if current_time - last_used < self.cooldown_time:
-                return False
+    def _update_proxy_stats(self, proxy: str, success: bool, blocked: bool, latency: Optional[float]):
+        now = time.time()
+        health = self._health.get(proxy)
+        if health is None:
+            health = self._health[proxy] = ProxyHealth(now)
+        health.record(success and not blocked, latency, now, self.score_half_life, self.latency_alpha)
+        if success and not blocked and latency is not None:
+            self._unmeasured.discard(proxy)
+            self._observe_latency(latency)
+
+        self.proxy_total_requests[proxy] = self.proxy_total_requests.get(proxy, 0) + 1
+        if success and not blocked:
+            self.proxy_successful_requests[proxy] = self.proxy_successful_requests.get(proxy, 0) + 1
+        self.proxy_success_rate[proxy] = health.success_rate
+
+        if self._out_of_service(proxy):
+            return
+
+        if health.state == BREAKER_HALF_OPEN:
+            if success and not blocked:
+                self._close_breaker(proxy, health)
             else:
-                self.proxy_usage_count[proxy] = 0
-
-        if self.proxy_total_requests.get(proxy, 0) >= 5:
-            success_rate = self.proxy_success_rate.get(proxy, 1.0)
-            if success_rate < self.min_success_rate:
-                logging.warning(f"Proxy {proxy} low success rate: {success_rate:.2f}")
-                self.bad_proxies.add(proxy)
-                return False
+                self._trip(proxy, health, self.ban_open_secs if blocked else self.breaker_open_secs, now)
+        elif health.state == BREAKER_OPEN:
+            # Results of requests sent before the breaker opened.
+            return
+        elif blocked:
+            self._trip(proxy, health, self.ban_open_secs, now)
+        elif not success and (health.failures >= self.breaker_failures or (
+                health.total >= self.min_requests_for_rate and health.success_rate < self.min_success_rate)):
+            self._trip(proxy, health, self.breaker_open_secs, now)
+        elif proxy in self._available:
+            self._push_score(proxy)
+
+    def _observe_latency(self, latency: float):
+        self._latency_window.append(latency)
+        self._latency_samples += 1
+        if self._latency_samples % LATENCY_PRIOR_REFRESH:
+            return
+        self._observed_prior = statistics.median(self._latency_window)
+        for proxy in self._unmeasured:
+            if proxy in self._available:
+                self._push_score(proxy)
+
+    def _latency_prior(self) -> float:
+        return self._observed_prior or self.latency_prior
+
+    def _out_of_service(self, proxy: str) -> bool:
+        return proxy in self.quarantined_proxies
+
+    def _trip(self, proxy: str, health: ProxyHealth, open_secs: float, now: float):
+        # Each trip in a row doubles how long the proxy stays out.
+        health.trips += 1
+        duration = min(self.breaker_max_open_secs, open_secs * 2 ** (health.trips - 1))
+        health.state = BREAKER_OPEN
+        self._tripped.add(proxy)
+        self._make_unavailable(proxy)
+        self._schedule_breaker(proxy, health, now + duration)
+        logging.warning(f"Proxy {proxy} circuit open for {duration:.0f}s, "
+                        f"success rate {health.success_rate:.2f}")
+
+    def _close_breaker(self, proxy: str, health: ProxyHealth):
+        health.state = BREAKER_CLOSED
+        health.trips = 0
+        self._tripped.discard(proxy)
+        self.proxy_usage_count[proxy] = 0
+        self._available.add(proxy)
+        self._push_score(proxy)
+        logging.info(f"Proxy {proxy} circuit closed")
+
+    def _schedule_breaker(self, proxy: str, health: ProxyHealth, until: float):
+        health.open_until = until
+        heapq.heappush(self._breaker_heap, (until, proxy))
+
+    def _score(self, proxy: str) -> float:
+        health = self._health.get(proxy)
+        prior = self._latency_prior()
+        return health.goodput(prior) if health else 1.0 / prior
+
+    def _push_score(self, proxy: str):
+        version = self._score_version.get(proxy, 0) + 1
+        self._score_version[proxy] = version
+        heapq.heappush(self._score_heap, (
+            -self._score(proxy), self._order.get(proxy, 0), version, proxy
+        ))
+
+        if len(self._score_heap) > 2 * len(self._available) + 64:
+            self._rebuild_score_heap()
+
+    def _rebuild_score_heap(self):
+        self._score_heap = [
+            (-self._score(p), self._order.get(p, 0), self._score_version.get(p, 0), p)
+            for p in self._available
+        ]
+        heapq.heapify(self._score_heap)
+
+    def _make_unavailable(self, proxy: str):
+        self._available.discard(proxy)
+        self._cooldown_until.pop(proxy, None)
+
+    def _release_cooldowns(self, current_time: float):
+        while self._cooldown_heap and self._cooldown_heap[0][0] <= current_time:
+            until, proxy = heapq.heappop(self._cooldown_heap)
+            if self._cooldown_until.get(proxy) != until:
+                continue
+            del self._cooldown_until[proxy]
+            self.proxy_usage_count[proxy] = 0
+            self._available.add(proxy)
+            self._push_score(proxy)
+
+        # Open breakers go half-open: the proxy is pickable for one trial request.
+        while self._breaker_heap and self._breaker_heap[0][0] <= current_time:
+            until, proxy = heapq.heappop(self._breaker_heap)
+            health = self._health.get(proxy)
+            if health is None or health.state == BREAKER_CLOSED or health.open_until != until:
+                continue
+            if self._out_of_service(proxy):
+                continue
+            health.state = BREAKER_HALF_OPEN
+            self.proxy_usage_count[proxy] = 0
+            self._available.add(proxy)
+            self._push_score(proxy)
+
+    def _top_available(self, count: int) -> List[str]:
+        top: List[tuple] = []
+        while self._score_heap and len(top) < count:
+            entry = heapq.heappop(self._score_heap)
+            proxy = entry[3]
+            if proxy in self._available and entry[2] == self._score_version.get(proxy, 0):
+                top.append(entry)
+        for entry in top:
+            heapq.heappush(self._score_heap, entry)
+        return [entry[3] for entry in top]
 
-        return True
+    def _is_proxy_available(self, proxy: str) -> bool:
+        self._release_cooldowns(time.time())
+        return proxy in self._available
 
     def get_available_proxies(self) -> List[str]:
-        return [p for p in self.proxies if self._is_proxy_available(p)]
+        with self._lock:
+            self._release_cooldowns(time.time())
+            return [p for p in self.proxies if p in self._available]
 
     def pick_proxy_line(self) -> Optional[str]:
-        available_proxies = self.get_available_proxies()
+        with self._lock:
+            current_time = time.time()
+            self._release_cooldowns(current_time)
 
-        if not available_proxies:
-            logging.error("No available proxies")
+            if not self._available:
+                logging.error("No available proxies")
+                return None
+
+            self.total_requests += 1
+
+            if (self.current_proxy and
+                    self.requests_with_current >= self.rotation_interval):
+                logging.info(f"Forced rotation after {self.requests_with_current} requests")
+                self.current_proxy = None
+                self.requests_with_current = 0
+
+            if (not self.current_proxy or
+                    self.current_proxy not in self._available):
+                top_proxies = self._top_available(3)
+                self.current_proxy = random.choice(top_proxies)
+                self.requests_with_current = 0
+
+                logging.info(f"Selected proxy: {self.current_proxy}")
+
+            proxy = self.current_proxy
+            usage_count = self.proxy_usage_count.get(proxy, 0) + 1
+            self.proxy_usage_count[proxy] = usage_count
+            self.proxy_last_used[proxy] = current_time
+            self.requests_with_current += 1
+
+            health = self._health.get(proxy)
+            if health is not None and health.state == BREAKER_HALF_OPEN:
+                # Out again until the trial's result closes or reopens the
+                # breaker, or the lease runs out if it never reports.
+                self._available.discard(proxy)
+                self._schedule_breaker(proxy, health, current_time + self.breaker_open_secs)
+            elif usage_count >= self.max_requests_per_proxy:
+                until = current_time + self.cooldown_time
+                self._available.discard(proxy)
+                self._cooldown_until[proxy] = until
+                heapq.heappush(self._cooldown_heap, (until, proxy))
+
+            return proxy
+
+    def release_proxy_line(self, proxy: str):
+        # Takes back a pick whose request never went out.
+        if not proxy:
+            return
+        with self._lock:
+            self.total_requests = max(0, self.total_requests - 1)
+            if proxy == self.current_proxy and self.requests_with_current > 0:
+                self.requests_with_current -= 1
+            usage_count = max(0, self.proxy_usage_count.get(proxy, 0) - 1)
+            self.proxy_usage_count[proxy] = usage_count
+
+            if proxy in self._available or self._out_of_service(proxy):
+                return
+            health = self._health.get(proxy)
+            if health is not None and health.state == BREAKER_HALF_OPEN:
+                # Hands the trial lease back; the stale heap entry is skipped.
+                health.open_until = 0.0
+            elif proxy not in self._cooldown_until or usage_count >= self.max_requests_per_proxy:
+                return
+            self._cooldown_until.pop(proxy, None)
+            self._available.add(proxy)
+            self._push_score(proxy)
+
+    def report_request_result(self, proxy: str, success: bool, blocked: bool = False,
+                              latency: Optional[float] = None):
+        if not proxy:
+            return
+        with self._lock:
+            self._update_proxy_stats(proxy, success, blocked, latency)
+
+    def record_probe(self, proxy: str, healthy: bool) -> Optional[str]:
+        # Positive streaks count passed probes, negative ones failed probes.
+        with self._lock:
+            streak = self._probe_streaks.get(proxy, 0)
+            streak = max(streak, 0) + 1 if healthy else min(streak, 0) - 1
+            self._probe_streaks[proxy] = streak
+
+            out = proxy in self.quarantined_proxies
+            if healthy and out and streak >= self.probe_successes_to_restore:
+                self.quarantined_proxies.discard(proxy)
+                # Earlier failures would otherwise mark it bad again at once.
+                for stats in (self.proxy_total_requests, self.proxy_successful_requests,
+                              self.proxy_success_rate, self.proxy_usage_count, self._health):
+                    stats.pop(proxy, None)
+                self._unmeasured.add(proxy)
+                self._tripped.discard(proxy)
+                self._available.add(proxy)
+                self._push_score(proxy)
+                logging.info(f"Proxy {proxy} restored after {streak} healthy probes")
+                return "restored"
+
+            health = self._health.get(proxy)
+            if (healthy and not out and streak >= self.probe_successes_to_restore
+                    and health is not None and health.state == BREAKER_OPEN):
+                # Healthy probes earn an open breaker its trial request now
+                # instead of when it runs out.
+                health.state = BREAKER_HALF_OPEN
+                health.open_until = 0.0
+                self.proxy_usage_count[proxy] = 0
+                self._available.add(proxy)
+                self._push_score(proxy)
+                logging.info(f"Proxy {proxy} circuit half-open after {streak} healthy probes")
+                return "half_open"
+
+            if not healthy and not out and -streak >= self.probe_failures_to_quarantine:
+                self.quarantined_proxies.add(proxy)
+                self._make_unavailable(proxy)
+                # Quarantine takes over from the breaker, as in PROBE_SCRIPT.
+                self._tripped.discard(proxy)
+                if health is not None:
+                    health.state = BREAKER_CLOSED
+                    health.open_until = 0.0
+                logging.warning(f"Proxy {proxy} quarantined after {-streak} failed probes")
+                return "quarantined"
             return None
 
-        self.total_requests += 1
-
-        if (self.current_proxy and
-                self.requests_with_current >= self.rotation_interval):
-            logging.info(f"Forced rotation after {self.requests_with_current} requests")
-            self.current_proxy = None
-            self.requests_with_current = 0
-
-        if (not self.current_proxy or
-                self.current_proxy not in available_proxies):
-            available_proxies.sort(
-                key=lambda p: self.proxy_success_rate.get(p, 1.0),
-                reverse=True
-            )
+    def claim_probe_round(self, interval: float) -> bool:
+        return True
 
-            top_proxies = available_proxies[:min(3, len(available_proxies))]
-            self.current_proxy = random.choice(top_proxies)
-            self.requests_with_current = 0
+    def healthiest(self, count: int) -> List[str]:
+        with self._lock:
+            self._release_cooldowns(time.time())
+            return self._top_available(count)
 
-            logging.info(f"Selected proxy: {self.current_proxy}")
+    async def apick_proxy_line(self) -> Optional[str]:
+        return self.pick_proxy_line()
 
-        current_time = time.time()
-        self.proxy_usage_count[self.current_proxy] = \
-            self.proxy_usage_count.get(self.current_proxy, 0) + 1
-        self.proxy_last_used[self.current_proxy] = current_time
-        self.requests_with_current += 1
+    async def arelease_proxy_line(self, proxy: str):
+        self.release_proxy_line(proxy)
 
-        return self.current_proxy
+    async def areport_request_result(self, proxy: str, success: bool, blocked: bool = False,
+                                     latency: Optional[float] = None):
+        self.report_request_result(proxy, success, blocked, latency)
 
-    def mark_proxy_blocked(self, proxy: str):
-        if proxy:
-            self.blocked_proxies.add(proxy)
-            logging.error(f"Proxy {proxy} blocked by djinni")
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._release_cooldowns(time.time())
+            return {
+                "total_proxies": len(self.proxies),
+                "available": len(self._available),
+                "quarantined": len(self.quarantined_proxies),
+                "circuit_open": len(self._tripped),
+                "current_proxy": self.current_proxy,
+                "total_requests": self.total_requests,
+                "requests_with_current": self.requests_with_current
+            }
+
+
+class ClientPool:
+    def __init__(self, max_clients: int = 64, use_http2: bool = True,
+                 max_keepalive_connections: int = 10, keepalive_expiry: float = 5.0):
+        self.max_clients = max(1, max_clients)
+        self.use_http2 = use_http2
+        self.limits = httpx.Limits(
+            max_keepalive_connections=max_keepalive_connections,
+            max_connections=max_keepalive_connections * 2,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+        self._clients: "OrderedDict[Optional[str], httpx.Client]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, proxy_url: Optional[str]) -> httpx.Client:
+        evicted: Optional[httpx.Client] = None
+
+        with self._lock:
+            client = self._clients.get(proxy_url)
+            if client is not None:
+                self._clients.move_to_end(proxy_url)
+                return client
+
+            client = httpx.Client(
+                http2=self.use_http2,
+                proxy=proxy_url,
+                limits=self.limits,
+                follow_redirects=True,
+            )
+            self._clients[proxy_url] = client
 
-    def mark_proxy_bad(self, proxy: str):
-        if proxy:
-            self.bad_proxies.add(proxy)
-            logging.warning(f"Proxy {proxy} marked as bad")
+            if len(self._clients) > self.max_clients:
+                _, evicted = self._clients.popitem(last=False)
 
-    def report_request_result(self, proxy: str, success: bool, blocked: bool = False):
-        if blocked:
-            self.mark_proxy_blocked(proxy)
-        elif not success:
-            self.mark_proxy_bad(proxy)
+        if evicted is not None:
+            evicted.close()
 
-        self._update_proxy_stats(proxy, success and not blocked)
+        return client
 
-    def get_stats(self) -> Dict[str, Any]:
-        available = len(self.get_available_proxies())
-        blocked = len(self.blocked_proxies)
-        bad = len(self.bad_proxies)
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
 
-        return {
-            "total_proxies": len(self.proxies),
-            "available": available,
-            "blocked_by_djinni": blocked,
-            "bad": bad,
-            "current_proxy": self.current_proxy,
-            "total_requests": self.total_requests,
-            "requests_with_current": self.requests_with_current
-        }
+    def __len__(self) -> int:
+        return len(self._clients)
 
 
-class Crawler:
+class BaseCrawler:
     def __init__(
             self,
             proxy_file: Optional[str],
@@ -205,6 +644,11 @@ class Crawler:
             delay: float = 1.0,
             headers: Optional[Dict[str, str]] = None,
             use_http2: bool = True,
+            proxy_pool=None,
+            backoff=None,
+            rate_limiter=None,
+            detector: Optional[PageDetector] = None,
+            max_body_bytes: int = 10 * 2 ** 20,
     ):
         self.proxy_file = proxy_file
         self.max_retries = max_retries
@@ -212,130 +656,276 @@ class Crawler:
         self.delay = delay
         self.headers = headers or DEFAULT_HEADERS.copy()
         self.use_http2 = use_http2
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+        self.detector = detector or PageDetector()
+        self.max_body_bytes = max_body_bytes
 
-        proxies: list[str] = []
-        if proxy_file:
-            try:
-                with open(proxy_file, "r") as f:
-                    proxies = [ln.strip() for ln in f.read().splitlines() if ln.strip()]
-                logging.info(f"Loaded {len(proxies)} proxies from {proxy_file}")
-            except FileNotFoundError:
-                logging.error(f"Proxy file not found: {proxy_file}")
-                proxies = []
-
-        self.proxy_pool = SmartProxyPool(proxies) if proxies else None
+        if proxy_pool is None:
+            proxies = load_proxy_lines(proxy_file)
+            proxy_pool = SmartProxyPool(proxies) if proxies else None
+        self.proxy_pool = proxy_pool
 
         self._request_count = 0
         self._successful_requests = 0
         self._blocked_requests = 0
 
     def is_blocked_response(self, content: str) -> bool:
-        if not content or len(content) < 100:
-            return True
-
-        content_lower = content.lower()
-        return any(indicator in content_lower for indicator in BAN_INDICATORS)
+        blocked, _ = self.detector.classify(None, content.encode("utf-8") if content else b"")
+        return blocked
 
     def is_valid_djinni_page(self, content: str) -> bool:
-        if not content or len(content) < 1000:
-            return False
+        _, valid = self.detector.classify(None, content.encode("utf-8") if content else b"")
+        return valid
 
-        content_lower = content.lower()
-        valid_indicators = ["djinni", "вакансии", "jobs", "vacancy"]
-        return any(indicator in content_lower for indicator in valid_indicators)
+    def _request_headers(self, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        current_headers = dict(headers or self.headers)
+        current_headers["User-Agent"] = random.choice(HEADERS_POOL)
+        return current_headers
 
-    def crawl_bytes(self, url: str) -> Optional[bytes]:
-        if not self.proxy_pool:
-            logging.error("No proxy pool available")
-            return None
+    def _request_timeout(self, timeout: Optional[float]) -> httpx.Timeout:
+        return httpx.Timeout(connect=6, read=timeout or self.timeout, write=10, pool=5)
 
-        tries = 0
-        last_exc: Optional[Exception] = None
+    @staticmethod
+    def _deferred(proxy_line: Optional[str], wait: float) -> CrawlAttempt:
+        # Spread deferred requests out so they don't all return at once.
+        return CrawlAttempt(OUTCOME_DEFERRED, proxy_line, retry_after=wait + random.uniform(0, wait))
 
-        while tries < self.max_retries:
-            proxy_line = self.proxy_pool.pick_proxy_line()
-            if not proxy_line:
-                logging.error("No available proxies")
-                break
+    def _body_reader(self, url: str, codec=None) -> BodyReader:
+        return BodyReader(self.detector.rules_for(url), self.max_body_bytes, codec)
+
+    def _evaluate_status(self, proxy_line: str, status_code: int) -> Optional[str]:
+        if status_code == 304:
+            self._successful_requests += 1
+            return OUTCOME_NOT_MODIFIED
 
-            proxy_url = to_httpx_proxy(proxy_line)
+        if not 200 <= status_code < 300:
+            logging.warning(f"HTTP {status_code} from {proxy_line}")
+            return OUTCOME_HTTP_ERROR
 
-            current_headers = self.headers.copy()
-            current_headers["User-Agent"] = random.choice(HEADERS_POOL)
+        return None
 
-            try:
-                logging.info(f"Crawling {url} via {proxy_line}")
+    def _evaluate_body(self, proxy_line: str, reader: BodyReader, aborted: Optional[str]) -> str:
+        if aborted == OUTCOME_TOO_LARGE:
+            logging.warning(f"Body over {reader.max_bytes} bytes from {proxy_line}, aborted")
+            return OUTCOME_TOO_LARGE
 
-                timeout = httpx.Timeout(connect=6, read=self.timeout, write=10, pool=5)
-                with httpx.Client(
-                        http2=self.use_http2,
-                        proxy=proxy_url,
-                        timeout=timeout,
-                        follow_redirects=True,
-                        headers=current_headers,
-                ) as client:
-                    res = client.get(url)
+        blocked, valid = (True, False) if aborted == OUTCOME_BLOCKED else reader.classify()
+
+        if blocked:
+            logging.error(f"Proxy {proxy_line} blocked by target")
+            self._blocked_requests += 1
+            return OUTCOME_BLOCKED
+
+        if not valid:
+            logging.warning(f"Invalid page from {proxy_line}")
+            return OUTCOME_INVALID
+
+        self._successful_requests += 1
+        return OUTCOME_SUCCESS
+
+    @staticmethod
+    def _outcome_result(outcome: str, status_code: Optional[int] = None) -> Tuple[bool, bool]:
+        # An oversized page is the target's doing, not the proxy's, and so is
+        # a client error: the proxy delivered the answer. 403 counts as a ban,
+        # 407, 429 and 5xx as the proxy failing.
+        if outcome == OUTCOME_HTTP_ERROR and status_code is not None:
+            if status_code == 403:
+                return False, True
+            return 400 <= status_code < 500 and status_code not in (407, 429), False
+        return outcome in (OUTCOME_SUCCESS, OUTCOME_NOT_MODIFIED, OUTCOME_TOO_LARGE), outcome == OUTCOME_BLOCKED
+
+    @staticmethod
+    def _observe(url: str, proxy_line: Optional[str], outcome: str, timer: metrics.PhaseTimer,
+                 reader: Optional[BodyReader] = None):
+        metrics.count_request(url, proxy_line, outcome)
+        if reader is not None and reader.size:
+            timer.add("detection", reader.detect_secs)
+            if reader.codec:
+                timer.add("compression", reader.encode_secs)
+            if reader.links is not None:
+                timer.add("links", reader.links_secs)
+        timer.observe()
+
+    def _report_outcome(self, proxy_line: str, outcome: str, status_code: Optional[int] = None,
+                        latency: Optional[float] = None):
+        success, blocked = self._outcome_result(outcome, status_code)
+        self.proxy_pool.report_request_result(proxy_line, success, blocked=blocked, latency=latency)
+
+        if success and self._request_count % 10 == 0:
+            self._log_stats()
+
+    def _log_stats(self):
+        stats = self.proxy_pool.get_stats()
+        logging.info(f"Stats: {self._successful_requests}/{self._request_count} success, "
+                     f"{stats['available']}/{stats['total_proxies']} proxies available, "
+                     f"{stats['circuit_open']} circuit open, {stats['quarantined']} quarantined")
+
+    def _retry_delay(self, outcome: str, tries: int) -> float:
+        if self.backoff is not None:
+            return self.backoff.compute(tries, blocked=outcome == OUTCOME_BLOCKED)
+        if outcome == OUTCOME_BLOCKED:
+            return self.delay * 3
+        if outcome == OUTCOME_INVALID:
+            return self.delay
+        return self.delay * min(tries, 3)
+
+    def get_stats(self) -> Dict[str, Any]:
+        proxy_stats = self.proxy_pool.get_stats() if self.proxy_pool else {}
+
+        return {
+            "total_requests": self._request_count,
+            "successful_requests": self._successful_requests,
+            "blocked_requests": self._blocked_requests,
+            "success_rate": self._successful_requests / self._request_count if self._request_count > 0 else 0,
+            "proxy_stats": proxy_stats
+        }
+
+
+class Crawler(BaseCrawler):
+    def __init__(
+            self,
+            proxy_file: Optional[str],
+            max_retries: int = 3,
+            timeout: float = 10.0,
+            delay: float = 1.0,
+            headers: Optional[Dict[str, str]] = None,
+            use_http2: bool = True,
+            max_clients: int = 64,
+            proxy_pool=None,
+            backoff=None,
+            rate_limiter=None,
+            detector: Optional[PageDetector] = None,
+            max_body_bytes: int = 10 * 2 ** 20,
+            keepalive_expiry: float = 5.0,
+    ):
+        super().__init__(proxy_file, max_retries, timeout, delay, headers, use_http2, proxy_pool, backoff,
+                         rate_limiter, detector, max_body_bytes)
+        self.client_pool = ClientPool(max_clients=max_clients, use_http2=use_http2,
+                                      keepalive_expiry=keepalive_expiry)
+
+    def prewarm(self, proxy_line: str, url: str, timeout: Optional[float] = None) -> bool:
+        # Leaves a keep-alive connection to url's origin in the proxy's pooled client.
+        try:
+            self.client_pool.get(to_httpx_proxy(proxy_line)).head(
+                url, headers=self._request_headers(None), timeout=self._request_timeout(timeout)
+            )
+            return True
+        except httpx.HTTPError as e:
+            logging.debug(f"Prewarming {proxy_line} failed: {e}")
+            return False
+
+    def _acquire_token(self, url: str, proxy_line: Optional[str],
+                       timer: metrics.PhaseTimer) -> Optional[CrawlAttempt]:
+        started = perf_counter()
+        wait = self.rate_limiter.acquire(url, proxy_line)
+        timer.add("rate_limit", perf_counter() - started)
+        if wait <= 0:
+            return None
+        self._observe(url, proxy_line, OUTCOME_DEFERRED, timer)
+        return self._deferred(proxy_line, wait)
+
+    def crawl_once(self, url: str, headers: Optional[Dict[str, str]] = None,
+                   timeout: Optional[float] = None, codec=None, max_links: int = 0) -> CrawlAttempt:
+        if not self.proxy_pool:
+            logging.error("No proxy pool available")
+            return CrawlAttempt(OUTCOME_NO_PROXY)
+
+        timer = metrics.PhaseTimer()
+        if self.rate_limiter and not self.rate_limiter.per_proxy:
+            # Only the host's bucket applies, so a deferred attempt picks no proxy.
+            deferred = self._acquire_token(url, None, timer)
+            if deferred:
+                return deferred
+
+        started = perf_counter()
+        proxy_line = self.proxy_pool.pick_proxy_line()
+        timer.add("pick", perf_counter() - started)
+        if not proxy_line:
+            logging.error("No available proxies")
+            self._observe(url, None, OUTCOME_NO_PROXY, timer)
+            return CrawlAttempt(OUTCOME_NO_PROXY)
+
+        if self.rate_limiter and self.rate_limiter.per_proxy:
+            deferred = self._acquire_token(url, proxy_line, timer)
+            if deferred:
+                self.proxy_pool.release_proxy_line(proxy_line)
+                return deferred
+
+        proxy_url = to_httpx_proxy(proxy_line)
+        reader: Optional[BodyReader] = None
+
+        try:
+            logging.info(f"Crawling {url} via {proxy_line}")
+
+            client = self.client_pool.get(proxy_url)
+            reader = self._body_reader(url, codec)
+            # Leaving the block early closes the response, dropping the rest of the body.
+            with metrics.IN_FLIGHT.track_inprogress():
+                started = perf_counter()
+                with client.stream("GET", url, headers=self._request_headers(headers),
+                                   timeout=self._request_timeout(timeout),
+                                   extensions={"trace": timer.trace}) as res:
+                    latency = perf_counter() - started
+                    timer.headers_received(started)
                     self._request_count += 1
+                    outcome = self._evaluate_status(proxy_line, res.status_code)
+                    if outcome is None:
+                        if max_links:
+                            reader.extract_links(res, max_links)
+                        aborted = reader.check_length(res)
+                        if aborted is None:
+                            started = perf_counter()
+                            for chunk in res.iter_bytes():
+                                aborted = reader.feed(chunk)
+                                if aborted:
+                                    break
+                            timer.add("download", perf_counter() - started - reader.detect_secs
+                                      - reader.encode_secs - reader.links_secs)
+                        outcome = self._evaluate_body(proxy_line, reader, aborted)
+
+            self._report_outcome(proxy_line, outcome, res.status_code, latency)
+            attempt = reader.attempt(outcome, proxy_line, res)
+            self._observe(url, proxy_line, outcome, timer, reader)
+            return attempt
+
+        except Exception as e:
+            logging.error(f"Error with {proxy_line}: {str(e)[:100]}")
+            self._report_outcome(proxy_line, OUTCOME_EXCEPTION)
+            self._observe(url, proxy_line, OUTCOME_EXCEPTION, timer, reader)
+            return CrawlAttempt(OUTCOME_EXCEPTION, proxy_line, error=e)
+
+    def crawl_bytes(self, url: str, headers: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None) -> Optional[bytes]:
+        tries = 0
+        last_exc: Optional[Exception] = None
 
-                    if 200 <= res.status_code < 300:
-                        content = res.content.decode("utf-8", "replace")
-
-                        if self.is_blocked_response(content):
-                            logging.error(f"Proxy {proxy_line} blocked by djinni")
-                            self.proxy_pool.report_request_result(proxy_line, False, blocked=True)
-                            self._blocked_requests += 1
-                            tries += 1
-                            time.sleep(self.delay * 3)
-                            continue
-
-                        if not self.is_valid_djinni_page(content):
-                            logging.warning(f"Invalid djinni page from {proxy_line}")
-                            self.proxy_pool.report_request_result(proxy_line, False)
-                            tries += 1
-                            time.sleep(self.delay)
-                            continue
-
-                        self.proxy_pool.report_request_result(proxy_line, True)
-                        self._successful_requests += 1
-
-                        if self._request_count % 10 == 0:
-                            stats = self.proxy_pool.get_stats()
-                            logging.info(f"Stats: {self._successful_requests}/{self._request_count} success, "
-                                         f"{stats['available']}/{stats['total_proxies']} proxies available, "
-                                         f"{stats['blocked_by_djinni']} blocked")
-
-                        return res.content
-                    else:
-                        logging.warning(f"HTTP {res.status_code} from {proxy_line}")
-                        self.proxy_pool.report_request_result(proxy_line, False)
-
-            except Exception as e:
-                last_exc = e
-                logging.error(f"Error with {proxy_line}: {str(e)[:100]}")
-                self.proxy_pool.report_request_result(proxy_line, False)
+        while tries < self.max_retries:
+            attempt = self.crawl_once(url, headers=headers, timeout=timeout)
+            if attempt.deferred:
+                time.sleep(attempt.retry_after)
+                continue
+            if attempt.ok:
+                return attempt.content
+            if not attempt.retryable:
+                break
+            if attempt.error:
+                last_exc = attempt.error
 
             tries += 1
-            delay_multiplier = min(tries, 3)
-            time.sleep(self.delay * delay_multiplier)
+            time.sleep(self._retry_delay(attempt.outcome, tries))
 
         if last_exc:
             logging.error(f"All retries failed: {last_exc}")
 
         return None
 
-    def crawl(self, url: str) -> Optional[str]:
-        data = self.crawl_bytes(url)
+    def crawl(self, url: str, headers: Optional[Dict[str, str]] = None,
+              timeout: Optional[float] = None) -> Optional[str]:
+        data = self.crawl_bytes(url, headers=headers, timeout=timeout)
         if data is None:
             return None
         return data.decode("utf-8", "replace")
 
-    def get_stats(self) -> Dict[str, Any]:
-        proxy_stats = self.proxy_pool.get_stats() if self.proxy_pool else {}
-
-        return {
-            "total_requests": self._request_count,
-            "successful_requests": self._successful_requests,
-            "blocked_requests": self._blocked_requests,
-            "success_rate": self._successful_requests / self._request_count if self._request_count > 0 else 0,
-            "proxy_stats": proxy_stats
-        }
+    def close(self):
+        self.client_pool.close()
@@ -0,0 +1,111 @@
+import json
+import logging
+from typing import Optional, Dict, List, Tuple
+
+from app.services.urls import host_for_url
+
+BAN_INDICATORS = [
+    "has been blocked",
+    "blocked",
+    "magic@djinni.co",
+    "your ip address",
+    "contact us at",
+    "access denied",
+    "forbidden"
+]
+
+VALID_INDICATORS = ["djinni", "вакансии", "jobs", "vacancy"]
+
+
+def _needles(indicators: List[str]) -> Tuple[bytes, ...]:
+    # Pages are matched after bytes.lower(), which only folds ASCII, so
+    # non-ASCII indicators also get their upper-case and capitalized spellings.
+    needles = set()
+    for indicator in indicators:
+        for variant in (indicator.lower(), indicator.upper(), indicator.capitalize()):
+            needles.add(variant.encode("utf-8").lower())
+    return tuple(sorted(needles))
+
+
+class DetectionRules:
+    def __init__(self, ban_indicators: List[str], valid_indicators: List[str],
+                 min_length: int = 100, min_valid_length: int = 1000, window: int = 65536):
+        self.ban_indicators = ban_indicators
+        self.valid_indicators = valid_indicators
+        self.min_length = min_length
+        self.min_valid_length = min_valid_length
+        self.window = window
+
+        self._ban = _needles(ban_indicators)
+        self._valid = _needles(valid_indicators)
+
+    def _windows(self, body: bytes) -> List[bytes]:
+        if not self.window or len(body) <= 2 * self.window:
+            return [body.lower()]
+        return [body[:self.window].lower(), body[-self.window:].lower()]
+
+    def _verdict(self, windows: List[bytes], length: int) -> Tuple[bool, bool]:
+        if length < self.min_length:
+            return True, False
+        if any(needle in chunk for chunk in windows for needle in self._ban):
+            return True, False
+        valid = not self._valid or any(needle in chunk for chunk in windows for needle in self._valid)
+        return False, valid and length >= self.min_valid_length
+
+    def classify(self, body: bytes) -> Tuple[bool, bool]:
+        if not body:
+            return True, False
+        return self._verdict(self._windows(body), len(body))
+
+    def has_ban(self, head: bytes) -> bool:
+        chunk = head[:self.window].lower() if self.window else head.lower()
+        return any(needle in chunk for needle in self._ban)
+
+    def classify_parts(self, head: bytes, tail: bytes, length: int) -> Tuple[bool, bool]:
+        # Same verdict as classify() for a streamed body, given its first
+        # 2 * window bytes and its last window bytes.
+        if not self.window or length <= 2 * self.window:
+            return self._verdict([head.lower()], length)
+        return self._verdict([head[:self.window].lower(), tail.lower()], length)
+
+    @classmethod
+    def from_dict(cls, config: Dict, window: int) -> "DetectionRules":
+        return cls(
+            ban_indicators=config.get("ban", BAN_INDICATORS),
+            valid_indicators=config.get("valid", []),
+            min_length=config.get("min_length", 100),
+            min_valid_length=config.get("min_valid_length", 1000),
+            window=config.get("window", window),
+        )
+
+
+class PageDetector:
+    def __init__(self, default_rules: Optional[DetectionRules] = None,
+                 host_rules: Optional[Dict[str, DetectionRules]] = None):
+        self.default_rules = default_rules or DetectionRules(BAN_INDICATORS, VALID_INDICATORS)
+        self.host_rules = host_rules or {}
+
+    def rules_for(self, url: Optional[str]) -> DetectionRules:
+        if url and self.host_rules:
+            return self.host_rules.get(host_for_url(url), self.default_rules)
+        return self.default_rules
+
+    def classify(self, url: Optional[str], body: bytes) -> Tuple[bool, bool]:
+        return self.rules_for(url).classify(body)
+
+    @classmethod
+    def from_file(cls, path: Optional[str], window: int = 65536) -> "PageDetector":
+        default_rules = DetectionRules(BAN_INDICATORS, VALID_INDICATORS, window=window)
+        if not path:
+            return cls(default_rules)
+
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        host_rules = {
+            host.lower(): DetectionRules.from_dict(rules, window)
+            for host, rules in config.items() if host != "*"
+        }
+        if "*" in config:
+            default_rules = DetectionRules.from_dict(config["*"], window)
+        logging.info(f"Loaded detection rules for {len(host_rules)} hosts from {path}")
+        return cls(default_rules, host_rules)
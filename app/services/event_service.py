@@ -0,0 +1,97 @@
+import json
+from typing import AsyncIterator, Optional, Dict, Any, Tuple
+from app.core.config import settings
+from app.services.batch_service import BatchService
+from app.services.job_service import JobService
+from app.services.storage import storage, job_event
+from app.schemas.responses import TaskState
+
+TERMINAL_STATES = (TaskState.SUCCESS.value, TaskState.FAILURE.value)
+KEEPALIVE = b": keepalive\n\n"
+
+
+def _sse(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def _stream_id(event_id: str) -> Tuple[int, int]:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class EventService:
+    @staticmethod
+    async def _resume_point(kind: str, object_id: str, cursor: Optional[str]) -> Tuple[str, bool, bool]:
+        # Where to read the stream from, whether the client needs a snapshot
+        # first (no cursor, or the stream was trimmed past it) and whether it
+        # has already seen the newest event.
+        first, last = await storage.aget_event_bounds(kind, object_id)
+        if cursor and first:
+            try:
+                if _stream_id(first) <= _stream_id(cursor) <= _stream_id(last):
+                    return cursor, False, cursor == last
+            except ValueError:
+                pass
+        return last or "0-0", True, True
+
+    @staticmethod
+    async def _follow(kind: str, object_id: str, after: str) -> AsyncIterator[Optional[Tuple[str, Dict[str, str]]]]:
+        # Yields None whenever no event arrived within the keepalive interval.
+        while True:
+            entries = await storage.aread_events(kind, object_id, after, settings.events_keepalive_secs * 1000)
+            if not entries:
+                yield None
+            for event_id, fields in entries:
+                after = event_id
+                yield event_id, fields
+
+    @staticmethod
+    async def job_events(job_id: str, cursor: Optional[str] = None) -> AsyncIterator[bytes]:
+        after, snapshot, _ = await EventService._resume_point("job", job_id, cursor)
+        if snapshot:
+            state = (await JobService.get_job_status(job_id)).state.value
+            payload = None
+            if state in TERMINAL_STATES:
+                payload = await storage.aget_job_result(job_id, with_body=False)
+            yield _sse("snapshot", job_event(job_id, (payload or {}).get("batch_id"), state, payload))
+            if state in TERMINAL_STATES:
+                return
+
+        async for entry in EventService._follow("job", job_id, after):
+            if entry is None:
+                yield KEEPALIVE
+                continue
+            event_id, fields = entry
+            data = json.loads(fields["data"])
+            yield _sse("state", data, event_id)
+            if data["state"] in TERMINAL_STATES:
+                return
+
+    @staticmethod
+    async def batch_events(batch_id: str, cursor: Optional[str] = None) -> AsyncIterator[bytes]:
+        after, snapshot, caught_up = await EventService._resume_point("batch", batch_id, cursor)
+        status = await BatchService.get_batch_status(batch_id)
+        if status is None:
+            return
+        if snapshot:
+            yield _sse("snapshot", status.model_dump(exclude={"jobs"}))
+        if caught_up and status.completed >= status.total:
+            yield _sse("done", status.model_dump(exclude={"jobs"}))
+            return
+
+        async for entry in EventService._follow("batch", batch_id, after):
+            if entry is None:
+                yield KEEPALIVE
+                continue
+            event_id, fields = entry
+            succeeded, failed = int(fields["succeeded"]), int(fields["failed"])
+            data = {**json.loads(fields["data"]), "succeeded": succeeded, "failed": failed,
+                    "completed": succeeded + failed, "total": status.total}
+            yield _sse("state", data, event_id)
+            if succeeded + failed >= status.total:
+                # Crawl sessions may have grown since the status was read.
+                status = await BatchService.get_batch_status(batch_id)
+                if status.completed >= status.total:
+                    yield _sse("done", status.model_dump(exclude={"jobs"}))
+                    return
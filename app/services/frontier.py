@@ -0,0 +1,101 @@
+import hashlib
+import math
+import uuid
+from typing import Optional, Dict, Any, List, Tuple
+import redis
+
+from app.core.config import settings
+from app.services.response_cache import normalize_url
+
+# Admits discovered URLs into a crawl session. Each URL comes as its job id
+# followed by its Bloom filter bit positions; a URL with any bit unset is new,
+# gets its bits set and becomes a job of the session, until `max_pages` jobs
+# exist. Returns the admitted job ids.
+ADMIT_SCRIPT = """
+local seen, counters, jobs, depths = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local ttl, max_pages, depth, hashes = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3], tonumber(ARGV[4])
+
+local total = tonumber(redis.call('HGET', counters, 'total') or '0')
+local admitted = {}
+local i = 5
+while i <= #ARGV and total < max_pages do
+    local new = false
+    for j = 1, hashes do
+        if redis.call('GETBIT', seen, ARGV[i + j]) == 0 then
+            new = true
+            break
+        end
+    end
+    if new then
+        for j = 1, hashes do
+            redis.call('SETBIT', seen, ARGV[i + j], 1)
+        end
+        admitted[#admitted + 1] = ARGV[i]
+        redis.call('HSET', depths, ARGV[i], depth)
+        total = total + 1
+    end
+    i = i + hashes + 1
+end
+
+if #admitted > 0 then
+    -- unpack() is bounded by the Lua stack, so push in slices.
+    for first = 1, #admitted, 1000 do
+        redis.call('RPUSH', jobs, unpack(admitted, first, math.min(first + 999, #admitted)))
+    end
+    redis.call('HINCRBY', counters, 'total', #admitted)
+    for _, key in ipairs(KEYS) do
+        redis.call('EXPIRE', key, ttl)
+    end
+end
+return admitted
+"""
+
+
+def bloom_size(capacity: int, error_rate: float) -> Tuple[int, int]:
+    # Bits and hash count for `capacity` URLs at the given false positive rate.
+    bits = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    return bits, max(1, round(bits / capacity * math.log(2)))
+
+
+def bloom_positions(url: str, bits: int, hashes: int) -> List[int]:
+    # Double hashing: k positions from the two halves of one digest of the
+    # normalized URL, so spellings of the same page share their bits.
+    digest = hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class CrawlFrontier:
+    def __init__(self, redis_url: str, key_prefix: str = "crawl"):
+        self.key_prefix = key_prefix
+
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._admit = self._redis.register_script(ADMIT_SCRIPT)
+
+    def _key(self, batch_id: str, name: str) -> str:
+        return f"{self.key_prefix}:{batch_id}:{name}"
+
+    def admit(self, batch_id: str, urls: List[str], depth: int,
+              crawl: Dict[str, Any]) -> List[Dict[str, str]]:
+        if not urls:
+            return []
+        bits, hashes = crawl["bloom_bits"], crawl["bloom_hashes"]
+        job_ids = [str(uuid.uuid4()) for _ in urls]
+        args: List[Any] = [settings.result_ttl_secs, crawl["max_pages"], depth, hashes]
+        for job_id, url in zip(job_ids, urls):
+            args.append(job_id)
+            args.extend(bloom_positions(url, bits, hashes))
+
+        admitted = set(self._admit(
+            keys=[self._key(batch_id, "seen"), f"batch:{batch_id}:counters", f"batch:{batch_id}:jobs",
+                  self._key(batch_id, "depth")],
+            args=args,
+        ))
+        return [{"job_id": job_id, "url": url} for job_id, url in zip(job_ids, urls) if job_id in admitted]
+
+    def depth(self, batch_id: str, job_id: str) -> Optional[int]:
+        depth = self._redis.hget(self._key(batch_id, "depth"), job_id)
+        return int(depth) if depth is not None else None
+
+
+frontier = CrawlFrontier(settings.redis_url)
@@ -1,36 +1,157 @@
+import base64
+import time
+import uuid
+import redis.asyncio
 from celery.result import AsyncResult
-from typing import Optional
-from app.worker.celery_app import celery_app
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, List
+from app.core.config import settings
+from app.worker.celery_app import celery_app, queue_for_priority
 from app.services.storage import storage
+from app.services.body_codecs import codec_registry
+from app.services.response_cache import cache_key, is_fresh, result_from_cache
 from app.schemas.responses import JobStatusResponse, CrawlResult, TaskState
-from app.worker.tasks.crawl import crawl_page
+from app.worker.tasks.crawl import crawl_page, submit_jobs
+
+_result_backend: Optional[redis.asyncio.Redis] = None
+
+
+def _result_backend_client() -> Optional[redis.asyncio.Redis]:
+    global _result_backend
+    if _result_backend is None and settings.celery_result_backend.startswith(("redis://", "rediss://")):
+        _result_backend = redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+            settings.celery_result_backend, max_connections=settings.redis_max_connections
+        ))
+    return _result_backend
 
 
 class JobService:
     @staticmethod
-    def create_job(url: str, headers: Optional[dict] = None, timeout: int = 15) -> str:
-        task = crawl_page.delay(url, headers=headers, timeout=timeout)
-        return task.id
+    async def create_job(url: str, headers: Optional[dict] = None, timeout: int = 15,
+                         body_codec: Optional[str] = None, max_age: Optional[int] = None,
+                         priority: Optional[str] = "high") -> str:
+        if max_age is not None:
+            entry = await storage.aget_cache_entry(cache_key(url, headers))
+            if entry and is_fresh(entry, max_age):
+                # Answered from the cache: the job only records a pointer to the stored body.
+                job_id = str(uuid.uuid4())
+                await storage.asave_job_result(job_id, result_from_cache(job_id, None, url, entry, 0, "hit"))
+                return job_id
+
+        job_id = str(uuid.uuid4())
+        queued_at = time.time()
+        await storage.aqueue_job(job_id, queued_at)
+        # Publishing goes through kombu's blocking producer, so it runs off the event loop.
+        await run_in_threadpool(
+            crawl_page.apply_async, (url,),
+            {"headers": headers, "timeout": timeout, "body_codec": body_codec, "max_age": max_age,
+             "queued_at": queued_at},
+            task_id=job_id, queue=queue_for_priority(priority),
+        )
+        return job_id
+
+    @staticmethod
+    def new_job_ids(count: int) -> List[str]:
+        return [str(uuid.uuid4()) for _ in range(count)]
+
+    @staticmethod
+    def create_jobs(urls: List[str], job_ids: List[str], headers: Optional[dict] = None,
+                    timeout: int = 15, batch_id: Optional[str] = None,
+                    body_codec: Optional[str] = None, priority: Optional[str] = None,
+                    crawl: Optional[dict] = None) -> None:
+        jobs = [{"job_id": job_id, "url": url} for job_id, url in zip(job_ids, urls)]
+        options = {"headers": headers, "timeout": timeout, "batch_id": batch_id, "body_codec": body_codec,
+                   "queued_at": time.time()}
+        if crawl:
+            options["crawl"] = crawl
+        submit_jobs(jobs, options, queue_for_priority(priority))
+
+    @staticmethod
+    async def get_task_state(job_id: str) -> str:
+        client = _result_backend_client()
+        if client is None:
+            return await run_in_threadpool(lambda: AsyncResult(job_id, app=celery_app).state)
+
+        # Same lookup AsyncResult.state does, without blocking the event loop.
+        backend = celery_app.backend
+        meta = await client.get(backend.get_key_for_task(job_id))
+        return backend.decode_result(meta)["status"] if meta else TaskState.PENDING.value
 
     @staticmethod
-    def get_job_status(job_id: str) -> JobStatusResponse:
-        result = AsyncResult(job_id, app=celery_app)
+    async def get_job_status(job_id: str) -> JobStatusResponse:
+        # Workers keep the job record current from the moment a job starts,
+        # so the Celery backend is only asked about jobs still queued.
+        record = await storage.aget_job_state(job_id)
+        if record:
+            return JobStatusResponse(
+                job_id=job_id,
+                state=TaskState(record["state"]),
+                queued_at=record.get("queued_at"),
+                started_at=record.get("started_at"),
+                finished_at=record.get("finished_at")
+            )
+        if settings.task_ignore_result:
+            return JobStatusResponse(job_id=job_id, state=TaskState.PENDING)
         return JobStatusResponse(
             job_id=job_id,
-            state=TaskState(result.state)
+            state=TaskState(await JobService.get_task_state(job_id))
         )
 
     @staticmethod
-    def get_job_result(job_id: str) -> Optional[CrawlResult]:
-        payload = storage.get_job_result(job_id)
+    async def job_exists(job_id: str) -> bool:
+        if await storage.aget_job_state(job_id) is not None:
+            return True
+        first, _ = await storage.aget_event_bounds("job", job_id)
+        if first is not None:
+            return True
+        return not settings.task_ignore_result and await JobService.get_task_state(job_id) != TaskState.PENDING.value
+
+    @staticmethod
+    async def get_job_result(job_id: str) -> Optional[CrawlResult]:
+        payload = await storage.aget_job_result(job_id)
         if not payload:
             return None
+        return JobService.to_crawl_result(job_id, payload)
+
+    @staticmethod
+    async def get_job_body(job_id: str, accept_encoding: str = ""):
+        body, encoding, content_type, digest = await storage.aget_job_body(job_id)
+        if body is None or encoding is None:
+            return body, encoding, content_type, digest
+
+        # gzip is always passed through, zstd only to clients that accept it;
+        # dictionary-compressed bodies are decoded here. The lookup may fetch
+        # the dictionary from Redis, so it and the decode stay off the event loop.
+        codec = await run_in_threadpool(codec_registry.get, encoding)
+        if codec.content_encoding == "gzip" or (
+                codec.content_encoding and codec.content_encoding in accept_encoding):
+            return body, codec.content_encoding, content_type, digest
+        return await run_in_threadpool(codec.decode, body), None, content_type, digest
 
+    @staticmethod
+    def to_crawl_result(job_id: str, payload: dict) -> CrawlResult:
+        body = payload.get("body")
+        encoding = payload.get("body_encoding")
+        if body and encoding:
+            codec = codec_registry.get(encoding)
+            if codec.content_encoding is None:
+                body, encoding = codec.decode(body), None
         return CrawlResult(
             job_id=job_id,
             url=payload.get("url"),
             status_code=payload.get("status_code"),
             response_time_ms=payload.get("response_time_ms", 0),
-            body=payload.get("body"),
+            body=base64.b64encode(body).decode("ascii") if body else None,
+            body_encoding=(encoding or "identity") if body else None,
+            body_digest=payload.get("body_digest"),
+            cache_status=payload.get("cache_status"),
+            state=payload.get("state"),
             error=payload.get("error_message")
         )
+
+    @staticmethod
+    async def aclose():
+        global _result_backend
+        if _result_backend is not None:
+            await _result_backend.aclose()
+            _result_backend = None
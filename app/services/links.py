@@ -0,0 +1,113 @@
+import codecs
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Optional, Dict, Any, List, Iterable
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+from app.services.response_cache import normalize_url
+from app.services.urls import host_for_url
+
+LINK_TAGS = {"a": "href", "area": "href", "frame": "src", "iframe": "src"}
+SKIPPED_SCHEMES = ("javascript:", "mailto:", "tel:", "data:")
+
+
+def content_charset(content_type: str) -> str:
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            charset = value.strip().strip("\"'")
+            try:
+                codecs.lookup(charset)
+                return charset
+            except LookupError:
+                break
+    return "utf-8"
+
+
+# Collects links from an HTML page fed chunk by chunk as it downloads, so the
+# page is never decoded or parsed as a whole. Links are deduplicated on their
+# normalized form but kept as written, since that is what gets fetched.
+class LinkExtractor(HTMLParser):
+    def __init__(self, base_url: str, encoding: str = "utf-8", max_links: int = 1000):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.max_links = max_links
+        self.links: Dict[str, str] = {}
+
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._base_seen = False
+        self._failed = False
+
+    def feed_bytes(self, chunk: bytes):
+        if self._failed or len(self.links) >= self.max_links:
+            return
+        try:
+            self.feed(self._decoder.decode(chunk))
+        except Exception as e:
+            # Keep what was found so far rather than fail the page.
+            logging.debug(f"Link extraction stopped on {self.base_url}: {e}")
+            self._failed = True
+
+    def handle_starttag(self, tag: str, attrs: List[tuple]):
+        if tag == "base" and not self._base_seen:
+            self._base_seen = True
+            href = dict(attrs).get("href")
+            if href:
+                try:
+                    self.base_url = urljoin(self.base_url, href.strip())
+                except ValueError:
+                    pass
+            return
+
+        attr = LINK_TAGS.get(tag)
+        if attr is None or len(self.links) >= self.max_links:
+            return
+        value = dict(attrs).get(attr)
+        if not value:
+            return
+        value = value.strip()
+        if not value or value.startswith("#") or value.lower().startswith(SKIPPED_SCHEMES):
+            return
+        try:
+            url = urldefrag(urljoin(self.base_url, value))[0]
+            if urlsplit(url).scheme not in ("http", "https"):
+                return
+            key = normalize_url(url)
+        except ValueError:
+            # A bad port or bracket only costs this one link.
+            return
+        self.links.setdefault(key, url)
+
+    def result(self) -> List[str]:
+        return list(self.links.values())
+
+
+class CrawlScope:
+    def __init__(self, hosts: Iterable[str], subdomains: bool = False,
+                 include: Iterable[str] = (), exclude: Iterable[str] = ()):
+        self.hosts = set(hosts)
+        self.subdomains = subdomains
+        self.include = [re.compile(pattern) for pattern in include]
+        self.exclude = [re.compile(pattern) for pattern in exclude]
+
+    def allows(self, url: str) -> bool:
+        host = host_for_url(url)
+        if host not in self.hosts and not (
+                self.subdomains and any(host.endswith("." + allowed) for allowed in self.hosts)):
+            return False
+        if self.include and not any(pattern.search(url) for pattern in self.include):
+            return False
+        return not any(pattern.search(url) for pattern in self.exclude)
+
+    @classmethod
+    def from_config(cls, crawl: Dict[str, Any]) -> "CrawlScope":
+        return cls(crawl.get("hosts", []), crawl.get("scope") == "subdomains",
+                   crawl.get("include") or (), crawl.get("exclude") or ())
+
+
+def in_scope(links: Iterable[str], crawl: Optional[Dict[str, Any]]) -> List[str]:
+    if not crawl:
+        return []
+    scope = CrawlScope.from_config(crawl)
+    return [url for url in links if scope.allows(url)]
@@ -0,0 +1,165 @@
+import logging
+import os
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Optional, Dict, List, Iterable, Tuple
+import redis
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from app.core.config import settings
+from app.services.urls import host_for_url
+
+PHASE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PHASE_SECONDS = Histogram(
+    "crawler_phase_seconds",
+    "Time spent per crawl phase",
+    ["phase"],
+    buckets=PHASE_BUCKETS,
+)
+
+REQUESTS = Counter(
+    "crawler_requests",
+    "Crawl attempts by outcome, proxy and target host",
+    ["outcome", "proxy", "host"],
+)
+
+PROBES = Counter(
+    "crawler_proxy_probes",
+    "Background proxy health probes by outcome",
+    ["outcome"],
+)
+
+IN_FLIGHT = Gauge(
+    "crawler_in_flight_requests",
+    "HTTP requests currently open to target hosts",
+    multiprocess_mode="livesum",
+)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def proxy_label(proxy_line: Optional[str]) -> str:
+    # Only host:port, never the credentials in the proxy line.
+    if not proxy_line or not settings.metrics_proxy_labels:
+        return ""
+    return ":".join(proxy_line.split("://")[-1].split(":")[:2])
+
+
+def observe(phase: str, seconds: float):
+    PHASE_SECONDS.labels(phase).observe(seconds)
+
+
+@contextmanager
+def timed(phase: str):
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase, perf_counter() - started)
+
+
+def count_request(url: str, proxy_line: Optional[str], outcome: str):
+    REQUESTS.labels(outcome, proxy_label(proxy_line), host_for_url(url)).inc()
+
+
+def count_probe(outcome: str):
+    PROBES.labels(outcome).inc()
+
+
+# Collects the phase timings of one crawl attempt. Connection setup is read
+# from httpx's trace extension, so reused keep-alive connections report none.
+class PhaseTimer:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._connect_started: Optional[float] = None
+        self._connected_at: Optional[float] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.started" and self._connect_started is None:
+            self._connect_started = perf_counter()
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            self._connected_at = perf_counter()
+
+    async def atrace(self, event: str, info: dict):
+        self.trace(event, info)
+
+    def headers_received(self, request_started: float):
+        now = perf_counter()
+        if self._connect_started is not None and self._connected_at is not None:
+            self.add("connect", self._connected_at - self._connect_started)
+            request_started = max(request_started, self._connected_at)
+        self.add("ttfb", now - request_started)
+
+    def observe(self):
+        for phase, seconds in self.phases.items():
+            observe(phase, seconds)
+
+
+class QueueDepthCollector:
+    def __init__(self, broker_url: str, queues: Iterable[str]):
+        self.queues = sorted(set(queues))
+        self._redis = None
+        if broker_url.startswith(("redis://", "rediss://")):
+            self._redis = redis.Redis.from_url(broker_url, socket_timeout=2)
+
+    def describe(self) -> List[GaugeMetricFamily]:
+        return [GaugeMetricFamily("crawler_queue_depth", "Messages waiting in the broker queue", labels=["queue"])]
+
+    def collect(self):
+        gauge = GaugeMetricFamily("crawler_queue_depth", "Messages waiting in the broker queue", labels=["queue"])
+        if self._redis is not None:
+            pipe = self._redis.pipeline(transaction=False)
+            for queue in self.queues:
+                pipe.llen(queue)
+            try:
+                for queue, depth in zip(self.queues, pipe.execute()):
+                    gauge.add_metric([queue], depth)
+            except redis.RedisError as e:
+                logging.warning(f"Could not read queue depth: {e}")
+        yield gauge
+
+
+def build_registry(collectors: Iterable = ()) -> CollectorRegistry:
+    # Prefork workers and multi-process servers write their samples to
+    # PROMETHEUS_MULTIPROC_DIR; the exporter then aggregates every process.
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    for collector in collectors:
+        registry.register(collector)
+    return registry
+
+
+def render(registry: CollectorRegistry) -> Tuple[bytes, str]:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int):
+    if not multiprocess_enabled():
+        logging.warning("PROMETHEUS_MULTIPROC_DIR is not set, worker child processes will not be exported")
+    start_http_server(port, registry=build_registry())
+    logging.info(f"Serving worker metrics on :{port}/metrics")
+
+
+def mark_process_dead(pid: int):
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
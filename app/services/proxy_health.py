@@ -0,0 +1,63 @@
+from typing import Optional
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# Floor for the latency estimate, so a proxy that answers instantly doesn't
+# get an unbounded score.
+MIN_LATENCY = 0.001
+
+# Proxies with no latency of their own are scored with the median of the
+# pool's last LATENCY_WINDOW successful latencies, refreshed every
+# LATENCY_PRIOR_REFRESH of them.
+LATENCY_WINDOW = 256
+LATENCY_PRIOR_REFRESH = 64
+
+
+# Per-proxy success and latency estimates plus its circuit breaker. The same
+# model runs as Lua in RedisProxyPool's REPORT_SCRIPT; keep them in step.
+class ProxyHealth:
+    def __init__(self, now: float):
+        self.ok = 0.0
+        self.total = 0.0
+        self.updated_at = now
+        self.latency: Optional[float] = None
+        self.latency_dev = 0.0
+        self.failures = 0
+        self.trips = 0
+        self.state = BREAKER_CLOSED
+        self.open_until = 0.0
+
+    def record(self, success: bool, latency: Optional[float], now: float,
+               half_life: float, latency_alpha: float):
+        # Counts fade with a half-life instead of per sample, so a burst of
+        # results weighs the same whether it comes from a busy or a quiet period.
+        weight = 0.5 ** (max(0.0, now - self.updated_at) / half_life) if half_life > 0 else 1.0
+        self.ok = self.ok * weight + (1.0 if success else 0.0)
+        self.total = self.total * weight + 1.0
+        self.updated_at = now
+        self.failures = 0 if success else self.failures + 1
+
+        if latency is not None and success:
+            # Smoothed mean and mean deviation, as TCP estimates round-trip time.
+            # Only successes count: a proxy that fails fast is not a fast proxy.
+            if self.latency is None:
+                self.latency, self.latency_dev = latency, latency / 2
+            else:
+                self.latency_dev += min(1.0, 2 * latency_alpha) * (abs(latency - self.latency) - self.latency_dev)
+                self.latency += latency_alpha * (latency - self.latency)
+
+    @property
+    def success_rate(self) -> float:
+        # One assumed success keeps new and rarely used proxies optimistic.
+        return (self.ok + 1.0) / (self.total + 1.0)
+
+    def expected_latency(self, prior: float) -> float:
+        # Mean plus two deviations stands in for a high latency percentile.
+        if self.latency is None:
+            return prior
+        return self.latency + 2 * self.latency_dev
+
+    def goodput(self, latency_prior: float) -> float:
+        return self.success_rate / max(self.expected_latency(latency_prior), MIN_LATENCY)
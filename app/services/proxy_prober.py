@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import threading
+from time import perf_counter
+from typing import Callable, Optional, Tuple, List
+import httpx
+
+from app.services import metrics
+from app.services.crawler import to_httpx_proxy
+from app.services.detector import PageDetector
+
+PROBE_OK = "ok"
+PROBE_BLOCKED = "blocked"
+PROBE_ERROR = "error"
+
+
+class ProxyProber:
+    def __init__(self, proxy_pool, url: str, detector: Optional[PageDetector] = None,
+                 interval: float = 60.0, timeout: float = 10.0, concurrency: int = 50,
+                 prewarm_count: int = 0, prewarm: Optional[Callable[[str, str], bool]] = None,
+                 prewarm_urls: Optional[List[str]] = None, use_http2: bool = True, probing: bool = True):
+        self.proxy_pool = proxy_pool
+        self.url = url
+        self.detector = detector or PageDetector()
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+        self.prewarm_count = prewarm_count
+        self.prewarm = prewarm
+        self.prewarm_urls = prewarm_urls or []
+        self.use_http2 = use_http2
+        self.probing = probing
+
+        self._stop = threading.Event()
+
+    async def probe(self, proxy_line: str) -> Tuple[str, float]:
+        rules = self.detector.rules_for(self.url)
+        started = perf_counter()
+        try:
+            async with httpx.AsyncClient(http2=self.use_http2, proxy=to_httpx_proxy(proxy_line),
+                                         timeout=self.timeout, follow_redirects=True) as client:
+                async with client.stream("GET", self.url) as response:
+                    head = b""
+                    async for chunk in response.aiter_bytes():
+                        head += chunk
+                        if rules.window and len(head) >= rules.window:
+                            break
+        except (httpx.HTTPError, OSError) as e:
+            logging.debug(f"Probe through {proxy_line} failed: {e}")
+            return PROBE_ERROR, perf_counter() - started
+
+        latency = perf_counter() - started
+        if response.status_code in (403, 429) or rules.has_ban(head):
+            return PROBE_BLOCKED, latency
+        if response.status_code >= 400:
+            return PROBE_ERROR, latency
+        return PROBE_OK, latency
+
+    async def _probe_and_record(self, proxy_line: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            outcome, _ = await self.probe(proxy_line)
+        metrics.count_probe(outcome)
+        await asyncio.to_thread(self.proxy_pool.record_probe, proxy_line, outcome == PROBE_OK)
+
+    async def run_round(self):
+        # Probing covers every proxy, including ones already benched, and is
+        # done by one process per interval; each process then warms its own
+        # connections to the crawled sites through the proxies it is most
+        # likely to pick next.
+        if self.probing and await asyncio.to_thread(self.proxy_pool.claim_probe_round, self.interval):
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._probe_and_record(line, semaphore) for line in self.proxy_pool.proxies),
+                                 return_exceptions=True)
+
+        if self.prewarm and self.prewarm_count > 0:
+            for line in await asyncio.to_thread(self.proxy_pool.healthiest, self.prewarm_count):
+                for url in self.prewarm_urls:
+                    await asyncio.to_thread(self.prewarm, line, url)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            try:
+                await self.run_round()
+            except Exception as e:
+                logging.warning(f"Proxy probe round failed: {e}")
+            await loop.run_in_executor(None, self._stop.wait, self.interval)
+
+    def stop(self):
+        self._stop.set()
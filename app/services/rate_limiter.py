@@ -0,0 +1,100 @@
+from typing import Optional, Dict, List, Tuple
+import redis
+import redis.asyncio
+
+from app.services.urls import host_for_url
+
+# Takes one token from every bucket in KEYS, or from none of them. Each bucket
+# gets a (rate, burst) pair in ARGV. Returns the seconds to wait as a string,
+# "0" when the tokens were taken. Redis TIME keeps all workers on one clock.
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local wait = 0
+local tokens = {}
+
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or burst
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    available = math.min(burst, available + elapsed * rate)
+    tokens[i] = available
+    if available < 1 then
+        wait = math.max(wait, (1 - available) / rate)
+    end
+end
+
+if wait > 0 then
+    return tostring(wait)
+end
+
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return '0'
+"""
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    rate, _, burst = value.partition(":")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(1.0, rate)
+
+
+def parse_host_limits(value: str) -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for item in value.split(","):
+        host, _, rate = item.strip().partition("=")
+        if host and rate:
+            limits[host.lower()] = parse_rate(rate)
+    return limits
+
+
+class RateLimiter:
+    def __init__(self, redis_url: str, host_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 default_limit: Tuple[float, float] = (0.0, 0.0),
+                 proxy_limit: Tuple[float, float] = (0.0, 0.0), key_prefix: str = "ratelimit"):
+        self.redis_url = redis_url
+        self.host_limits = host_limits or {}
+        self.default_limit = default_limit
+        self.proxy_limit = proxy_limit
+        self.key_prefix = key_prefix
+
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._acquire = self._redis.register_script(ACQUIRE_SCRIPT)
+        self._aredis: Optional[redis.asyncio.Redis] = None
+
+    @property
+    def per_proxy(self) -> bool:
+        return self.proxy_limit[0] > 0
+
+    def _buckets(self, host: str, proxy: Optional[str]) -> Tuple[List[str], List[float]]:
+        keys, args = [], []
+        rate, burst = self.host_limits.get(host, self.default_limit)
+        if rate > 0:
+            keys.append(f"{self.key_prefix}:{host}")
+            args.extend((rate, burst))
+        rate, burst = self.proxy_limit
+        if proxy and rate > 0:
+            keys.append(f"{self.key_prefix}:{host}:{proxy}")
+            args.extend((rate, burst))
+        return keys, args
+
+    def acquire(self, url: str, proxy: Optional[str] = None) -> float:
+        keys, args = self._buckets(host_for_url(url), proxy)
+        if not keys:
+            return 0.0
+        return float(self._acquire(keys=keys, args=args))
+
+    async def aacquire(self, url: str, proxy: Optional[str] = None) -> float:
+        keys, args = self._buckets(host_for_url(url), proxy)
+        if not keys:
+            return 0.0
+        if self._aredis is None:
+            self._aredis = redis.asyncio.Redis.from_url(self.redis_url, decode_responses=True)
+            self._aacquire = self._aredis.register_script(ACQUIRE_SCRIPT)
+        return float(await self._aacquire(keys=keys, args=args))
+
@@ -0,0 +1,458 @@
+import logging
+import random
+import time
+from typing import Optional, Dict, Any, List
+import redis
+import redis.asyncio
+
+from app.services.proxy_health import LATENCY_PRIOR_REFRESH, LATENCY_WINDOW
+
+PICK_SCRIPT = """
+local available, cooldown, usage, last_used, requests, scores, breaker, half_open, latency_stats =
+    KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7], KEYS[8], KEYS[9]
+local now = tonumber(ARGV[1])
+local max_requests = tonumber(ARGV[2])
+local cooldown_time = tonumber(ARGV[3])
+local rnd = tonumber(ARGV[4])
+local top_n = tonumber(ARGV[5])
+local trial_lease = tonumber(ARGV[6])
+local prior = tonumber(redis.call('HGET', latency_stats, 'prior')) or tonumber(ARGV[7])
+local default_score = 1 / math.max(prior, 0.001)
+
+local expired = redis.call('ZRANGEBYSCORE', cooldown, '-inf', now, 'LIMIT', 0, 100)
+for _, proxy in ipairs(expired) do
+    redis.call('ZREM', cooldown, proxy)
+    redis.call('HSET', usage, proxy, 0)
+    redis.call('ZADD', available, redis.call('HGET', scores, proxy) or default_score, proxy)
+end
+
+-- Open breakers go half-open: the proxy is pickable for one trial request.
+local reopened = redis.call('ZRANGEBYSCORE', breaker, '-inf', now, 'LIMIT', 0, 100)
+for _, proxy in ipairs(reopened) do
+    redis.call('ZREM', breaker, proxy)
+    redis.call('SADD', half_open, proxy)
+    redis.call('HSET', usage, proxy, 0)
+    redis.call('ZADD', available, redis.call('HGET', scores, proxy) or default_score, proxy)
+end
+
+local top = redis.call('ZREVRANGE', available, 0, top_n - 1)
+if #top == 0 then
+    return false
+end
+
+local proxy = top[math.floor(rnd * #top) + 1]
+local count = redis.call('HINCRBY', usage, proxy, 1)
+redis.call('HSET', last_used, proxy, ARGV[1])
+redis.call('INCR', requests)
+
+if redis.call('SISMEMBER', half_open, proxy) == 1 then
+    -- Out again until the trial's result closes or reopens the breaker,
+    -- or the lease runs out if it never reports.
+    redis.call('ZREM', available, proxy)
+    redis.call('ZADD', breaker, now + trial_lease, proxy)
+elseif count >= max_requests then
+    redis.call('ZREM', available, proxy)
+    redis.call('ZADD', cooldown, now + cooldown_time, proxy)
+end
+
+return proxy
+"""
+
+# Takes back a pick whose request never went out: its use no longer counts
+# toward the cooldown, and a half-open proxy gets its trial back.
+RELEASE_SCRIPT = """
+local available, cooldown, usage, requests, scores, breaker, half_open, latency_stats =
+    KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7], KEYS[8]
+local proxy = ARGV[1]
+local max_requests = tonumber(ARGV[2])
+local prior = tonumber(redis.call('HGET', latency_stats, 'prior')) or tonumber(ARGV[3])
+local default_score = 1 / math.max(prior, 0.001)
+
+local count = redis.call('HINCRBY', usage, proxy, -1)
+if count < 0 then
+    redis.call('HSET', usage, proxy, 0)
+end
+if tonumber(redis.call('GET', requests) or '0') > 0 then
+    redis.call('DECR', requests)
+end
+
+local score = redis.call('HGET', scores, proxy) or default_score
+if redis.call('SISMEMBER', half_open, proxy) == 1 then
+    if redis.call('ZREM', breaker, proxy) == 1 then
+        redis.call('ZADD', available, score, proxy)
+    end
+elseif count < max_requests and redis.call('ZREM', cooldown, proxy) == 1 then
+    redis.call('ZADD', available, score, proxy)
+end
+return count
+"""
+
+# Same model as ProxyHealth and SmartProxyPool._update_proxy_stats; keep them in step.
+REPORT_SCRIPT = """
+local available, cooldown, usage, breaker, half_open, tripped, quarantined, scores =
+    KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7], KEYS[8]
+local unmeasured, latency_samples, latency_stats, health = KEYS[9], KEYS[10], KEYS[11], KEYS[12]
+local proxy = ARGV[1]
+local good = ARGV[2] == '1' and ARGV[3] ~= '1'
+local is_blocked = ARGV[3] == '1'
+local latency = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local half_life = tonumber(ARGV[6])
+local latency_alpha = tonumber(ARGV[7])
+local latency_prior = tonumber(redis.call('HGET', latency_stats, 'prior')) or tonumber(ARGV[8])
+local min_success_rate = tonumber(ARGV[9])
+local min_requests = tonumber(ARGV[10])
+local breaker_failures = tonumber(ARGV[11])
+local open_secs = tonumber(ARGV[12])
+local ban_open_secs = tonumber(ARGV[13])
+local max_open_secs = tonumber(ARGV[14])
+local latency_window = tonumber(ARGV[15])
+local prior_refresh = tonumber(ARGV[16])
+
+local h = redis.call('HMGET', health, 'ok', 'total', 'at', 'latency', 'dev', 'failures', 'trips')
+local weight = 1
+if h[3] and half_life > 0 then
+    weight = 0.5 ^ (math.max(0, now - tonumber(h[3])) / half_life)
+end
+local ok = (tonumber(h[1]) or 0) * weight
+if good then ok = ok + 1 end
+local total = (tonumber(h[2]) or 0) * weight + 1
+local failures = 0
+if not good then failures = (tonumber(h[6]) or 0) + 1 end
+local trips = tonumber(h[7]) or 0
+
+local lat, dev = tonumber(h[4]), tonumber(h[5]) or 0
+local new_prior = false
+-- Only successes count: a proxy that fails fast is not a fast proxy.
+if latency and good then
+    if lat then
+        dev = dev + math.min(1, 2 * latency_alpha) * (math.abs(latency - lat) - dev)
+        lat = lat + latency_alpha * (latency - lat)
+    else
+        lat, dev = latency, latency / 2
+    end
+    redis.call('HSET', health, 'latency', lat, 'dev', dev)
+    redis.call('HDEL', unmeasured, proxy)
+
+    redis.call('LPUSH', latency_samples, latency)
+    redis.call('LTRIM', latency_samples, 0, latency_window - 1)
+    if redis.call('HINCRBY', latency_stats, 'samples', 1) % prior_refresh == 0 then
+        local window = redis.call('LRANGE', latency_samples, 0, -1)
+        for i, value in ipairs(window) do window[i] = tonumber(value) end
+        table.sort(window)
+        local mid = math.floor(#window / 2)
+        if #window % 2 == 1 then
+            latency_prior = window[mid + 1]
+        else
+            latency_prior = (window[mid] + window[mid + 1]) / 2
+        end
+        redis.call('HSET', latency_stats, 'prior', latency_prior)
+        new_prior = true
+    end
+end
+redis.call('HSET', health, 'ok', ok, 'total', total, 'at', now, 'failures', failures)
+
+local rate = (ok + 1) / (total + 1)
+local expected = latency_prior
+if lat then expected = lat + 2 * dev end
+local score = rate / math.max(expected, 0.001)
+redis.call('HSET', scores, proxy, score)
+if not lat then
+    redis.call('HSET', unmeasured, proxy, rate)
+end
+
+if new_prior then
+    -- Proxies still on the prior move with it.
+    local entries = redis.call('HGETALL', unmeasured)
+    for i = 1, #entries, 2 do
+        local prior_score = tonumber(entries[i + 1]) / math.max(latency_prior, 0.001)
+        redis.call('HSET', scores, entries[i], prior_score)
+        redis.call('ZADD', available, 'XX', prior_score, entries[i])
+    end
+end
+
+if redis.call('SISMEMBER', quarantined, proxy) == 1 then
+    return {'out'}
+end
+
+local trip = nil
+if redis.call('SISMEMBER', half_open, proxy) == 1 then
+    if good then
+        redis.call('SREM', half_open, proxy)
+        redis.call('SREM', tripped, proxy)
+        redis.call('ZREM', breaker, proxy)
+        redis.call('HSET', health, 'trips', 0)
+        redis.call('HSET', usage, proxy, 0)
+        redis.call('ZADD', available, score, proxy)
+        return {'closed'}
+    end
+    trip = open_secs
+    if is_blocked then trip = ban_open_secs end
+elseif redis.call('ZSCORE', breaker, proxy) then
+    -- Results of requests sent before the breaker opened.
+    return {'open'}
+elseif is_blocked then
+    trip = ban_open_secs
+elseif not good and (failures >= breaker_failures or (total >= min_requests and rate < min_success_rate)) then
+    trip = open_secs
+end
+
+if trip then
+    -- Each trip in a row doubles how long the proxy stays out.
+    trips = trips + 1
+    local duration = math.min(max_open_secs, trip * 2 ^ (trips - 1))
+    redis.call('HSET', health, 'trips', trips)
+    redis.call('SREM', half_open, proxy)
+    redis.call('SADD', tripped, proxy)
+    redis.call('ZREM', available, proxy)
+    redis.call('ZREM', cooldown, proxy)
+    redis.call('ZADD', breaker, now + duration, proxy)
+    return {'tripped', tostring(duration), tostring(rate)}
+end
+
+redis.call('ZADD', available, 'XX', score, proxy)
+return {'ok'}
+"""
+
+# Positive streaks count passed health probes, negative ones failed probes.
+PROBE_SCRIPT = """
+local available, cooldown, quarantined, streaks, usage, scores, breaker, half_open, tripped =
+    KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7], KEYS[8], KEYS[9]
+local unmeasured, latency_stats, health = KEYS[10], KEYS[11], KEYS[12]
+local proxy = ARGV[1]
+local healthy = ARGV[2] == '1'
+local failures_to_quarantine = tonumber(ARGV[3])
+local successes_to_restore = tonumber(ARGV[4])
+local prior = tonumber(redis.call('HGET', latency_stats, 'prior')) or tonumber(ARGV[5])
+local default_score = 1 / math.max(prior, 0.001)
+
+local streak = tonumber(redis.call('HGET', streaks, proxy) or '0')
+if healthy then
+    streak = math.max(streak, 0) + 1
+else
+    streak = math.min(streak, 0) - 1
+end
+redis.call('HSET', streaks, proxy, streak)
+
+local out = redis.call('SISMEMBER', quarantined, proxy) == 1
+if healthy and out and streak >= successes_to_restore then
+    redis.call('SREM', quarantined, proxy)
+    redis.call('DEL', health)
+    redis.call('HDEL', scores, proxy)
+    redis.call('HSET', unmeasured, proxy, 1)
+    redis.call('HSET', usage, proxy, 0)
+    redis.call('ZADD', available, default_score, proxy)
+    return 'restored'
+end
+
+if healthy and not out and streak >= successes_to_restore and redis.call('ZSCORE', breaker, proxy)
+        and redis.call('SISMEMBER', half_open, proxy) == 0 then
+    -- Healthy probes earn an open breaker its trial request now instead of
+    -- when it runs out.
+    redis.call('ZREM', breaker, proxy)
+    redis.call('SADD', half_open, proxy)
+    redis.call('HSET', usage, proxy, 0)
+    redis.call('ZADD', available, redis.call('HGET', scores, proxy) or default_score, proxy)
+    return 'half_open'
+end
+
+if not healthy and not out and -streak >= failures_to_quarantine then
+    redis.call('SADD', quarantined, proxy)
+    redis.call('ZREM', available, proxy)
+    redis.call('ZREM', cooldown, proxy)
+    redis.call('ZREM', breaker, proxy)
+    redis.call('SREM', half_open, proxy)
+    redis.call('SREM', tripped, proxy)
+    return 'quarantined'
+end
+return false
+"""
+
+REGISTER_SCRIPT = """
+local all, available, unmeasured, latency_stats = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local prior = tonumber(redis.call('HGET', latency_stats, 'prior')) or tonumber(ARGV[1])
+local added = 0
+for i = 2, #ARGV do
+    local proxy = ARGV[i]
+    if redis.call('SADD', all, proxy) == 1 then
+        redis.call('HSET', unmeasured, proxy, 1)
+        redis.call('ZADD', available, 1 / math.max(prior, 0.001), proxy)
+        added = added + 1
+    end
+end
+return added
+"""
+
+
+class RedisProxyPool:
+    def __init__(self, proxy_list: List[str], redis_url: str, key_prefix: str = "proxypool"):
+        self.proxies = proxy_list
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+
+        self.max_requests_per_proxy = 15
+        self.cooldown_time = 300
+        self.min_success_rate = 0.3
+        self.min_requests_for_rate = 5
+        self.top_n = 3
+        self.score_half_life = 300.0
+        self.latency_alpha = 0.125
+        self.latency_prior = 1.0
+        self.breaker_failures = 5
+        self.breaker_open_secs = 30.0
+        self.breaker_max_open_secs = 1800.0
+        self.ban_open_secs = 600.0
+        self.probe_failures_to_quarantine = 2
+        self.probe_successes_to_restore = 2
+
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._pick = self._redis.register_script(PICK_SCRIPT)
+        self._release = self._redis.register_script(RELEASE_SCRIPT)
+        self._report = self._redis.register_script(REPORT_SCRIPT)
+        self._probe = self._redis.register_script(PROBE_SCRIPT)
+        self._aredis: Optional[redis.asyncio.Redis] = None
+
+        self._register(proxy_list)
+        logging.info(f"Loaded {len(proxy_list)} proxies into shared pool {key_prefix}")
+
+    def _key(self, name: str) -> str:
+        return f"{self.key_prefix}:{name}"
+
+    def _health_key(self, proxy: str) -> str:
+        return self._key(f"health:{proxy}")
+
+    def _pick_keys(self) -> List[str]:
+        return [self._key(name) for name in
+                ("available", "cooldown", "usage", "last_used", "requests", "scores", "breaker", "half_open",
+                 "latency_stats")]
+
+    def _pick_args(self) -> List[Any]:
+        return [time.time(), self.max_requests_per_proxy, self.cooldown_time,
+                random.random(), self.top_n, self.breaker_open_secs, self.latency_prior]
+
+    def _release_keys(self) -> List[str]:
+        return [self._key(name) for name in
+                ("available", "cooldown", "usage", "requests", "scores", "breaker", "half_open", "latency_stats")]
+
+    def _release_args(self, proxy: str) -> List[Any]:
+        return [proxy, self.max_requests_per_proxy, self.latency_prior]
+
+    def _report_keys(self, proxy: str) -> List[str]:
+        return [self._key(name) for name in
+                ("available", "cooldown", "usage", "breaker", "half_open", "tripped", "quarantined",
+                 "scores", "unmeasured", "latency_samples", "latency_stats")] + [self._health_key(proxy)]
+
+    def _report_args(self, proxy: str, success: bool, blocked: bool, latency: Optional[float]) -> List[Any]:
+        return [proxy, int(success), int(blocked), "" if latency is None else latency, time.time(),
+                self.score_half_life, self.latency_alpha, self.latency_prior, self.min_success_rate,
+                self.min_requests_for_rate, self.breaker_failures, self.breaker_open_secs,
+                self.ban_open_secs, self.breaker_max_open_secs, LATENCY_WINDOW, LATENCY_PRIOR_REFRESH]
+
+    def _register(self, proxy_list: List[str]):
+        register = self._redis.register_script(REGISTER_SCRIPT)
+        keys = [self._key(name) for name in ("all", "available", "unmeasured", "latency_stats")]
+        for i in range(0, len(proxy_list), 1000):
+            register(keys=keys, args=[self.latency_prior] + proxy_list[i:i + 1000])
+
+    def _async_scripts(self):
+        if self._aredis is None:
+            self._aredis = redis.asyncio.Redis.from_url(self.redis_url, decode_responses=True)
+            self._apick = self._aredis.register_script(PICK_SCRIPT)
+            self._areport = self._aredis.register_script(REPORT_SCRIPT)
+            self._arelease = self._aredis.register_script(RELEASE_SCRIPT)
+        return self._apick, self._areport
+
+    def pick_proxy_line(self) -> Optional[str]:
+        proxy = self._pick(keys=self._pick_keys(), args=self._pick_args())
+        if not proxy:
+            logging.error("No available proxies")
+            return None
+        return proxy
+
+    async def apick_proxy_line(self) -> Optional[str]:
+        pick, _ = self._async_scripts()
+        proxy = await pick(keys=self._pick_keys(), args=self._pick_args())
+        if not proxy:
+            logging.error("No available proxies")
+            return None
+        return proxy
+
+    def release_proxy_line(self, proxy: str):
+        if proxy:
+            self._release(keys=self._release_keys(), args=self._release_args(proxy))
+
+    async def arelease_proxy_line(self, proxy: str):
+        if proxy:
+            self._async_scripts()
+            await self._arelease(keys=self._release_keys(), args=self._release_args(proxy))
+
+    def report_request_result(self, proxy: str, success: bool, blocked: bool = False,
+                              latency: Optional[float] = None):
+        if not proxy:
+            return
+        state = self._report(keys=self._report_keys(proxy),
+                             args=self._report_args(proxy, success, blocked, latency))
+        self._log_state(proxy, state)
+
+    async def areport_request_result(self, proxy: str, success: bool, blocked: bool = False,
+                                     latency: Optional[float] = None):
+        if not proxy:
+            return
+        _, report = self._async_scripts()
+        state = await report(keys=self._report_keys(proxy),
+                             args=self._report_args(proxy, success, blocked, latency))
+        self._log_state(proxy, state)
+
+    def _log_state(self, proxy: str, state: List[str]):
+        if state[0] == "tripped":
+            logging.warning(f"Proxy {proxy} circuit open for {float(state[1]):.0f}s, "
+                            f"success rate {float(state[2]):.2f}")
+        elif state[0] == "closed":
+            logging.info(f"Proxy {proxy} circuit closed")
+
+    def record_probe(self, proxy: str, healthy: bool) -> Optional[str]:
+        state = self._probe(
+            keys=[self._key(name) for name in
+                  ("available", "cooldown", "quarantined", "probe_streaks", "usage", "scores",
+                   "breaker", "half_open", "tripped", "unmeasured", "latency_stats")] + [self._health_key(proxy)],
+            args=[proxy, int(healthy), self.probe_failures_to_quarantine, self.probe_successes_to_restore,
+                  self.latency_prior],
+        )
+        if state == "restored":
+            logging.info(f"Proxy {proxy} restored after healthy probes")
+        elif state == "half_open":
+            logging.info(f"Proxy {proxy} circuit half-open after healthy probes")
+        elif state == "quarantined":
+            logging.warning(f"Proxy {proxy} quarantined after failed probes")
+        return state or None
+
+    def claim_probe_round(self, interval: float) -> bool:
+        # Every worker process runs a prober; only one of them probes the
+        # shared pool per interval.
+        return bool(self._redis.set(self._key("probe_lock"), 1, nx=True, px=max(1, int(interval * 1000))))
+
+    def healthiest(self, count: int) -> List[str]:
+        return self._redis.zrevrange(self._key("available"), 0, count - 1)
+
+    def get_available_proxies(self) -> List[str]:
+        return self._redis.zrevrange(self._key("available"), 0, -1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.scard(self._key("all"))
+        pipe.zcard(self._key("available"))
+        pipe.zcount(self._key("cooldown"), "-inf", time.time())
+        pipe.scard(self._key("quarantined"))
+        pipe.scard(self._key("tripped"))
+        pipe.get(self._key("requests"))
+        total, available, released, quarantined, tripped, requests = pipe.execute()
+
+        return {
+            "total_proxies": total,
+            "available": available + released,
+            "quarantined": quarantined,
+            "circuit_open": tripped,
+            "current_proxy": None,
+            "total_requests": int(requests or 0),
+            "requests_with_current": 0
+        }
@@ -0,0 +1,77 @@
+import hashlib
+import time
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from app.core.config import settings
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    # Only for cache keys and dedup; requests go out to the URL as given.
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = parts.netloc.rpartition("@")[2]
+    # Built from netloc rather than hostname, which drops IPv6 brackets.
+    netloc = (host[:host.find("]") + 1] if host.startswith("[") else host.partition(":")[0]).lower()
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    if parts.username:
+        netloc = f"{parts.username}:{parts.password or ''}@{netloc}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def cache_key(url: str, headers: Optional[Dict[str, str]] = None) -> str:
+    lowered = {name.lower(): value for name, value in (headers or {}).items()}
+    parts = [normalize_url(url)]
+    parts.extend(f"{name}:{lowered.get(name, '')}" for name in settings.cache_vary_headers)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def is_fresh(entry: Dict[str, Any], max_age: int) -> bool:
+    return time.time() - entry["fetched_at"] <= max_age
+
+
+def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def build_cache_entry(result: Dict[str, Any], etag: Optional[str] = None,
+                      last_modified: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "job_id": result["job_id"],
+        "url": result["url"],
+        "status_code": result["status_code"],
+        "content_type": result["content_type"],
+        "body_digest": result["body_digest"],
+        "body_encoding": result["body_encoding"],
+        "fetched_at": time.time(),
+        "etag": etag,
+        "last_modified": last_modified,
+    }
+
+
+def result_from_cache(job_id: str, batch_id: Optional[str], url: str, entry: Dict[str, Any],
+                      elapsed_ms: int, cache_status: str) -> Dict[str, Any]:
+    return {
+        "job_id": job_id,
+        "batch_id": batch_id,
+        "url": url,
+        "status_code": entry["status_code"],
+        "content_type": entry["content_type"],
+        "response_time_ms": elapsed_ms,
+        "headers_trunc": {},
+        "body_encoding": entry["body_encoding"],
+        "body_digest": entry["body_digest"],
+        "cache_status": cache_status,
+        "cached_from": entry["job_id"],
+        "error_type": None,
+        "error_message": None,
+    }
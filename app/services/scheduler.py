@@ -0,0 +1,129 @@
+import json
+from typing import Iterable, Dict, Any, List, Tuple
+import redis
+
+from app.core.config import settings
+
+# Frees the slots of finished jobs and expired claims, then hands out up to
+# `quantum` jobs per batch, round-robin over the ring of batches, until
+# `watermark` jobs are outstanding. Claims nothing while fewer than `quantum`
+# slots are free so jobs go out in groups. Every batch queue it may touch is
+# passed in KEYS[3:], read from the ring beforehand; batches that joined the
+# ring since wait for the next claim. Returns a flat list of batch id,
+# "job_id url" pairs.
+CLAIM_SCRIPT = """
+local ring, outstanding = KEYS[1], KEYS[2]
+local lease, watermark, quantum = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local finished = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+for i = 5, 4 + finished do
+    redis.call('ZREM', outstanding, ARGV[i])
+end
+redis.call('ZREMRANGEBYSCORE', outstanding, '-inf', now - lease)
+
+local claimed = {}
+local room = watermark - redis.call('ZCARD', outstanding)
+if room < math.min(quantum, watermark) then
+    return claimed
+end
+
+local queues = {}
+for i = 3, #KEYS do
+    queues[ARGV[finished + i + 2]] = KEYS[i]
+end
+local batches, counted = 0, {}
+for _, batch in ipairs(redis.call('LRANGE', ring, 0, -1)) do
+    if queues[batch] and not counted[batch] then
+        counted[batch] = true
+        batches = batches + 1
+    end
+end
+
+while room > 0 and batches > 0 do
+    local batch = redis.call('RPOPLPUSH', ring, ring)
+    local queue = queues[batch]
+    if queue then
+        local items = redis.call('LPOP', queue, math.min(quantum, room))
+        if items then
+            for _, item in ipairs(items) do
+                redis.call('ZADD', outstanding, now, string.sub(item, 1, string.find(item, ' ') - 1))
+                claimed[#claimed + 1] = batch
+                claimed[#claimed + 1] = item
+            end
+            room = room - #items
+        end
+        if not items or redis.call('LLEN', queue) == 0 then
+            redis.call('LREM', ring, 0, batch)
+            queues[batch] = nil
+            batches = batches - 1
+        end
+    end
+end
+return claimed
+"""
+
+
+class FairScheduler:
+    def __init__(self, redis_url: str, max_outstanding: int, quantum: int, lease_secs: int,
+                 key_prefix: str = "sched"):
+        self.max_outstanding = max_outstanding
+        self.quantum = max(1, quantum)
+        self.lease_secs = lease_secs
+        self.key_prefix = key_prefix
+
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._claim = self._redis.register_script(CLAIM_SCRIPT)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_outstanding > 0
+
+    def _key(self, name: str) -> str:
+        return f"{self.key_prefix}:{name}"
+
+    def enqueue(self, batch_id: str, jobs: List[Dict[str, str]], dispatch: Dict[str, Any]) -> None:
+        queue = self._key(f"batch:{batch_id}")
+        ttl = settings.result_ttl_secs
+        pipe = self._redis.pipeline(transaction=False)
+        for i in range(0, len(jobs), 10000):
+            pipe.rpush(queue, *(f"{job['job_id']} {job['url']}" for job in jobs[i:i + 10000]))
+        pipe.expire(queue, ttl)
+        pipe.set(self._key(f"dispatch:{batch_id}"), json.dumps(dispatch), ex=ttl)
+        # Crawl sessions enqueue again as they discover pages; one ring entry
+        # per batch keeps their share the same as any other batch's.
+        pipe.lrem(self._key("ring"), 0, batch_id)
+        pipe.rpush(self._key("ring"), batch_id)
+        pipe.execute()
+
+    def claim(self, finished: Iterable[str] = ()) -> List[Tuple[str, Dict[str, Any], List[Dict[str, str]]]]:
+        finished = list(finished)
+        ring = self._redis.lrange(self._key("ring"), 0, -1)
+        flat = self._claim(
+            keys=[self._key("ring"), self._key("outstanding")] + [self._key(f"batch:{batch_id}") for batch_id in ring],
+            args=[self.lease_secs, self.max_outstanding, self.quantum, len(finished), *finished, *ring],
+        )
+        jobs_by_batch: Dict[str, List[Dict[str, str]]] = {}
+        for batch_id, item in zip(flat[::2], flat[1::2]):
+            job_id, _, url = item.partition(" ")
+            jobs_by_batch.setdefault(batch_id, []).append({"job_id": job_id, "url": url})
+        if not jobs_by_batch:
+            return []
+
+        dispatch = self._redis.mget([self._key(f"dispatch:{batch_id}") for batch_id in jobs_by_batch])
+        return [
+            (batch_id, json.loads(raw) if raw else {}, jobs)
+            for (batch_id, jobs), raw in zip(jobs_by_batch.items(), dispatch)
+        ]
+
+    def outstanding(self) -> int:
+        return self._redis.zcard(self._key("outstanding"))
+
+
+scheduler = FairScheduler(
+    settings.redis_url,
+    settings.sched_max_outstanding,
+    settings.sched_quantum,
+    settings.sched_lease_secs,
+)
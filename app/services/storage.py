@@ -1,30 +1,533 @@
 import json
+import time
 import redis
-from typing import Optional, Dict, Any
+import redis.asyncio
+from typing import Optional, Dict, Any, List, Tuple
 from app.core.config import settings
 
+# Jobs missing from the state map are PENDING; counters only track the rest,
+# so a batch needs no per-job writes at creation time. Every change is also
+# appended to the job's and the batch's event streams, the latter with the
+# batch's running totals.
+TRANSITION_SCRIPT = """
+local states, counters, job_events, batch_events = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local job_id, new_state, ttl, event = ARGV[1], ARGV[2], tonumber(ARGV[3]), ARGV[4]
+local batch_maxlen, job_maxlen = ARGV[5], ARGV[6]
+
+local old_state = redis.call('HGET', states, job_id) or 'PENDING'
+if old_state == new_state then
+    return 0
+end
+if new_state == 'STARTED' and (old_state == 'SUCCESS' or old_state == 'FAILURE') then
+    return 0
+end
+
+redis.call('HSET', states, job_id, new_state)
+if old_state ~= 'PENDING' then
+    redis.call('HINCRBY', counters, old_state, -1)
+end
+redis.call('HINCRBY', counters, new_state, 1)
+redis.call('EXPIRE', states, ttl)
+redis.call('EXPIRE', counters, ttl)
+
+local totals = redis.call('HMGET', counters, 'SUCCESS', 'FAILURE')
+redis.call('XADD', batch_events, 'MAXLEN', '~', batch_maxlen, '*', 'data', event,
+           'succeeded', totals[1] or '0', 'failed', totals[2] or '0')
+redis.call('EXPIRE', batch_events, ttl)
+redis.call('XADD', job_events, 'MAXLEN', '~', job_maxlen, '*', 'data', event)
+redis.call('EXPIRE', job_events, ttl)
+return 1
+"""
+
+JOB_EVENTS_MAXLEN = 32
+FINAL_STATES = ("SUCCESS", "FAILURE")
+JOB_STATE_FIELDS = ["state", "queued_at", "started_at", "finished_at", "error_message"]
+EVENT_RESULT_FIELDS = {
+    "url": "url",
+    "status_code": "status_code",
+    "response_time_ms": "response_time_ms",
+    "body_digest": "body_digest",
+    "cache_status": "cache_status",
+    "error_message": "error",
+}
+
+# Single-flight lease for one URL: the first job becomes the leader, later jobs
+# queue up as followers until the leader finishes and hands them its result.
+JOIN_FLIGHT_SCRIPT = """
+local lease, followers = KEYS[1], KEYS[2]
+local job_id, follower, ttl = ARGV[1], ARGV[2], tonumber(ARGV[3])
+
+local leader = redis.call('GET', lease)
+if not leader or leader == job_id then
+    redis.call('SET', lease, job_id, 'EX', ttl)
+    return false
+end
+redis.call('RPUSH', followers, follower)
+redis.call('EXPIRE', followers, ttl)
+return leader
+"""
+
+FINISH_FLIGHT_SCRIPT = """
+local lease, followers = KEYS[1], KEYS[2]
+if redis.call('GET', lease) ~= ARGV[1] then
+    return {}
+end
+local waiting = redis.call('LRANGE', followers, 0, -1)
+redis.call('DEL', lease, followers)
+return waiting
+"""
+
+
+def _encode_meta(result_data: Dict[str, Any]) -> Dict[str, str]:
+    return {field: json.dumps(value) for field, value in result_data.items() if field != "body"}
+
+
+def job_event(job_id: str, batch_id: Optional[str], state: str,
+              result_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    event = {"job_id": job_id, "batch_id": batch_id, "state": state}
+    if result_data:
+        event.update({name: result_data.get(field) for field, name in EVENT_RESULT_FIELDS.items()})
+    return event
+
+
+def _event_key(kind: str, object_id: str) -> str:
+    return f"events:{kind}:{object_id}"
+
+
+def _body_key(digest: str, encoding: str) -> str:
+    return f"body:{encoding}:{digest}"
+
+
+def _decode_meta(raw: Dict[bytes, bytes]) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    return {field.decode(): json.loads(value) for field, value in raw.items()}
+
+
+def _job_record(result_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "state": "FAILURE" if result_data.get("error_message") else "SUCCESS",
+        "finished_at": time.time(),
+        **result_data,
+    }
+
+
+def _finished(payload: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # A job record only holds a result once the job reached a final state.
+    if payload and payload.get("state", "SUCCESS") in FINAL_STATES:
+        return payload
+    return None
+
+
+def _body_keys(payloads: List[Optional[Dict[str, Any]]]) -> List[Optional[str]]:
+    return [
+        _body_key(payload["body_digest"], payload["body_encoding"])
+        if payload and payload.get("body_digest") else None
+        for payload in payloads
+    ]
+
+
+def _decode_fields(fields: List[str], values: List[Optional[bytes]]) -> Dict[str, Any]:
+    return {field: json.loads(value) for field, value in zip(fields, values) if value}
+
+
+# The helpers below only queue commands, so sync and asyncio pipelines share them.
+def _queue_job_result(pipe, job_id: str, result_data: Dict[str, Any], body: Optional[bytes],
+                      cache_key: Optional[str], cache_entry: Optional[Dict[str, Any]]):
+    # Bodies are shared by digest; every job that references one pushes
+    # its expiry out, so a body outlives all job records pointing at it.
+    key = f"job:{job_id}"
+    ttl = settings.result_ttl_secs
+    digest = result_data.get("body_digest")
+
+    pipe.delete(key)
+    pipe.hset(key, mapping=_encode_meta(_job_record(result_data)))
+    pipe.expire(key, ttl)
+    if digest:
+        body_key = _body_key(digest, result_data["body_encoding"])
+        if body is not None:
+            pipe.set(body_key, body, ex=ttl, nx=True)
+        pipe.expire(body_key, ttl)
+    if cache_key and cache_entry:
+        pipe.delete(f"cache:{cache_key}")
+        pipe.hset(f"cache:{cache_key}", mapping=_encode_meta(cache_entry))
+        pipe.expire(f"cache:{cache_key}", ttl)
+
+
+def _queue_batch_info(pipe, batch_id: str, batch_info: Dict[str, Any], job_ids: Optional[List[str]]):
+    key = f"batch:{batch_id}"
+    pipe.setex(name=key, time=settings.result_ttl_secs, value=json.dumps(batch_info))
+    if job_ids:
+        jobs_key = f"batch:{batch_id}:jobs"
+        for i in range(0, len(job_ids), 10000):
+            pipe.rpush(jobs_key, *job_ids[i:i + 10000])
+        pipe.expire(jobs_key, settings.result_ttl_secs)
+
+
+def _batch_progress(raw: Optional[str], counters: Dict[str, str]) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+    batch_info = json.loads(raw) if raw else None
+    counts = {k: int(v) for k, v in counters.items()}
+    # Crawl sessions grow as pages are discovered; the frontier keeps their size.
+    total = counts.pop("total", None)
+    if batch_info is not None and total is not None:
+        batch_info["total_count"] = total
+    return batch_info, counts
+
 
 class StorageService:
     def __init__(self):
         self._redis = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+        # Result metadata hashes and raw body bytes go through a bytes-mode client.
+        self._raw = redis.Redis.from_url(settings.redis_url)
+        self._transition = self._redis.register_script(TRANSITION_SCRIPT)
+        self._join_flight = self._redis.register_script(JOIN_FLIGHT_SCRIPT)
+        self._finish_flight = self._redis.register_script(FINISH_FLIGHT_SCRIPT)
 
-    def save_job_result(self, job_id: str, result_data: Dict[str, Any]) -> None:
-        key = f"job:{job_id}"
-        self._redis.setex(name=key, time=settings.result_ttl_secs, value=json.dumps(result_data))
+        # asyncio clients for the API, created on first use inside its event loop.
+        self._aredis: Optional[redis.asyncio.Redis] = None
+        self._araw: Optional[redis.asyncio.Redis] = None
+        self._aevents: Optional[redis.asyncio.Redis] = None
 
-    def get_job_result(self, job_id: str) -> Optional[Dict[str, Any]]:
-        key = f"job:{job_id}"
-        raw = self._redis.get(key)
-        return json.loads(raw) if raw else None
+    def _async_clients(self) -> Tuple[redis.asyncio.Redis, redis.asyncio.Redis]:
+        if self._araw is None:
+            # Blocking pools make a burst of requests wait for a free
+            # connection instead of failing past max_connections.
+            self._aredis = redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+                settings.redis_url, max_connections=settings.redis_max_connections, decode_responses=True
+            ))
+            self._araw = redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+                settings.redis_url, max_connections=settings.redis_max_connections
+            ))
+        return self._aredis, self._araw
 
-    def save_batch_info(self, batch_id: str, batch_info: Dict[str, Any]) -> None:
-        key = f"batch:{batch_id}"
-        self._redis.setex(name=key, time=settings.result_ttl_secs, value=json.dumps(batch_info))
+    def save_job_result(self, job_id: str, result_data: Dict[str, Any],
+                        body: Optional[bytes] = None, cache_key: Optional[str] = None,
+                        cache_entry: Optional[Dict[str, Any]] = None) -> None:
+        pipe = self._raw.pipeline(transaction=True)
+        _queue_job_result(pipe, job_id, result_data, body, cache_key, cache_entry)
+        pipe.execute()
+
+    async def asave_job_result(self, job_id: str, result_data: Dict[str, Any],
+                               body: Optional[bytes] = None, cache_key: Optional[str] = None,
+                               cache_entry: Optional[Dict[str, Any]] = None) -> None:
+        _, araw = self._async_clients()
+        pipe = araw.pipeline(transaction=True)
+        _queue_job_result(pipe, job_id, result_data, body, cache_key, cache_entry)
+        await pipe.execute()
+
+    def join_flight(self, flight_key: str, job_id: str, batch_id: Optional[str]) -> Optional[str]:
+        follower = json.dumps({"job_id": job_id, "batch_id": batch_id})
+        return self._join_flight(
+            keys=[f"flight:{flight_key}", f"flight:{flight_key}:followers"],
+            args=[job_id, follower, settings.coalesce_lease_secs],
+        )
+
+    def finish_flight(self, flight_key: str, job_id: str) -> List[Dict[str, Any]]:
+        waiting = self._finish_flight(
+            keys=[f"flight:{flight_key}", f"flight:{flight_key}:followers"],
+            args=[job_id],
+        )
+        # A follower that outwaited the lease re-registers, so drop repeats.
+        followers = {}
+        for raw in waiting:
+            follower = json.loads(raw)
+            if follower["job_id"] != job_id:
+                followers[follower["job_id"]] = follower
+        return list(followers.values())
+
+    def save_coalesced_results(self, result_data: Dict[str, Any],
+                               followers: List[Dict[str, Any]]) -> None:
+        ttl = settings.result_ttl_secs
+        pipe = self._raw.pipeline(transaction=False)
+        for follower in followers:
+            key = f"job:{follower['job_id']}"
+            record = {
+                **_job_record(result_data),
+                "job_id": follower["job_id"],
+                "batch_id": follower["batch_id"],
+                "coalesced_from": result_data["job_id"],
+            }
+            pipe.delete(key)
+            pipe.hset(key, mapping=_encode_meta(record))
+            pipe.expire(key, ttl)
+            self._queue_job_state(pipe, follower["job_id"], follower["batch_id"], record["state"], record)
+        if result_data.get("body_digest"):
+            pipe.expire(_body_key(result_data["body_digest"], result_data["body_encoding"]), ttl)
+        pipe.incrby("stats:coalesced_fetches", len(followers))
+        pipe.execute()
+
+    def get_coalesced_fetches(self) -> int:
+        return int(self._redis.get("stats:coalesced_fetches") or 0)
+
+    async def aget_coalesced_fetches(self) -> int:
+        aredis, _ = self._async_clients()
+        return int(await aredis.get("stats:coalesced_fetches") or 0)
+
+    def get_cache_entry(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        return _decode_meta(self._raw.hgetall(f"cache:{cache_key}"))
+
+    async def aget_cache_entry(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        _, araw = self._async_clients()
+        return _decode_meta(await araw.hgetall(f"cache:{cache_key}"))
+
+    def _get_bodies(self, payloads: List[Optional[Dict[str, Any]]]) -> List[Optional[bytes]]:
+        body_keys = _body_keys(payloads)
+        wanted = [body_key for body_key in body_keys if body_key]
+        bodies = dict(zip(wanted, self._raw.mget(wanted))) if wanted else {}
+        return [bodies.get(body_key) if body_key else None for body_key in body_keys]
+
+    async def _aget_bodies(self, payloads: List[Optional[Dict[str, Any]]]) -> List[Optional[bytes]]:
+        _, araw = self._async_clients()
+        body_keys = _body_keys(payloads)
+        wanted = [body_key for body_key in body_keys if body_key]
+        bodies = dict(zip(wanted, await araw.mget(wanted))) if wanted else {}
+        return [bodies.get(body_key) if body_key else None for body_key in body_keys]
+
+    def get_job_result(self, job_id: str, with_body: bool = True) -> Optional[Dict[str, Any]]:
+        return self.get_job_results([job_id], with_body)[0]
+
+    def get_job_results(self, job_ids: List[str],
+                        with_body: bool = True) -> List[Optional[Dict[str, Any]]]:
+        if not job_ids:
+            return []
+
+        pipe = self._raw.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hgetall(f"job:{job_id}")
+        results = [_finished(_decode_meta(raw)) for raw in pipe.execute()]
+
+        if with_body:
+            for payload, body in zip(results, self._get_bodies(results)):
+                if payload is not None:
+                    payload["body"] = body
+        return results
+
+    async def aget_job_result(self, job_id: str, with_body: bool = True) -> Optional[Dict[str, Any]]:
+        return (await self.aget_job_results([job_id], with_body))[0]
+
+    async def aget_job_results(self, job_ids: List[str],
+                               with_body: bool = True) -> List[Optional[Dict[str, Any]]]:
+        if not job_ids:
+            return []
+
+        _, araw = self._async_clients()
+        pipe = araw.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hgetall(f"job:{job_id}")
+        results = [_finished(_decode_meta(raw)) for raw in await pipe.execute()]
+
+        if with_body:
+            for payload, body in zip(results, await self._aget_bodies(results)):
+                if payload is not None:
+                    payload["body"] = body
+        return results
+
+    def get_job_body(self, job_id: str) -> Tuple[Optional[bytes], Optional[str], Optional[str], Optional[str]]:
+        fields = ["body_digest", "body_encoding", "content_type"]
+        meta = _decode_fields(fields, self._raw.hmget(f"job:{job_id}", fields))
+        body = self._get_bodies([meta])[0]
+        return body, meta.get("body_encoding"), meta.get("content_type"), meta.get("body_digest")
+
+    async def aget_job_body(self, job_id: str) -> Tuple[Optional[bytes], Optional[str], Optional[str], Optional[str]]:
+        _, araw = self._async_clients()
+        fields = ["body_digest", "body_encoding", "content_type"]
+        meta = _decode_fields(fields, await araw.hmget(f"job:{job_id}", fields))
+        body = (await self._aget_bodies([meta]))[0]
+        return body, meta.get("body_encoding"), meta.get("content_type"), meta.get("body_digest")
+
+    def sample_job_bodies(self, limit: int) -> List[Tuple[str, str, bytes]]:
+        samples: List[Tuple[str, str, bytes]] = []
+        seen = set()
+        keys: List[bytes] = []
+        fields = ["url", "body_encoding", "body_digest"]
+
+        def flush():
+            pipe = self._raw.pipeline(transaction=False)
+            for key in keys:
+                pipe.hmget(key, fields)
+            payloads = []
+            for values in pipe.execute():
+                payload = _decode_fields(fields, values)
+                # Identical pages share one body; sample each only once.
+                if payload.get("body_digest") and payload["body_digest"] not in seen:
+                    seen.add(payload["body_digest"])
+                    payloads.append(payload)
+            for payload, body in zip(payloads, self._get_bodies(payloads)):
+                if body and len(samples) < limit:
+                    samples.append((payload["url"], payload["body_encoding"], body))
+            keys.clear()
+
+        for key in self._raw.scan_iter(match="job:*", count=1000, _type="hash"):
+            keys.append(key)
+            if len(keys) >= 500:
+                flush()
+            if len(samples) >= limit:
+                break
+        if keys and len(samples) < limit:
+            flush()
+        return samples
+
+    def save_codec_dictionary(self, name: str, data: bytes) -> int:
+        version = self._raw.incr(f"codec:dict:{name}:seq")
+        pipe = self._raw.pipeline(transaction=True)
+        pipe.set(f"codec:dict:{name}:{version}", data)
+        pipe.set(f"codec:dict:{name}:current", version)
+        pipe.execute()
+        return version
+
+    def get_codec_dictionary(self, name: str, version: int) -> Optional[bytes]:
+        return self._raw.get(f"codec:dict:{name}:{version}")
+
+    def get_codec_dictionary_version(self, name: str) -> Optional[int]:
+        version = self._raw.get(f"codec:dict:{name}:current")
+        return int(version) if version else None
+
+    def save_batch_info(self, batch_id: str, batch_info: Dict[str, Any],
+                        job_ids: Optional[List[str]] = None) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        _queue_batch_info(pipe, batch_id, batch_info, job_ids)
+        pipe.execute()
+
+    async def asave_batch_info(self, batch_id: str, batch_info: Dict[str, Any],
+                               job_ids: Optional[List[str]] = None) -> None:
+        aredis, _ = self._async_clients()
+        pipe = aredis.pipeline(transaction=False)
+        _queue_batch_info(pipe, batch_id, batch_info, job_ids)
+        await pipe.execute()
+
+    def update_batch_info(self, batch_id: str, fields: Dict[str, Any]) -> None:
+        batch_info = self.get_batch_info(batch_id)
+        if batch_info is None:
+            return
+        batch_info.update(fields)
+        self._redis.set(f"batch:{batch_id}", json.dumps(batch_info), keepttl=True)
 
     def get_batch_info(self, batch_id: str) -> Optional[Dict[str, Any]]:
         key = f"batch:{batch_id}"
         raw = self._redis.get(key)
         return json.loads(raw) if raw else None
 
+    async def aget_batch_info(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        aredis, _ = self._async_clients()
+        raw = await aredis.get(f"batch:{batch_id}")
+        return json.loads(raw) if raw else None
+
+    def get_batch_job_ids(self, batch_id: str, offset: int = 0,
+                          limit: Optional[int] = None) -> List[str]:
+        stop = -1 if limit is None else offset + limit - 1
+        return self._redis.lrange(f"batch:{batch_id}:jobs", offset, stop)
+
+    async def aget_batch_job_ids(self, batch_id: str, offset: int = 0,
+                                 limit: Optional[int] = None) -> List[str]:
+        aredis, _ = self._async_clients()
+        stop = -1 if limit is None else offset + limit - 1
+        return await aredis.lrange(f"batch:{batch_id}:jobs", offset, stop)
+
+    def _queue_job_state(self, pipe, job_id: str, batch_id: Optional[str], state: str,
+                         result_data: Optional[Dict[str, Any]] = None):
+        event = json.dumps(job_event(job_id, batch_id, state, result_data))
+        if batch_id:
+            self._transition(
+                keys=[f"batch:{batch_id}:states", f"batch:{batch_id}:counters",
+                      _event_key("job", job_id), _event_key("batch", batch_id)],
+                args=[job_id, state, settings.result_ttl_secs, event, settings.events_maxlen, JOB_EVENTS_MAXLEN],
+                client=pipe,
+            )
+        else:
+            pipe.xadd(_event_key("job", job_id), {"data": event}, maxlen=JOB_EVENTS_MAXLEN, approximate=True)
+            pipe.expire(_event_key("job", job_id), settings.result_ttl_secs)
+
+    async def aqueue_job(self, job_id: str, queued_at: float) -> None:
+        # Written before the task is published, so a worker's start_job always lands after it.
+        key = f"job:{job_id}"
+        _, araw = self._async_clients()
+        pipe = araw.pipeline(transaction=False)
+        pipe.hset(key, mapping=_encode_meta({"job_id": job_id, "state": "PENDING", "queued_at": queued_at}))
+        pipe.expire(key, settings.result_ttl_secs)
+        await pipe.execute()
+
+    def start_job(self, job_id: str, batch_id: Optional[str], queued_at: Optional[float],
+                  started_at: float) -> None:
+        # One round trip: the job record, the batch transition and the events.
+        key = f"job:{job_id}"
+        pipe = self._raw.pipeline(transaction=False)
+        pipe.hset(key, mapping=_encode_meta({
+            "job_id": job_id, "batch_id": batch_id, "state": "STARTED",
+            "queued_at": queued_at, "started_at": started_at,
+        }))
+        pipe.expire(key, settings.result_ttl_secs)
+        self._queue_job_state(pipe, job_id, batch_id, "STARTED")
+        pipe.execute()
+
+    def finish_job(self, job_id: str, result_data: Dict[str, Any], body: Optional[bytes] = None,
+                   cache_key: Optional[str] = None, cache_entry: Optional[Dict[str, Any]] = None,
+                   lifecycle: Optional[Dict[str, Optional[float]]] = None) -> None:
+        record = _job_record({**result_data, **{k: v for k, v in (lifecycle or {}).items() if v is not None}})
+        pipe = self._raw.pipeline(transaction=True)
+        _queue_job_result(pipe, job_id, record, body, cache_key, cache_entry)
+        self._queue_job_state(pipe, job_id, record.get("batch_id"), record["state"], record)
+        pipe.execute()
+
+    async def aget_job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        _, araw = self._async_clients()
+        record = _decode_fields(JOB_STATE_FIELDS, await araw.hmget(f"job:{job_id}", JOB_STATE_FIELDS))
+        if record and "state" not in record:
+            # Written before job records carried their state.
+            record["state"] = "FAILURE" if record.get("error_message") else "SUCCESS"
+        return record or None
+
+    async def aget_event_bounds(self, kind: str, object_id: str) -> Tuple[Optional[str], Optional[str]]:
+        aredis, _ = self._async_clients()
+        pipe = aredis.pipeline(transaction=False)
+        pipe.xrange(_event_key(kind, object_id), count=1)
+        pipe.xrevrange(_event_key(kind, object_id), count=1)
+        first, last = await pipe.execute()
+        return (first[0][0] if first else None), (last[0][0] if last else None)
+
+    async def aread_events(self, kind: str, object_id: str, after: str,
+                           block_ms: int) -> List[Tuple[str, Dict[str, str]]]:
+        # Blocking reads hold their connection, so listeners get a pool of their own.
+        if self._aevents is None:
+            self._aevents = redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+                settings.redis_url, max_connections=settings.events_max_listeners, decode_responses=True
+            ))
+        streams = await self._aevents.xread({_event_key(kind, object_id): after}, count=500, block=block_ms)
+        return streams[0][1] if streams else []
+
+    def get_batch_progress(self, batch_id: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(f"batch:{batch_id}")
+        pipe.hgetall(f"batch:{batch_id}:counters")
+        return _batch_progress(*pipe.execute())
+
+    async def aget_batch_progress(self, batch_id: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+        aredis, _ = self._async_clients()
+        pipe = aredis.pipeline(transaction=False)
+        pipe.get(f"batch:{batch_id}")
+        pipe.hgetall(f"batch:{batch_id}:counters")
+        return _batch_progress(*await pipe.execute())
+
+    def get_batch_job_states(self, batch_id: str, job_ids: List[str]) -> List[str]:
+        if not job_ids:
+            return []
+        states = self._redis.hmget(f"batch:{batch_id}:states", job_ids)
+        return [state or "PENDING" for state in states]
+
+    async def aget_batch_job_states(self, batch_id: str, job_ids: List[str]) -> List[str]:
+        if not job_ids:
+            return []
+        aredis, _ = self._async_clients()
+        states = await aredis.hmget(f"batch:{batch_id}:states", job_ids)
+        return [state or "PENDING" for state in states]
+
+    async def aclose(self):
+        if self._araw is not None:
+            await self._aredis.aclose()
+            await self._araw.aclose()
+            self._aredis = self._araw = None
+        if self._aevents is not None:
+            await self._aevents.aclose()
+            self._aevents = None
+
 
 storage = StorageService()
@@ -0,0 +1,6 @@
+from urllib.parse import urlsplit
+
+
+def host_for_url(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
@@ -0,0 +1,42 @@
+import argparse
+import logging
+
+from app.services.body_codecs import codec_registry, dictionary_name_for_url, train_dictionary
+from app.services.storage import storage
+
+
+def collect_samples(site: str, limit: int):
+    samples = []
+    for url, encoding, body in storage.sample_job_bodies(limit * 4):
+        if dictionary_name_for_url(url) != site:
+            continue
+        try:
+            samples.append(codec_registry.get(encoding).decode(body))
+        except ValueError:
+            continue
+        if len(samples) >= limit:
+            break
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary from stored bodies of one site")
+    parser.add_argument("--site", required=True, help="Host name, e.g. djinni.co")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=112_640, help="Dictionary size in bytes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    site = dictionary_name_for_url(f"http://{args.site}/")
+    samples = collect_samples(site, args.samples)
+    if len(samples) < 10:
+        raise SystemExit(f"Only {len(samples)} stored bodies found for {site}, need at least 10")
+
+    dictionary = train_dictionary(samples, args.size)
+    version = storage.save_codec_dictionary(site, dictionary)
+    logging.info(f"Trained {len(dictionary)} byte dictionary for {site} from {len(samples)} bodies "
+                 f"(version {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from typing import Optional
 from celery import Celery
 from app.core.config import settings
 
@@ -7,8 +8,22 @@ celery_app = Celery(
     backend=settings.celery_result_backend,
 )
 
+# Lanes by request priority. Workers consume them in the order given to -Q
+# and, with the priority queue order strategy, always drain earlier lanes first.
+PRIORITY_QUEUES = {
+    "high": "crawler.interactive",
+    "normal": "crawler",
+    "low": "crawler.bulk",
+}
+
+
+def queue_for_priority(priority: Optional[str]) -> str:
+    return PRIORITY_QUEUES.get(priority or "normal", PRIORITY_QUEUES["normal"])
+
+
 celery_app.conf.task_routes = {
-    "crawl_page": {"queue": "crawler"}
+    "crawl_page": {"queue": "crawler"},
+    "crawl_many": {"queue": "crawler"},
 }
 
 celery_app.autodiscover_tasks(["app.worker.tasks"])
@@ -19,7 +34,11 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
-    task_track_started=True,
+    # Job state lives in the storage record; the backend copy is optional.
+    task_ignore_result=settings.task_ignore_result,
+    task_track_started=not settings.task_ignore_result,
+    broker_transport_options={"queue_order_strategy": "priority"},
+    worker_prefetch_multiplier=1,
     task_time_limit=settings.batch_timeout_secs,
     task_soft_time_limit=settings.batch_timeout_secs - 10,
 )
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Optional, Dict, Tuple
+
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from app.core.config import settings
+from app.services import metrics
+from app.services.async_crawler import AsyncCrawler
+from app.services.backoff import default_backoff_policy
+from app.services.crawler import Crawler, SmartProxyPool, load_proxy_lines
+from app.services.detector import PageDetector
+from app.services.proxy_prober import ProxyProber
+from app.services.rate_limiter import RateLimiter, parse_host_limits, parse_rate
+from app.services.redis_proxy_pool import RedisProxyPool
+
+logger = logging.getLogger(__name__)
+
+_proxy_pool = None
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_loaded = False
+_detector: Optional[PageDetector] = None
+_crawler: Optional[Crawler] = None
+_async_crawler: Optional[AsyncCrawler] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_prober: Optional[ProxyProber] = None
+_prewarming: Dict[Tuple[str, str], Future] = {}
+_worker_processes = 1
+_lock = threading.Lock()
+
+
+def create_proxy_pool():
+    proxies = load_proxy_lines(settings.proxy_file)
+    if not proxies:
+        return None
+    if settings.proxy_pool_backend == "redis":
+        pool = RedisProxyPool(proxies, settings.redis_url, key_prefix=settings.proxy_pool_key)
+    else:
+        pool = SmartProxyPool(proxies)
+    pool.max_requests_per_proxy = settings.proxy_max_requests
+    pool.cooldown_time = settings.proxy_cooldown_secs
+    pool.min_success_rate = settings.proxy_min_success_rate
+    pool.score_half_life = settings.proxy_score_half_life_secs
+    pool.breaker_failures = settings.proxy_breaker_failures
+    pool.breaker_open_secs = settings.proxy_breaker_open_secs
+    pool.breaker_max_open_secs = settings.proxy_breaker_max_open_secs
+    pool.ban_open_secs = settings.proxy_ban_open_secs
+    pool.probe_failures_to_quarantine = settings.probe_failures
+    pool.probe_successes_to_restore = settings.probe_successes
+    return pool
+
+
+def get_proxy_pool():
+    global _proxy_pool
+    if _proxy_pool is None:
+        with _lock:
+            if _proxy_pool is None:
+                _proxy_pool = create_proxy_pool()
+    return _proxy_pool
+
+
+def create_rate_limiter() -> Optional[RateLimiter]:
+    host_limits = parse_host_limits(settings.host_rate_limits)
+    default_limit = parse_rate(settings.host_rate_default)
+    proxy_limit = parse_rate(settings.proxy_host_rate)
+    if not host_limits and default_limit[0] <= 0 and proxy_limit[0] <= 0:
+        return None
+    return RateLimiter(settings.redis_url, host_limits, default_limit, proxy_limit)
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    global _rate_limiter, _rate_limiter_loaded
+    if not _rate_limiter_loaded:
+        with _lock:
+            if not _rate_limiter_loaded:
+                _rate_limiter = create_rate_limiter()
+                _rate_limiter_loaded = True
+    return _rate_limiter
+
+
+def get_detector() -> PageDetector:
+    global _detector
+    if _detector is None:
+        _detector = PageDetector.from_file(settings.detector_rules_file, settings.detector_window_bytes)
+    return _detector
+
+
+def get_crawler() -> Crawler:
+    global _crawler
+    if _crawler is None:
+        proxy_pool = get_proxy_pool()
+        rate_limiter = get_rate_limiter()
+        with _lock:
+            if _crawler is None:
+                _crawler = Crawler(
+                    proxy_file=settings.proxy_file,
+                    max_retries=settings.max_retries,
+                    timeout=float(settings.request_timeout_secs),
+                    delay=settings.request_delay_secs,
+                    use_http2=settings.use_http2,
+                    max_clients=settings.client_pool_size,
+                    proxy_pool=proxy_pool,
+                    backoff=default_backoff_policy(),
+                    rate_limiter=rate_limiter,
+                    detector=get_detector(),
+                    max_body_bytes=settings.max_body_bytes,
+                    keepalive_expiry=settings.client_keepalive_secs,
+                )
+                logger.info("Initialized process-wide crawler")
+    return _crawler
+
+
+def get_async_crawler() -> AsyncCrawler:
+    global _async_crawler
+    if _async_crawler is None:
+        _async_crawler = AsyncCrawler(
+            proxy_file=settings.proxy_file,
+            max_retries=settings.max_retries,
+            timeout=float(settings.request_timeout_secs),
+            delay=settings.request_delay_secs,
+            use_http2=settings.use_http2,
+            max_clients=settings.client_pool_size,
+            max_in_flight=settings.crawl_max_in_flight,
+            proxy_pool=get_proxy_pool(),
+            backoff=default_backoff_policy(),
+            rate_limiter=get_rate_limiter(),
+            detector=get_detector(),
+            max_body_bytes=settings.max_body_bytes,
+            keepalive_expiry=settings.client_keepalive_secs,
+        )
+        logger.info("Initialized process-wide async crawler")
+    return _async_crawler
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    # Pooled AsyncClients are bound to the loop they were created on, so the
+    # process keeps one loop alive instead of calling asyncio.run per task.
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+def run_async(coro):
+    return get_event_loop().run_until_complete(coro)
+
+
+@worker_init.connect
+def start_metrics_exporter(sender=None, **kwargs):
+    # Runs once in the main worker process, before the pool forks.
+    global _worker_processes
+    _worker_processes = getattr(sender, "concurrency", None) or 1
+    if settings.worker_metrics_port:
+        metrics.start_exporter(settings.worker_metrics_port)
+
+
+def prewarm_clients(proxy_line: str, url: str) -> bool:
+    # Warms the sync pool used by crawl_page and, with chunked batches, the
+    # async pool used by crawl_many. Async clients belong to the task loop,
+    # so their warm-up is queued there and runs with the next chunk.
+    warmed = get_crawler().prewarm(proxy_line, url)
+    loop, crawler = _loop, _async_crawler
+    if settings.batch_chunk_size > 0 and crawler is not None and loop is not None and not loop.is_closed():
+        pending = _prewarming.get((proxy_line, url))
+        if pending is None or pending.done():
+            _prewarming[(proxy_line, url)] = asyncio.run_coroutine_threadsafe(
+                crawler.prewarm(proxy_line, url), loop
+            )
+    return warmed
+
+
+def start_proxy_prober() -> Optional[ProxyProber]:
+    global _prober
+    proxy_pool = get_proxy_pool()
+    if proxy_pool is None or not settings.probe_url or settings.probe_interval_secs <= 0:
+        return None
+    # A memory pool lives in each worker process, so every process would probe
+    # every proxy; those only prewarm and leave probing to a shared pool.
+    probing = isinstance(proxy_pool, RedisProxyPool) or _worker_processes <= 1
+    if not probing:
+        logger.warning("Proxy probing needs PROXY_POOL_BACKEND=redis with more than one worker process")
+    _prober = ProxyProber(
+        proxy_pool,
+        settings.probe_url,
+        detector=get_detector(),
+        interval=settings.probe_interval_secs,
+        timeout=settings.probe_timeout_secs,
+        concurrency=settings.probe_concurrency,
+        prewarm_count=settings.probe_prewarm,
+        prewarm=prewarm_clients,
+        prewarm_urls=[url.strip() for url in settings.probe_prewarm_urls.split(",") if url.strip()],
+        use_http2=settings.use_http2,
+        probing=probing,
+    )
+    # Own thread and loop, so probing never competes with the task's loop.
+    threading.Thread(target=asyncio.run, args=(_prober.run(),), name="proxy-prober", daemon=True).start()
+    logger.info(f"Probing proxies through {settings.probe_url} every {settings.probe_interval_secs}s")
+    return _prober
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    get_crawler()
+    start_proxy_prober()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    global _crawler, _async_crawler, _loop, _prober
+    if _prober is not None:
+        _prober.stop()
+        _prober = None
+    _prewarming.clear()
+    if _crawler is not None:
+        _crawler.close()
+        _crawler = None
+    if _loop is not None and not _loop.is_closed():
+        if _async_crawler is not None:
+            _loop.run_until_complete(_async_crawler.aclose())
+        _loop.close()
+    _async_crawler = None
+    _loop = None
+    metrics.mark_process_dead(os.getpid())
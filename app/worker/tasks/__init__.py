@@ -1 +1 @@
-from .crawl import crawl_page
+from .crawl import crawl_page, crawl_many
@@ -1,101 +1,470 @@
-import base64
-import gzip
+import asyncio
 import logging
+import time
 from time import perf_counter
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
-from celery import states
+from celery import group, states
+from celery.exceptions import Retry, SoftTimeLimitExceeded
 from app.core.config import settings
+from app.services import metrics
 from app.services.storage import storage
-from app.services.crawler import Crawler, DEFAULT_HEADERS
-from app.worker.celery_app import celery_app
+from app.services.scheduler import scheduler
+from app.services.frontier import frontier
+from app.services.links import in_scope
+from app.services.body_codecs import codec_registry
+from app.services.crawler import DEFAULT_HEADERS, OUTCOME_BLOCKED, OUTCOME_TOO_LARGE, CrawlAttempt
+from app.services.response_cache import (
+    build_cache_entry,
+    cache_key,
+    conditional_headers,
+    is_fresh,
+    result_from_cache,
+)
+from app.worker.celery_app import celery_app, queue_for_priority
+from app.worker.runtime import get_crawler, get_async_crawler, run_async
 
 logger = logging.getLogger(__name__)
 
+# crawl_many wraps up this long before the soft time limit, which is itself
+# 10 seconds before the hard one.
+CHUNK_DEADLINE_MARGIN_SECS = 20
 
-@celery_app.task(bind=True, name="crawl_page", acks_late=True)
-def crawl_page(self, url: str, headers: Optional[Dict[str, str]] = None,
-               timeout: int = 15, batch_id: Optional[str] = None) -> Dict[str, Any]:
-    started = perf_counter()
-    job_id = self.request.id
 
+def build_request_headers(headers: Optional[Dict[str, str]]) -> Dict[str, str]:
     request_headers = dict(DEFAULT_HEADERS)
     if headers:
         request_headers.update(headers)
+    return request_headers
 
-    try:
-        crawler = Crawler(
-            proxy_file=settings.proxy_file,
-            max_retries=settings.max_retries,
-            timeout=float(timeout),
-            delay=settings.request_delay_secs,
-            headers=request_headers,
-            use_http2=settings.use_http2,
+
+def build_success_result(job_id: str, batch_id: Optional[str], url: str, elapsed_ms: int,
+                         request_headers: Dict[str, str], body_encoding: str) -> Dict[str, Any]:
+    return {
+        "job_id": job_id,
+        "batch_id": batch_id,
+        "url": url,
+        "status_code": 200,
+        "content_type": "text/html",
+        "response_time_ms": elapsed_ms,
+        "headers_trunc": {k: v for k, v in request_headers.items()},
+        "body_encoding": body_encoding,
+        "error_type": None,
+        "error_message": None,
+    }
+
+
+def save_success_result(job_id: str, batch_id: Optional[str], url: str, elapsed_ms: int,
+                        request_headers: Dict[str, str], result: CrawlAttempt, key: str,
+                        entry: Optional[Dict[str, Any]] = None,
+                        lifecycle: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, Any]:
+    if result.not_modified:
+        success_result = result_from_cache(job_id, batch_id, url, entry, elapsed_ms, "revalidated")
+        body = None
+        etag = result.etag or entry.get("etag")
+        last_modified = result.last_modified or entry.get("last_modified")
+    else:
+        success_result = build_success_result(job_id, batch_id, url, elapsed_ms, request_headers,
+                                              result.body_encoding)
+        success_result["body_digest"] = result.digest
+        body = result.body
+        etag, last_modified = result.etag, result.last_modified
+
+    with metrics.timed("redis_write"):
+        storage.finish_job(job_id, success_result, body, key,
+                           build_cache_entry(success_result, etag, last_modified), lifecycle)
+    return success_result
+
+
+def save_error_result(job_id: str, error_result: Dict[str, Any],
+                      lifecycle: Optional[Dict[str, Optional[float]]] = None):
+    with metrics.timed("redis_write"):
+        storage.finish_job(job_id, error_result, lifecycle=lifecycle)
+
+
+def build_error_result(job_id: str, batch_id: Optional[str], url: str, elapsed_ms: int,
+                       error_type: str, error_message: str) -> Dict[str, Any]:
+    return {
+        "job_id": job_id,
+        "batch_id": batch_id,
+        "url": url,
+        "status_code": None,
+        "content_type": None,
+        "response_time_ms": elapsed_ms,
+        "headers_trunc": {},
+        "body_encoding": None,
+        "body_digest": None,
+        "error_type": error_type,
+        "error_message": error_message,
+    }
+
+
+def store_task_state(job_id: str, result: Any, state: str):
+    # Jobs without a task of their own (coalesced followers, crawl_many
+    # chunks) are mirrored to the Celery backend unless results are ignored.
+    if not settings.task_ignore_result:
+        celery_app.backend.store_result(job_id, result, state)
+
+
+def release_slot(job_id: str, batch_id: Optional[str]):
+    if batch_id:
+        dispatch_pending([job_id])
+
+
+def release_flight(key: str, result_data: Dict[str, Any]) -> int:
+    followers = storage.finish_flight(key, result_data["job_id"])
+    if not followers:
+        return 0
+
+    storage.save_coalesced_results(result_data, followers)
+    failed = result_data.get("error_message") is not None
+    state = states.FAILURE if failed else states.SUCCESS
+    for follower in followers:
+        store_task_state(
+            follower["job_id"],
+            RuntimeError(result_data["error_message"]) if failed else build_task_result(result_data),
+            state,
         )
+    finished = [follower["job_id"] for follower in followers if follower["batch_id"]]
+    if finished:
+        dispatch_pending(finished)
+    logger.info(f"Served {len(followers)} coalesced jobs for {result_data['url']}")
+    return len(followers)
 
-        body_bytes = crawler.crawl_bytes(url)
-        elapsed_ms = int((perf_counter() - started) * 1000)
 
-        if body_bytes is None:
-            error_result = {
-                "job_id": job_id,
-                "batch_id": batch_id,
-                "url": url,
-                "status_code": None,
-                "content_type": None,
-                "response_time_ms": elapsed_ms,
-                "headers_trunc": {},
-                "body_encoding": None,
-                "body": None,
-                "error_type": "CrawlError",
-                "error_message": "Failed to crawl URL after all retries",
-            }
-            storage.save_job_result(job_id, error_result)
+def link_budget(crawl: Optional[Dict[str, Any]], depth: Optional[int]) -> int:
+    # Links are only collected from crawl pages that are not at the depth limit.
+    if crawl and depth is not None and depth < crawl["max_depth"]:
+        return settings.crawl_max_links_per_page
+    return 0
+
+
+def expand_crawl(batch_id: str, crawl: Dict[str, Any], depth: int, links: List[str],
+                 headers: Optional[Dict[str, str]], timeout: int, body_codec: Optional[str]) -> int:
+    # Runs before the page's own job finishes, so the session's total has
+    # already grown by the time its completed count could catch up with it.
+    jobs = frontier.admit(batch_id, in_scope(links, crawl), depth + 1, crawl)
+    if jobs:
+        options = {"headers": headers, "timeout": timeout, "batch_id": batch_id, "body_codec": body_codec,
+                   "queued_at": time.time(), "crawl": crawl}
+        submit_jobs(jobs, options, queue_for_priority(crawl.get("priority")))
+        logger.info(f"Queued {len(jobs)} of {len(links)} links found at depth {depth} of crawl {batch_id}")
+    return len(jobs)
+
+
+def build_task_result(result_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "job_id": result_data["job_id"],
+        "url": result_data["url"],
+        "status_code": result_data["status_code"],
+        "response_time_ms": result_data["response_time_ms"]
+    }
+
+
+@celery_app.task(bind=True, name="crawl_page", acks_late=True, max_retries=None)
+def crawl_page(self, url: str, headers: Optional[Dict[str, str]] = None,
+               timeout: int = 15, batch_id: Optional[str] = None,
+               body_codec: Optional[str] = None, max_age: Optional[int] = None,
+               attempt: int = 1, started_at: Optional[float] = None,
+               coalesced: bool = False, queued_at: Optional[float] = None,
+               crawl: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    started_at = started_at or time.time()
+    lifecycle = {"queued_at": queued_at, "started_at": started_at}
+    job_id = self.request.id
+    request_headers = build_request_headers(headers)
+    key = cache_key(url, headers)
+
+    if coalesced:
+        # Woken up after waiting on a leader: its result may already be ours.
+        payload = storage.get_job_result(job_id, with_body=False)
+        if payload:
+            if payload.get("error_message"):
+                raise RuntimeError(payload["error_message"])
+            return build_task_result(payload)
+
+    try:
+        storage.start_job(job_id, batch_id, queued_at, started_at)
+
+        entry = storage.get_cache_entry(key) if max_age is not None else None
+        if entry and is_fresh(entry, max_age):
+            elapsed_ms = int((time.time() - started_at) * 1000)
+            cached_result = result_from_cache(job_id, batch_id, url, entry, elapsed_ms, "hit")
+            storage.finish_job(job_id, cached_result, lifecycle=lifecycle)
+            release_slot(job_id, batch_id)
+            return build_task_result(cached_result)
+
+        # Crawl pages are not coalesced: a follower would not get the links.
+        leader = None if crawl else storage.join_flight(key, job_id, batch_id)
+        if leader:
+            # The leader hands over its result when done; the retry only
+            # fires if it died without doing so.
+            logger.info(f"Coalescing {url} onto in-flight job {leader}")
+            raise self.retry(
+                countdown=settings.coalesce_lease_secs,
+                kwargs={**self.request.kwargs, "started_at": started_at, "coalesced": True},
+            )
+
+        crawler = get_crawler()
+        depth = frontier.depth(batch_id, job_id) if crawl else None
+        result = crawler.crawl_once(url, headers={**request_headers, **conditional_headers(entry)},
+                                    timeout=float(timeout), codec=codec_registry.for_job(url, body_codec),
+                                    max_links=link_budget(crawl, depth))
+        if result.deferred:
+            # Over the host's rate: come back later without using up an attempt.
+            raise self.retry(
+                countdown=result.retry_after,
+                kwargs={**self.request.kwargs, "started_at": started_at},
+            )
+        elapsed_ms = int((time.time() - started_at) * 1000)
+
+        if not (result.ok or (result.not_modified and entry)):
+            if result.retryable and attempt < settings.max_retries:
+                countdown = crawler.backoff.compute(attempt, blocked=result.outcome == OUTCOME_BLOCKED)
+                logger.info(f"Retrying {url} in {countdown:.1f}s after {result.outcome} "
+                            f"(attempt {attempt}/{settings.max_retries})")
+                raise self.retry(
+                    countdown=countdown,
+                    kwargs={**self.request.kwargs, "attempt": attempt + 1, "started_at": started_at},
+                )
+
+            if result.outcome == OUTCOME_TOO_LARGE:
+                raise result.error
             raise RuntimeError("Crawling failed after all retries")
 
-        body_compressed = gzip.compress(body_bytes)
-        body_encoded = base64.b64encode(body_compressed).decode('utf-8')
-
-        success_result = {
-            "job_id": job_id,
-            "batch_id": batch_id,
-            "url": url,
-            "status_code": 200,
-            "content_type": "text/html",
-            "response_time_ms": elapsed_ms,
-            "headers_trunc": {k: v for k, v in request_headers.items()},
-            "body_encoding": "base64+gzip",
-            "body": body_encoded,
-            "error_type": None,
-            "error_message": None,
-        }
-        storage.save_job_result(job_id, success_result)
+        if result.links:
+            expand_crawl(batch_id, crawl, depth, result.links, headers, timeout, body_codec)
+        success_result = save_success_result(job_id, batch_id, url, elapsed_ms, request_headers,
+                                             result, key, entry, lifecycle)
+        release_slot(job_id, batch_id)
+        release_flight(key, success_result)
 
         logger.info(f"Successfully crawled {url} in {elapsed_ms}ms")
-        return {
-            "job_id": job_id,
-            "url": url,
-            "status_code": 200,
-            "response_time_ms": elapsed_ms
-        }
+        return build_task_result(success_result)
+
+    except Retry:
+        raise
 
     except Exception as e:
-        elapsed_ms = int((perf_counter() - started) * 1000)
+        elapsed_ms = int((time.time() - started_at) * 1000)
 
-        error_result = {
-            "job_id": job_id,
-            "batch_id": batch_id,
-            "url": url,
-            "status_code": None,
-            "content_type": None,
-            "response_time_ms": elapsed_ms,
-            "headers_trunc": {},
-            "body_encoding": None,
-            "body": None,
-            "error_type": e.__class__.__name__,
-            "error_message": str(e),
-        }
-        storage.save_job_result(job_id, error_result)
+        error_result = build_error_result(job_id, batch_id, url, elapsed_ms,
+                                          e.__class__.__name__, str(e))
+        save_error_result(job_id, error_result, lifecycle)
+        release_slot(job_id, batch_id)
+        release_flight(key, error_result)
 
         logger.error(f"Failed to crawl {url}: {e}")
         raise
+
+
+async def _await_leader(key: str, job_id: str, batch_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    # Returns the result a leader copied to this job, or None once this job
+    # holds the lease itself.
+    while await asyncio.to_thread(storage.join_flight, key, job_id, batch_id):
+        deadline = perf_counter() + settings.coalesce_lease_secs
+        while perf_counter() < deadline:
+            await asyncio.sleep(0.5)
+            payload = await asyncio.to_thread(storage.get_job_result, job_id, False)
+            if payload:
+                return payload
+    return None
+
+
+async def _crawl_job(job: Dict[str, str], headers: Optional[Dict[str, str]],
+                     request_headers: Dict[str, str], timeout: int,
+                     batch_id: Optional[str], body_codec: Optional[str],
+                     queued_at: Optional[float], crawl: Optional[Dict[str, Any]],
+                     semaphore: asyncio.Semaphore) -> bool:
+    job_id = job["job_id"]
+    url = job["url"]
+    key = cache_key(url, headers)
+    crawler = get_async_crawler()
+    lifecycle = {"queued_at": queued_at, "started_at": time.time()}
+
+    await asyncio.to_thread(store_task_state, job_id, None, states.STARTED)
+    await asyncio.to_thread(storage.start_job, job_id, batch_id, queued_at, lifecycle["started_at"])
+    started = perf_counter()
+
+    try:
+        coalesced = None if crawl else await _await_leader(key, job_id, batch_id)
+        if coalesced:
+            return coalesced.get("error_message") is None
+
+        codec = await asyncio.to_thread(codec_registry.for_job, url, body_codec)
+        depth = await asyncio.to_thread(frontier.depth, batch_id, job_id) if crawl else None
+        attempt = 1
+        while True:
+            async with semaphore:
+                result = await crawler.crawl_once(url, headers=request_headers, timeout=float(timeout),
+                                                  codec=codec, max_links=link_budget(crawl, depth))
+            # The in-flight slot is released while waiting for a token or backing off.
+            if result.deferred:
+                await asyncio.sleep(result.retry_after)
+                continue
+            if result.ok or not result.retryable or attempt >= settings.max_retries:
+                break
+            await asyncio.sleep(crawler.backoff.compute(attempt, blocked=result.outcome == OUTCOME_BLOCKED))
+            attempt += 1
+
+        elapsed_ms = int((perf_counter() - started) * 1000)
+
+        if result.outcome == OUTCOME_TOO_LARGE:
+            error_result = build_error_result(job_id, batch_id, url, elapsed_ms,
+                                              result.error.__class__.__name__, str(result.error))
+            error = result.error
+        elif not result.ok:
+            error_result = build_error_result(job_id, batch_id, url, elapsed_ms, "CrawlError",
+                                              "Failed to crawl URL after all retries")
+            error = RuntimeError("Crawling failed after all retries")
+        else:
+            if result.links:
+                await asyncio.to_thread(expand_crawl, batch_id, crawl, depth, result.links, headers, timeout,
+                                        body_codec)
+            success_result = await asyncio.to_thread(save_success_result, job_id, batch_id, url, elapsed_ms,
+                                                     request_headers, result, key, None, lifecycle)
+            await asyncio.to_thread(release_slot, job_id, batch_id)
+            await asyncio.to_thread(store_task_state, job_id, build_task_result(success_result),
+                                    states.SUCCESS)
+            await asyncio.to_thread(release_flight, key, success_result)
+            logger.info(f"Successfully crawled {url} in {elapsed_ms}ms")
+            return True
+
+    except Exception as e:
+        elapsed_ms = int((perf_counter() - started) * 1000)
+        error_result = build_error_result(job_id, batch_id, url, elapsed_ms,
+                                          e.__class__.__name__, str(e))
+        error = e
+
+    await asyncio.to_thread(save_error_result, job_id, error_result, lifecycle)
+    await asyncio.to_thread(release_slot, job_id, batch_id)
+    await asyncio.to_thread(store_task_state, job_id, error, states.FAILURE)
+    await asyncio.to_thread(release_flight, key, error_result)
+    logger.error(f"Failed to crawl {url}: {error}")
+    return False
+
+
+async def _crawl_jobs(jobs: List[Dict[str, str]], headers: Optional[Dict[str, str]],
+                      request_headers: Dict[str, str], timeout: int,
+                      batch_id: Optional[str], body_codec: Optional[str],
+                      queued_at: Optional[float], crawl: Optional[Dict[str, Any]],
+                      max_in_flight: int, deadline: float) -> List[Optional[bool]]:
+    # Jobs still running at the deadline are cancelled and come back as None.
+    semaphore = asyncio.Semaphore(max_in_flight)
+    tasks = [
+        asyncio.ensure_future(_crawl_job(job, headers, request_headers, timeout, batch_id, body_codec,
+                                         queued_at, crawl, semaphore))
+        for job in jobs
+    ]
+    _, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - perf_counter()))
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return [None if task.cancelled() else task.result() for task in tasks]
+
+
+def hand_on_unfinished(jobs: List[Dict[str, str]], options: Dict[str, Any], queue: str,
+                       requeues: int) -> int:
+    # Jobs cut off by the chunk deadline go back on the queue as a new chunk,
+    # or fail once they have been requeued max_retries times. Ones whose
+    # result landed while they were being cancelled are left alone. Returns
+    # how many were requeued.
+    payloads = storage.get_job_results([job["job_id"] for job in jobs], False)
+    unfinished = [job for job, payload in zip(jobs, payloads) if payload is None]
+    if not unfinished:
+        return 0
+
+    if requeues < settings.max_retries:
+        publish_jobs(unfinished, dict(options, requeues=requeues + 1), queue)
+        logger.warning(f"Requeued {len(unfinished)} unfinished jobs of a chunk past its deadline")
+        return len(unfinished)
+
+    for job in unfinished:
+        error_result = build_error_result(job["job_id"], options.get("batch_id"), job["url"], 0,
+                                          "TimeLimitExceeded", "Chunk deadline passed before the job finished")
+        save_error_result(job["job_id"], error_result)
+        release_slot(job["job_id"], options.get("batch_id"))
+        store_task_state(job["job_id"], RuntimeError(error_result["error_message"]), states.FAILURE)
+        release_flight(cache_key(job["url"], options.get("headers")), error_result)
+    logger.error(f"Failed {len(unfinished)} jobs still unfinished after {requeues} requeues")
+    return 0
+
+
+@celery_app.task(bind=True, name="crawl_many", acks_late=True)
+def crawl_many(self, jobs: List[Dict[str, str]], headers: Optional[Dict[str, str]] = None,
+               timeout: int = 15, batch_id: Optional[str] = None,
+               body_codec: Optional[str] = None,
+               max_in_flight: Optional[int] = None, queued_at: Optional[float] = None,
+               crawl: Optional[Dict[str, Any]] = None, requeues: int = 0) -> Dict[str, Any]:
+    started = perf_counter()
+    request_headers = build_request_headers(headers)
+    options = {"headers": headers, "timeout": timeout, "batch_id": batch_id, "body_codec": body_codec,
+               "max_in_flight": max_in_flight, "queued_at": queued_at, "crawl": crawl}
+    queue = (self.request.delivery_info or {}).get("routing_key") or queue_for_priority(None)
+    # Stops short of the soft time limit, so unfinished jobs are handed on
+    # rather than left STARTED when the worker kills the task.
+    deadline = started + max(1.0, settings.batch_timeout_secs - CHUNK_DEADLINE_MARGIN_SECS)
+
+    try:
+        outcomes = run_async(_crawl_jobs(jobs, headers, request_headers, timeout, batch_id, body_codec,
+                                         queued_at, crawl, max_in_flight or settings.crawl_max_in_flight,
+                                         deadline))
+    except SoftTimeLimitExceeded:
+        hand_on_unfinished(jobs, options, queue, requeues)
+        raise
+    unfinished = [job for job, ok in zip(jobs, outcomes) if ok is None]
+    requeued = hand_on_unfinished(unfinished, options, queue, requeues) if unfinished else 0
+    succeeded = sum(1 for ok in outcomes if ok)
+    elapsed_ms = int((perf_counter() - started) * 1000)
+
+    logger.info(f"Crawled chunk of {len(jobs)} URLs in {elapsed_ms}ms, {succeeded} succeeded")
+    return {
+        "total": len(jobs),
+        "succeeded": succeeded,
+        "failed": len(jobs) - succeeded - requeued,
+        "requeued": requeued,
+        "response_time_ms": elapsed_ms
+    }
+
+
+def publish_jobs(jobs: List[Dict[str, str]], options: Dict[str, Any], queue: str) -> None:
+    # One group per publish chunk: every message in it goes out over a
+    # single pooled producer connection instead of one .delay() each.
+    publish_chunk = max(1, settings.batch_publish_chunk_size)
+    chunk_size = settings.batch_chunk_size
+
+    if chunk_size > 0:
+        signatures = [
+            crawl_many.signature((jobs[i:i + chunk_size],), options, queue=queue)
+            for i in range(0, len(jobs), chunk_size)
+        ]
+    else:
+        signatures = [
+            crawl_page.signature((job["url"],), options, task_id=job["job_id"], queue=queue)
+            for job in jobs
+        ]
+
+    for i in range(0, len(signatures), publish_chunk):
+        group(signatures[i:i + publish_chunk]).apply_async()
+
+
+def submit_jobs(jobs: List[Dict[str, str]], options: Dict[str, Any], queue: str) -> None:
+    batch_id = options.get("batch_id")
+    if batch_id and scheduler.enabled:
+        # Held back and handed out round-robin with the other batches,
+        # so a big batch cannot fill the queue ahead of later ones.
+        scheduler.enqueue(batch_id, jobs, {"options": options, "queue": queue})
+        dispatch_pending()
+    else:
+        publish_jobs(jobs, options, queue)
+
+
+def dispatch_pending(finished: List[str] = ()) -> int:
+    # Frees the scheduler slots of finished batch jobs and publishes the
+    # next round of held-back jobs.
+    if not scheduler.enabled:
+        return 0
+    claimed = scheduler.claim(finished)
+    for batch_id, dispatch, jobs in claimed:
+        publish_jobs(jobs, dispatch.get("options", {"batch_id": batch_id}),
+                     dispatch.get("queue", queue_for_priority(None)))
+    return sum(len(jobs) for _, _, jobs in claimed)
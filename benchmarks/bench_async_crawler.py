@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from app.services.async_crawler import AsyncCrawler
+from app.services.crawler import Crawler
+from benchmarks.local_servers import start_origin, start_proxies, write_proxy_file
+
+
+def sync_crawler(proxy_file: str, urls, concurrency: int) -> float:
+    crawler = Crawler(proxy_file=proxy_file, max_retries=1, delay=0, use_http2=False)
+    crawler.proxy_pool.max_requests_per_proxy = 10 ** 9
+    started = time.perf_counter()
+    for url in urls:
+        if crawler.crawl_bytes(url) is None:
+            raise RuntimeError("Request failed")
+    elapsed = time.perf_counter() - started
+    crawler.close()
+    return len(urls) / elapsed
+
+
+async def async_crawler(proxy_file: str, urls, concurrency: int) -> float:
+    crawler = AsyncCrawler(proxy_file=proxy_file, max_retries=1, delay=0, use_http2=False,
+                           max_in_flight=concurrency)
+    crawler.proxy_pool.max_requests_per_proxy = 10 ** 9
+    started = time.perf_counter()
+    bodies = await crawler.crawl_many(urls)
+    elapsed = time.perf_counter() - started
+    await crawler.aclose()
+    if any(body is None for body in bodies):
+        raise RuntimeError("Request failed")
+    return len(urls) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential Crawler vs AsyncCrawler.crawl_many")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Origin latency in seconds")
+    parser.add_argument("--proxies", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    origin = start_origin(latency=args.latency)
+    proxies = start_proxies(args.proxies)
+    with tempfile.TemporaryDirectory() as tmp:
+        proxy_file = write_proxy_file(os.path.join(tmp, "proxies.txt"), proxies)
+        urls = [f"{origin.url}/jobs/{i}" for i in range(args.requests)]
+
+        before = sync_crawler(proxy_file, urls[:max(1, args.requests // 10)], args.concurrency)
+        after = asyncio.run(async_crawler(proxy_file, urls, args.concurrency))
+
+    for server in [origin, *proxies]:
+        server.stop()
+
+    print(f"sync crawler:  {before:8.1f} req/s")
+    print(f"async crawler: {after:8.1f} req/s ({args.concurrency} in flight)")
+    print(f"speedup:       {after / before:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
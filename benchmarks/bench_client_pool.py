@@ -0,0 +1,66 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from app.services.crawler import Crawler
+from benchmarks.local_servers import start_origin, start_proxies, write_proxy_file
+
+
+def make_crawler(proxy_file: str) -> Crawler:
+    crawler = Crawler(proxy_file=proxy_file, max_retries=1, delay=0, use_http2=False)
+    # Keep the pool's cooldown out of the measurement.
+    crawler.proxy_pool.max_requests_per_proxy = 10 ** 9
+    return crawler
+
+
+def per_task_crawler(proxy_file: str, url: str, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        crawler = make_crawler(proxy_file)
+        if crawler.crawl_bytes(url) is None:
+            raise RuntimeError("Request failed")
+        crawler.close()
+    return requests / (time.perf_counter() - started)
+
+
+def shared_crawler(proxy_file: str, url: str, requests: int) -> float:
+    crawler = make_crawler(proxy_file)
+    started = time.perf_counter()
+    for _ in range(requests):
+        if crawler.crawl_bytes(url) is None:
+            raise RuntimeError("Request failed")
+    elapsed = time.perf_counter() - started
+    crawler.close()
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-task Crawler vs process-wide pooled Crawler")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--proxies", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=20_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    origin = start_origin(args.page_size)
+    proxies = start_proxies(args.proxies)
+    with tempfile.TemporaryDirectory() as tmp:
+        proxy_file = write_proxy_file(os.path.join(tmp, "proxies.txt"), proxies)
+        url = f"{origin.url}/jobs"
+
+        before = per_task_crawler(proxy_file, url, args.requests)
+        after = shared_crawler(proxy_file, url, args.requests)
+
+    for server in [origin, *proxies]:
+        server.stop()
+
+    print(f"per-task crawler:     {before:8.1f} req/s")
+    print(f"process-wide crawler: {after:8.1f} req/s")
+    print(f"speedup:              {after / before:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import pathlib
+import random
+import time
+from typing import List
+
+from app.services.body_codecs import BodyCodec, GzipCodec, ZstdCodec, train_dictionary
+
+import zstandard
+
+
+def synthetic_corpus(count: int) -> List[bytes]:
+    rng = random.Random(7)
+    words = ["python", "senior", "remote", "django", "kyiv", "salary", "english", "team",
+             "product", "backend", "frontend", "devops", "startup", "experience", "years"]
+    pages = []
+    for i in range(count):
+        items = "".join(
+            f'<li class="list-jobs__item job-list__item"><div class="job-list-item__title">'
+            f'<a class="job_item__header-link" href="/jobs/{rng.randint(10000, 99999)}-'
+            f'{rng.choice(words)}/">{" ".join(rng.choices(words, k=4)).title()}</a></div>'
+            f'<div class="job-list-item__description"><span>{" ".join(rng.choices(words, k=40))}'
+            f'</span></div><span class="nobr">${rng.randint(10, 80) * 100}</span></li>'
+            for _ in range(15)
+        )
+        pages.append((
+            '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Djinni - Jobs</title>'
+            '<link rel="stylesheet" href="/static/css/main.css"></head><body>'
+            '<header class="page-header"><nav class="navbar navbar-expand-lg">Djinni</nav></header>'
+            f'<main><ul class="list-unstyled list-jobs">{items}</ul></main>'
+            f'<footer class="footer">page {i}</footer></body></html>'
+        ).encode())
+    return pages
+
+
+def load_corpus(path: str) -> List[bytes]:
+    return [p.read_bytes() for p in sorted(pathlib.Path(path).iterdir()) if p.is_file()]
+
+
+def run(codec: BodyCodec, pages: List[bytes]) -> None:
+    raw = sum(len(page) for page in pages)
+
+    started = time.perf_counter()
+    encoded = [codec.encode(page) for page in pages]
+    compress_secs = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for body in encoded:
+        codec.decode(body)
+    decompress_secs = time.perf_counter() - started
+
+    stored = sum(len(body) for body in encoded)
+    print(f"{codec.name:16s} ratio {raw / stored:6.2f}  "
+          f"compress {raw / compress_secs / 2 ** 20:8.1f} MB/s  "
+          f"decompress {raw / decompress_secs / 2 ** 20:8.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Body codec ratio and throughput")
+    parser.add_argument("--corpus", help="Directory of saved HTML pages (synthetic pages if omitted)")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--dict-size", type=int, default=112_640)
+    parser.add_argument("--zstd-level", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    # Train on half the corpus and measure on the other half.
+    training, pages = pages[::2], pages[1::2]
+    dictionary = zstandard.ZstdCompressionDict(train_dictionary(training, args.dict_size))
+
+    codecs = [GzipCodec(9), GzipCodec(6), ZstdCodec(args.zstd_level),
+              ZstdCodec(args.zstd_level, dictionary)]
+    names = ["gzip-9", "gzip-6", f"zstd-{args.zstd_level}", f"zstd-{args.zstd_level}+dict"]
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KiB average")
+    for name, codec in zip(names, codecs):
+        codec.name = name
+        run(codec, pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import time
+import tracemalloc
+from typing import List, Callable, Tuple
+
+from app.services.detector import BAN_INDICATORS, VALID_INDICATORS, DetectionRules
+from benchmarks.bench_codecs import load_corpus, synthetic_corpus
+
+
+# The previous decode + lower + substring scan, kept as the baseline.
+def legacy_classify(body: bytes) -> Tuple[bool, bool]:
+    content = body.decode("utf-8", "replace")
+    if not content or len(content) < 100:
+        return True, False
+    content_lower = content.lower()
+    if any(indicator in content_lower for indicator in BAN_INDICATORS):
+        return True, False
+    return False, len(content) >= 1000 and any(indicator in content_lower for indicator in VALID_INDICATORS)
+
+
+def large_pages(pages: List[bytes], size: int) -> List[bytes]:
+    return [(page * (size // len(page) + 1))[:size] for page in pages]
+
+
+def run(name: str, classify: Callable[[bytes], Tuple[bool, bool]], pages: List[bytes]) -> List[Tuple[bool, bool]]:
+    started = time.perf_counter()
+    verdicts = [classify(page) for page in pages]
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    classify(pages[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(len(page) for page in pages)
+    print(f"{name:18s} {len(pages) / elapsed:10.1f} pages/s {total / elapsed / 2 ** 20:10.1f} MB/s "
+          f"peak {peak / 2 ** 20:8.2f} MiB/page")
+    return verdicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Block/validity detection cost per page")
+    parser.add_argument("--corpus", help="Directory of saved HTML pages (synthetic pages if omitted)")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=2 * 2 ** 20,
+                        help="Repeat each page up to this many bytes (0 keeps pages as they are)")
+    parser.add_argument("--window", type=int, default=65536)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    if args.page_size:
+        pages = large_pages(pages, args.page_size)
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 2 ** 20:.2f} MiB average")
+
+    legacy = run("decode + lower", legacy_classify, pages)
+    run("bytes scan", DetectionRules(BAN_INDICATORS, VALID_INDICATORS, window=0).classify, pages)
+    windowed = run(f"bytes scan {args.window // 1024}K",
+                   DetectionRules(BAN_INDICATORS, VALID_INDICATORS, window=args.window).classify, pages)
+    print(f"windowed verdicts differ from baseline on {sum(a != b for a, b in zip(legacy, windowed))} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+import redis
+
+from benchmarks.local_servers import start_origin, start_proxies, write_proxy_file
+
+IN_PROCESS_DRIVERS = ("crawl_bytes", "crawl_page")
+END_TO_END_DRIVERS = ("jobs", "batches")
+DRIVERS = IN_PROCESS_DRIVERS + END_TO_END_DRIVERS
+
+Sample = Tuple[float, bool]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latency for latency, _ in samples)
+    ok = sum(1 for _, success in samples if success)
+    return {
+        "requests": len(samples),
+        "ok": ok,
+        "failed": len(samples) - ok,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def app_env(args, proxy_file: str) -> Dict[str, str]:
+    base = args.redis.rstrip("/")
+    return {
+        "CELERY_BROKER_URL": f"{base}/{args.redis_db}",
+        "CELERY_RESULT_BACKEND": f"{base}/{args.redis_db + 1}",
+        "REDIS_URL": f"{base}/{args.redis_db + 2}",
+        "PROXY_FILE": proxy_file,
+        "PROXY_POOL_BACKEND": args.proxy_pool,
+        "PROXY_POOL_KEY": "bench:proxypool",
+        "PROXY_MAX_REQUESTS": str(10 ** 9),
+        "PROXY_COOLDOWN_SECS": "0",
+        "USE_HTTP2": "false",
+        "HOST_RATE_LIMITS": "",
+        "MAX_RETRIES": str(args.max_retries),
+        "RETRY_BACKOFF_BASE_SECS": str(args.backoff),
+        "RETRY_BACKOFF_MAX_SECS": str(args.backoff * 10),
+        "WORKER_METRICS_PORT": "0",
+    }
+
+
+def flush_redis(env: Dict[str, str]):
+    for name in ("CELERY_BROKER_URL", "CELERY_RESULT_BACKEND", "REDIS_URL"):
+        redis.Redis.from_url(env[name]).flushdb()
+
+
+# In-process drivers run in a fresh spawned process each, so settings are read
+# from the benchmark's environment and peak RSS belongs to that driver alone.
+def _run_in_process(driver: str, urls: List[str], env: Dict[str, str], timeout: int) -> Dict[str, Any]:
+    os.environ.update(env)
+    logging.disable(logging.CRITICAL)
+
+    if driver == "crawl_bytes":
+        from app.worker.runtime import get_crawler
+        crawler = get_crawler()
+
+        def run(url: str) -> bool:
+            return crawler.crawl_bytes(url, timeout=float(timeout)) is not None
+    else:
+        from app.worker.celery_app import celery_app
+        from app.worker.tasks.crawl import crawl_page
+        # Eager retries run straight away, so backoff delays are not included.
+        celery_app.conf.task_always_eager = True
+
+        def run(url: str) -> bool:
+            return crawl_page.apply(kwargs={"url": url, "timeout": timeout}).successful()
+
+    run(urls[0])
+    samples = []
+    started = time.perf_counter()
+    for url in urls[1:]:
+        request_started = time.perf_counter()
+        ok = run(url)
+        samples.append((time.perf_counter() - request_started, ok))
+    result = summarize(samples, time.perf_counter() - started)
+    result["max_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def run_in_process(driver: str, urls: List[str], env: Dict[str, str], timeout: int) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(_run_in_process, driver, urls, env, timeout).result()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def tree_peak_rss_mib(pid: int) -> float:
+    # VmHWM is the peak resident set of one process; prefork children count too.
+    total_kib, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kib += int(line.split()[1])
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return round(total_kib / 1024, 1)
+
+
+class Stack:
+    def __init__(self, args, env: Dict[str, str]):
+        self.port = free_port()
+        self.api_url = f"http://127.0.0.1:{self.port}"
+        env = {**os.environ, **env}
+        self.api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(args.api_workers), "--log-level", "warning"],
+            env=env,
+        )
+        self.worker = subprocess.Popen(
+            [sys.executable, "-m", "celery", "-A", "app.worker.celery_app.celery_app", "worker",
+             "-Q", "crawler.interactive,crawler,crawler.bulk", "--concurrency", str(args.worker_concurrency), "--loglevel", "warning",
+             "--without-gossip", "--without-mingle", "--without-heartbeat"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+
+    def wait_ready(self, url: str, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"{self.api_url}/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        else:
+            raise RuntimeError("API did not start")
+        # One job through the whole stack, so worker startup is not measured.
+        samples, _ = asyncio.run(drive_jobs(self.api_url, [url], 1, 0.05, timeout))
+        if not samples[0][1]:
+            raise RuntimeError("Warm-up job failed")
+
+    def memory(self) -> Dict[str, float]:
+        return {
+            "api_rss_mib": tree_peak_rss_mib(self.api.pid),
+            "worker_rss_mib": tree_peak_rss_mib(self.worker.pid),
+        }
+
+    def stop(self):
+        for proc in (self.api, self.worker):
+            proc.terminate()
+        for proc in (self.api, self.worker):
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+async def drive_jobs(api_url: str, urls: List[str], concurrency: int, poll: float,
+                     job_timeout: float) -> Tuple[List[Sample], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=api_url, timeout=30, limits=limits) as client:
+        async def one(url: str) -> Sample:
+            async with semaphore:
+                started = time.perf_counter()
+                res = await client.post("/v1/jobs/", json={"url": url})
+                job_id = res.json()["job_id"]
+                while time.perf_counter() - started < job_timeout:
+                    state = (await client.get(f"/v1/jobs/{job_id}/status")).json()["state"]
+                    if state in ("SUCCESS", "FAILURE"):
+                        return time.perf_counter() - started, state == "SUCCESS"
+                    await asyncio.sleep(poll)
+                return time.perf_counter() - started, False
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(one(url) for url in urls))
+        return list(samples), time.perf_counter() - started
+
+
+async def drive_batches(api_url: str, urls: List[str], batch_size: int, poll: float,
+                        job_timeout: float) -> Tuple[List[Sample], float, List[float]]:
+    async with httpx.AsyncClient(base_url=api_url, timeout=60) as client:
+        async def one(chunk: List[str]) -> Tuple[List[Sample], float]:
+            started = time.perf_counter()
+            res = await client.post("/v1/batches/", json={"urls": chunk})
+            batch_id = res.json()["batch_id"]
+            while time.perf_counter() - started < job_timeout:
+                status = (await client.get(f"/v1/batches/{batch_id}/status")).json()
+                if status["completed"] >= status["total"]:
+                    break
+                await asyncio.sleep(poll)
+            wall = time.perf_counter() - started
+
+            res = await client.get(f"/v1/batches/{batch_id}/results",
+                                   params={"format": "ndjson", "fields": "response_time_ms,error"})
+            rows = [json.loads(line) for line in res.text.splitlines() if line]
+            return [(row["response_time_ms"] / 1000, row["error"] is None) for row in rows], wall
+
+        started = time.perf_counter()
+        batches = await asyncio.gather(*(one(urls[i:i + batch_size]) for i in range(0, len(urls), batch_size)))
+        elapsed = time.perf_counter() - started
+
+    samples = [sample for batch_samples, _ in batches for sample in batch_samples]
+    # Jobs that never finished have no result row; count them as failures.
+    samples.extend((job_timeout, False) for _ in range(len(urls) - len(samples)))
+    return samples, elapsed, [wall for _, wall in batches]
+
+
+def run_end_to_end(drivers: List[str], args, env: Dict[str, str], urls: List[str]) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    stack = Stack(args, env)
+    try:
+        stack.wait_ready(f"{urls[0]}?warmup")
+        if "jobs" in drivers:
+            samples, elapsed = asyncio.run(drive_jobs(stack.api_url, [f"{url}?d=jobs" for url in urls],
+                                                      args.concurrency, args.poll, args.job_timeout))
+            results["jobs"] = summarize(samples, elapsed)
+        if "batches" in drivers:
+            samples, elapsed, walls = asyncio.run(drive_batches(
+                stack.api_url, [f"{url}?d=batches" for url in urls], args.batch_size, args.poll, args.job_timeout
+            ))
+            results["batches"] = summarize(samples, elapsed)
+            results["batches"]["batch_wall_ms"] = [round(wall * 1000, 1) for wall in walls]
+        memory = stack.memory()
+        for result in results.values():
+            result.update(memory)
+    finally:
+        stack.stop()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]):
+    print(f"\nvs {previous.get('commit')} ({previous.get('started_at')}):")
+    for driver, result in current["results"].items():
+        before = previous.get("results", {}).get(driver)
+        if not before:
+            continue
+        changes = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before.get(key):
+                changes.append(f"{key} {(result[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"  {driver:12s} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark against a local mock origin and proxies")
+    parser.add_argument("--drivers", default=",".join(DRIVERS), help=f"Comma-separated subset of {', '.join(DRIVERS)}")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per driver")
+    parser.add_argument("--concurrency", type=int, default=20, help="Jobs in flight for the /jobs driver")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="Origin latency in seconds")
+    parser.add_argument("--page-size", type=int, default=50_000)
+    parser.add_argument("--ban-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--proxies", type=int, default=20)
+    parser.add_argument("--proxy-pool", choices=("memory", "redis"), default="memory")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.05, help="RETRY_BACKOFF_BASE_SECS for the run")
+    parser.add_argument("--timeout", type=int, default=15, help="Crawl timeout in seconds")
+    parser.add_argument("--job-timeout", type=float, default=120.0)
+    parser.add_argument("--poll", type=float, default=0.02, help="Status poll interval in seconds")
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--worker-concurrency", type=int, default=4)
+    parser.add_argument("--redis", default="redis://localhost:6379")
+    parser.add_argument("--redis-db", type=int, default=13,
+                        help="First of three Redis databases used (and flushed) by the run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    drivers = [d.strip() for d in args.drivers.split(",") if d.strip()]
+    unknown = set(drivers) - set(DRIVERS)
+    if unknown:
+        parser.error(f"Unknown drivers: {', '.join(sorted(unknown))}")
+
+    logging.disable(logging.CRITICAL)
+
+    origin = start_origin(args.page_size, args.latency, args.ban_rate, args.error_rate, args.seed)
+    proxies = start_proxies(args.proxies)
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proxy_file = write_proxy_file(os.path.join(tmp, "proxies.txt"), proxies)
+        env = app_env(args, proxy_file)
+        try:
+            flush_redis(env)
+        except redis.RedisError as e:
+            sys.exit(f"Needs a local Redis at {args.redis}: {e}")
+
+        for driver in drivers:
+            if driver in IN_PROCESS_DRIVERS:
+                urls = [f"{origin.url}/jobs/{i}?d={driver}" for i in range(args.requests + 1)]
+                report["results"][driver] = run_in_process(driver, urls, env, args.timeout)
+
+        e2e = [driver for driver in drivers if driver in END_TO_END_DRIVERS]
+        if e2e:
+            urls = [f"{origin.url}/jobs/{i}" for i in range(args.requests)]
+            report["results"].update(run_end_to_end(e2e, args, env, urls))
+
+    for server in [origin, *proxies]:
+        server.stop()
+
+    for driver, result in report["results"].items():
+        rss = result.get("max_rss_mib", result.get("worker_rss_mib"))
+        print(f"{driver:12s} {result['throughput_rps']:8.1f} req/s  p50 {result['p50_ms']:8.1f} ms  "
+              f"p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+              f"{result['ok']}/{result['requests']} ok  rss {rss} MiB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
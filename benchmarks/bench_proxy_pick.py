@@ -0,0 +1,78 @@
+import argparse
+import logging
+import random
+import time
+from typing import Optional
+
+from app.services.crawler import SmartProxyPool
+
+
+# The previous scan-and-sort selection, kept as the baseline.
+class LinearScanProxyPool(SmartProxyPool):
+    def _scan_available(self):
+        current_time = time.time()
+        available = []
+        for proxy in self.proxies:
+            if proxy in self.quarantined_proxies or proxy in self._tripped:
+                continue
+            if self.proxy_usage_count.get(proxy, 0) >= self.max_requests_per_proxy:
+                if current_time - self.proxy_last_used.get(proxy, 0) < self.cooldown_time:
+                    continue
+                self.proxy_usage_count[proxy] = 0
+            available.append(proxy)
+        return available
+
+    def pick_proxy_line(self) -> Optional[str]:
+        available_proxies = self._scan_available()
+        if not available_proxies:
+            return None
+
+        self.total_requests += 1
+        if self.current_proxy and self.requests_with_current >= self.rotation_interval:
+            self.current_proxy = None
+            self.requests_with_current = 0
+
+        if not self.current_proxy or self.current_proxy not in available_proxies:
+            available_proxies.sort(key=lambda p: self.proxy_success_rate.get(p, 1.0), reverse=True)
+            self.current_proxy = random.choice(available_proxies[:3])
+            self.requests_with_current = 0
+
+        self.proxy_usage_count[self.current_proxy] = self.proxy_usage_count.get(self.current_proxy, 0) + 1
+        self.proxy_last_used[self.current_proxy] = time.time()
+        self.requests_with_current += 1
+        return self.current_proxy
+
+
+def run(pool: SmartProxyPool, picks: int, failure_rate: float) -> float:
+    rng = random.Random(42)
+    started = time.perf_counter()
+    for _ in range(picks):
+        proxy = pool.pick_proxy_line()
+        if proxy is None:
+            raise RuntimeError("Pool exhausted")
+        pool.report_request_result(proxy, rng.random() >= failure_rate)
+    return picks / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy selection cost on a large pool")
+    parser.add_argument("--proxies", type=int, default=100_000)
+    parser.add_argument("--picks", type=int, default=2_000)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    proxies = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:8080" for i in range(args.proxies)]
+
+    results = {}
+    for name, cls in (("linear scan", LinearScanProxyPool), ("indexed", SmartProxyPool)):
+        pool = cls(proxies)
+        pool.rotation_interval = 1
+        results[name] = run(pool, args.picks, args.failure_rate)
+        print(f"{name:12s} {results[name]:12.1f} picks/s")
+
+    print(f"speedup      {results['indexed'] / results['linear scan']:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import http.client
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+
+def make_page(size: int = 20_000) -> bytes:
+    head = b"<html><head><title>djinni jobs</title></head><body>"
+    tail = b"</body></html>"
+    row = b"<div class='vacancy'><a href='/jobs/1'>Python developer</a></div>\n"
+    body = row * max(1, (size - len(head) - len(tail)) // len(row))
+    return head + body + tail
+
+
+def make_ban_page() -> bytes:
+    return (b"<html><head><title>Access denied</title></head><body>"
+            b"Your IP address has been blocked. Contact us at magic@djinni.co</body></html>")
+
+
+class _OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = self.server.page
+        if self.server.ban_rate or self.server.error_rate:
+            roll = self.server.rng.random()
+            if roll < self.server.error_rate:
+                self.send_error(503)
+                return
+            if roll < self.server.error_rate + self.server.ban_rate:
+                body = self.server.ban_page
+        etag = f'"{len(body)}-{hash(body) & 0xffffffff:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients abort bans and oversized bodies mid-download.
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _upstream(self, netloc: str) -> http.client.HTTPConnection:
+        conns = getattr(self, "_conns", None)
+        if conns is None:
+            conns = self._conns = {}
+        conn = conns.get(netloc)
+        if conn is None:
+            conn = conns[netloc] = http.client.HTTPConnection(netloc, timeout=30)
+        return conn
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        headers = {k: v for k, v in self.headers.items()
+                   if k.lower() not in ("proxy-connection", "proxy-authorization")}
+        # A pooled upstream connection may have been closed by the origin;
+        # retry once on a fresh one before giving up.
+        for retry in (False, True):
+            conn = self._upstream(parts.netloc)
+            try:
+                conn.request("GET", path, headers=headers)
+                upstream = conn.getresponse()
+                body = upstream.read()
+                break
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                del self._conns[parts.netloc]
+                if retry:
+                    self.send_error(502)
+                    return
+
+        self.send_response(upstream.status)
+        for key, value in upstream.getheaders():
+            if key.lower() not in ("content-length", "transfer-encoding", "connection"):
+                self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients abort bans and oversized bodies mid-download.
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer:
+    def __init__(self, handler, **attrs):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        for key, value in attrs.items():
+            setattr(self.httpd, key, value)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "LocalServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_origin(page_size: int = 20_000, latency: float = 0.0, ban_rate: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0) -> LocalServer:
+    return LocalServer(_OriginHandler, page=make_page(page_size), latency=latency,
+                       ban_page=make_ban_page(), ban_rate=ban_rate, error_rate=error_rate,
+                       rng=random.Random(seed)).start()
+
+
+def start_proxies(count: int) -> List[LocalServer]:
+    return [LocalServer(_ProxyHandler).start() for _ in range(count)]
+
+
+def write_proxy_file(path: str, proxies: List[LocalServer]) -> str:
+    with open(path, "w") as f:
+        for proxy in proxies:
+            f.write(f"127.0.0.1:{proxy.port}\n")
+    return path
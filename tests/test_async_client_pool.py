@@ -0,0 +1,21 @@
+import asyncio
+
+from app.services.async_crawler import AsyncClientPool
+
+
+def test_evicted_client_closed_after_its_last_request():
+    async def run():
+        pool = AsyncClientPool(max_clients=1, use_http2=False)
+        busy = pool.acquire("http://a:1")
+        idle = pool.get("http://b:1")
+        pool.get("http://c:1")
+        await asyncio.sleep(0)
+        assert idle.is_closed
+        assert not busy.is_closed
+
+        pool.release(busy)
+        await asyncio.sleep(0)
+        assert busy.is_closed
+        await pool.aclose()
+
+    asyncio.run(run())
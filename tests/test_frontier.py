@@ -0,0 +1,33 @@
+import pytest
+
+from app.services.frontier import CrawlFrontier, bloom_size
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def frontier(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("redis.Redis.from_url",
+                        classmethod(lambda cls, url, **kw: fakeredis.FakeRedis(server=server, **kw)))
+    return CrawlFrontier("redis://test")
+
+
+def crawl_config(max_pages: int) -> dict:
+    bits, hashes = bloom_size(max_pages, 0.001)
+    return {"max_pages": max_pages, "bloom_bits": bits, "bloom_hashes": hashes}
+
+
+def test_admits_more_urls_than_one_unpack_holds(frontier):
+    urls = [f"https://djinni.co/jobs/{i}" for i in range(12000)]
+    admitted = frontier.admit("b1", urls, 0, crawl_config(20000))
+    assert len(admitted) == len(urls)
+    assert frontier._redis.llen("batch:b1:jobs") == len(urls)
+
+
+def test_dedups_and_caps_at_max_pages(frontier):
+    crawl = crawl_config(3)
+    assert len(frontier.admit("b2", ["https://djinni.co/a", "https://DJINNI.co/a#x"], 0, crawl)) == 1
+    admitted = frontier.admit("b2", ["https://djinni.co/b", "https://djinni.co/c", "https://djinni.co/d"], 1, crawl)
+    assert [job["url"] for job in admitted] == ["https://djinni.co/b", "https://djinni.co/c"]
+    assert frontier.depth("b2", admitted[0]["job_id"]) == 1
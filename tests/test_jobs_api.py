@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.storage import storage
+
+
+def test_body_with_missing_dictionary_is_a_conflict(monkeypatch):
+    async def aget_job_body(job_id):
+        return b"\x28\xb5\x2f\xfd", "zstd-dict:djinni.co:7", "text/html", "abc"
+
+    monkeypatch.setattr(storage, "aget_job_body", aget_job_body)
+    monkeypatch.setattr(storage, "get_codec_dictionary", lambda name, version: None)
+    response = TestClient(app).get("/v1/jobs/j1/body")
+    assert response.status_code == 409
+    assert "djinni.co version 7" in response.json()["detail"]
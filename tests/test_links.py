@@ -0,0 +1,23 @@
+from app.services.links import LinkExtractor
+
+
+def extract(html: bytes, base_url: str = "https://djinni.co/jobs/") -> LinkExtractor:
+    extractor = LinkExtractor(base_url)
+    extractor.feed_bytes(html)
+    return extractor
+
+
+def test_malformed_href_skips_only_that_link():
+    extractor = extract(
+        b'<a href="http://host:abc/">port</a>'
+        b'<a href="http://host:99999/">range</a>'
+        b'<a href="http://[::1/">bracket</a>'
+        b'<a href="/a">a</a><a href="b?x=1#frag">b</a>'
+    )
+    assert extractor.result() == ["https://djinni.co/a", "https://djinni.co/jobs/b?x=1"]
+    assert not extractor._failed
+
+
+def test_links_deduplicated_on_normalized_form():
+    extractor = extract(b'<a href="/a?b=2&a=1">1</a><a href="HTTPS://DJINNI.CO:443/a?a=1&b=2">2</a>')
+    assert extractor.result() == ["https://djinni.co/a?b=2&a=1"]
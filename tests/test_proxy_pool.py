@@ -0,0 +1,75 @@
+import pytest
+
+from app.services.crawler import SmartProxyPool
+from app.services.proxy_health import LATENCY_PRIOR_REFRESH
+from app.services.redis_proxy_pool import RedisProxyPool
+
+fakeredis = pytest.importorskip("fakeredis")
+
+PROXIES = ["a:1", "b:1", "c:1", "d:1"]
+
+
+@pytest.fixture
+def redis_pool(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("redis.Redis.from_url",
+                        classmethod(lambda cls, url, **kw: fakeredis.FakeRedis(server=server, **kw)))
+    return RedisProxyPool(list(PROXIES), "redis://test")
+
+
+@pytest.fixture(params=["memory", "redis"])
+def pool(request):
+    if request.param == "memory":
+        return SmartProxyPool(list(PROXIES))
+    return request.getfixturevalue("redis_pool")
+
+
+def rank(pool) -> list:
+    return pool.healthiest(len(PROXIES))
+
+
+def test_fast_failures_do_not_outrank_fresh_proxies(pool):
+    pool.report_request_result("a:1", success=False, latency=0.01)
+    ranking = rank(pool)
+    assert ranking.index("b:1") < ranking.index("a:1")
+
+
+def test_fresh_proxies_scored_from_observed_median(pool):
+    pool.report_request_result("c:1", success=True, latency=0.4)
+    for _ in range(LATENCY_PRIOR_REFRESH):
+        pool.report_request_result("a:1", success=True, latency=0.2)
+    ranking = rank(pool)
+    # With the fixed 1s prior b and d would sit below c.
+    assert ranking.index("b:1") < ranking.index("c:1")
+    assert ranking.index("d:1") < ranking.index("c:1")
+
+
+def test_healthy_probes_bring_back_a_banned_proxy(pool):
+    pool.report_request_result("a:1", success=False, blocked=True)
+    assert "a:1" not in pool.get_available_proxies()
+
+    assert pool.record_probe("a:1", True) is None
+    assert pool.record_probe("a:1", True) == "half_open"
+    assert "a:1" in pool.get_available_proxies()
+
+    pool.report_request_result("a:1", success=True, latency=0.1)
+    assert pool.get_stats()["circuit_open"] == 0
+    assert "a:1" in pool.get_available_proxies()
+
+
+def pool_state(pool) -> dict:
+    stats = pool.get_stats()
+    return {key: stats[key] for key in ("total_proxies", "available", "quarantined", "circuit_open")} | {
+        "proxies": sorted(pool.get_available_proxies())}
+
+
+def test_probes_move_both_pools_in_step(redis_pool):
+    memory_pool = SmartProxyPool(list(PROXIES))
+    for pool in (memory_pool, redis_pool):
+        pool.report_request_result("a:1", success=False, blocked=True)
+    assert pool_state(memory_pool) == pool_state(redis_pool)
+
+    for healthy in (False, False, True, True):
+        assert memory_pool.record_probe("a:1", healthy) == redis_pool.record_probe("a:1", healthy)
+        assert pool_state(memory_pool) == pool_state(redis_pool)
+    assert "a:1" in memory_pool.get_available_proxies()
@@ -0,0 +1,42 @@
+import pytest
+
+from app.services.scheduler import FairScheduler
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("redis.Redis.from_url",
+                        classmethod(lambda cls, url, **kw: fakeredis.FakeRedis(server=server, **kw)))
+    return FairScheduler("redis://test", max_outstanding=4, quantum=2, lease_secs=60)
+
+
+def jobs(batch_id: str, count: int) -> list:
+    return [{"job_id": f"{batch_id}-{i}", "url": f"https://djinni.co/{batch_id}/{i}"} for i in range(count)]
+
+
+def test_claims_round_robin_up_to_the_watermark(scheduler):
+    scheduler.enqueue("a", jobs("a", 5), {"timeout": 15})
+    scheduler.enqueue("b", jobs("b", 1), {})
+    claimed = {batch_id: [job["job_id"] for job in batch_jobs] for batch_id, _, batch_jobs in scheduler.claim()}
+    assert claimed == {"a": ["a-0", "a-1", "a-2"], "b": ["b-0"]}
+    assert scheduler.outstanding() == 4
+
+    assert scheduler.claim() == []
+    finished = scheduler.claim(["a-0", "a-1"])
+    assert finished == [("a", {"timeout": 15}, jobs("a", 5)[3:])]
+
+
+def test_batch_keys_are_declared_to_the_script(scheduler, monkeypatch):
+    scheduler.enqueue("a", jobs("a", 1), {})
+    claim, declared = scheduler._claim, []
+
+    def spy(keys, args):
+        declared.extend(keys)
+        return claim(keys=keys, args=args)
+
+    monkeypatch.setattr(scheduler, "_claim", spy)
+    scheduler.claim()
+    assert "sched:batch:a" in declared